@@ -0,0 +1,172 @@
+"""End-to-end importer benchmark against fake_tmdb_server.py and a throwaway database.
+
+    python benchmark_importer.py --movies 400 --pages 5 --latency 0.02 --modes async pipeline
+
+For every fetch mode it starts a fresh fake TMDb server, creates an empty
+database from the tables in schema.sql, runs run_import() and reports movies/sec,
+people/sec, HTTP calls per movie, DB statements per movie and, for the pipeline
+mode, p50/p99 latency per stage. Each run is appended as one JSON line to
+--results, and the summary shows the change against the previous run that
+used the same settings.
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import time
+
+import importer_populate_db as importer
+from fake_tmdb_server import FakeTMDbDataset, start_server
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+
+def schema_table_statements(path=SCHEMA_PATH):
+    """The CREATE TABLE statements from schema.sql (views, procedures and the USE line are skipped)."""
+    with open(path, encoding="utf-8") as schema_file:
+        sql = re.sub(r"--[^\n]*", "", schema_file.read())
+    return [statement.strip() for statement in sql.split(";") if statement.strip().upper().startswith("CREATE TABLE")]
+
+
+def create_benchmark_database(connection, name):
+    cursor = connection.cursor()
+    cursor.execute(f"CREATE DATABASE `{name}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+    cursor.execute(f"USE `{name}`")
+    for statement in schema_table_statements():
+        cursor.execute(statement)
+    connection.commit()
+    cursor.close()
+
+
+def session_statement_count(connection):
+    cursor = connection.cursor()
+    cursor.execute("SHOW SESSION STATUS LIKE 'Questions'")
+    count = int(cursor.fetchone()[1])
+    cursor.close()
+    return count
+
+
+def table_count(connection, table):
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    count = cursor.fetchone()[0]
+    cursor.close()
+    return count
+
+
+def run_benchmark(args, fetch_mode, connect):
+    dataset = FakeTMDbDataset(args.movies, args.people, args.seed, args.latency, args.error_rate)
+    server, api_base = start_server(dataset)
+    importer.TMDB_API_BASE = api_base
+    importer.TMDB_REQUESTS_PER_SECOND = args.rate
+    database = f"bench_{fetch_mode}_{int(time.time())}"
+
+    connection = connect()
+    cache = importer.ResponseCache(path=":memory:") if args.cache else None
+    try:
+        create_benchmark_database(connection, database)
+        statements_before = session_statement_count(connection)
+        started = time.perf_counter()
+        writer, stages = importer.run_import(
+            connection, "benchmark", args.lists, list(range(1, args.pages + 1)), fetch_mode=fetch_mode,
+            batch_size=args.batch_size, commit_interval=args.commit_interval, cache=cache)
+        elapsed = time.perf_counter() - started
+        # Minus one for the SHOW STATUS call itself.
+        statements = session_statement_count(connection) - statements_before - 1
+        movies = table_count(connection, "Movie")
+        people = table_count(connection, "Person")
+    finally:
+        server.shutdown()
+        if cache:
+            cache.close()
+        if not args.keep_db:
+            cursor = connection.cursor()
+            cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+            cursor.close()
+        connection.close()
+
+    http_calls = sum(dataset.request_counts().values())
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "fetch_mode": fetch_mode,
+        "settings": {key: getattr(args, key) for key in
+                     ("movies", "people", "pages", "lists", "latency", "error_rate", "batch_size",
+                      "commit_interval", "rate", "cache", "seed")},
+        "elapsed_seconds": round(elapsed, 3),
+        "movies": movies,
+        "people": people,
+        "movies_per_second": round(movies / elapsed, 2),
+        "people_per_second": round(people / elapsed, 2),
+        "http_calls": http_calls,
+        "http_calls_per_movie": round(http_calls / movies, 2) if movies else None,
+        "http_calls_by_endpoint": dataset.request_counts(),
+        "db_statements": statements,
+        "db_write_statements": writer.statements,
+        "db_statements_per_movie": round(statements / movies, 2) if movies else None,
+        "stage_latency_ms": {
+            stage.name: {"p50": round(stage.metrics.percentile(0.50) * 1000, 2),
+                         "p99": round(stage.metrics.percentile(0.99) * 1000, 2)}
+            for stage in stages
+        },
+    }
+
+
+def previous_result(results_path, result):
+    if not os.path.exists(results_path):
+        return None
+    previous = None
+    with open(results_path, encoding="utf-8") as results_file:
+        for line in results_file:
+            past = json.loads(line)
+            if past["fetch_mode"] == result["fetch_mode"] and past["settings"] == result["settings"]:
+                previous = past
+    return previous
+
+
+def print_result(result, previous):
+    def delta(key):
+        if not previous or not previous.get(key):
+            return ""
+        change = (result[key] - previous[key]) / previous[key] * 100
+        return f" ({change:+.1f}% vs {previous['timestamp']})"
+
+    print(f"\n=== {result['fetch_mode']} ===")
+    print(f"  {result['movies']} movies, {result['people']} people in {result['elapsed_seconds']}s")
+    print(f"  movies/sec        {result['movies_per_second']}{delta('movies_per_second')}")
+    print(f"  people/sec        {result['people_per_second']}{delta('people_per_second')}")
+    print(f"  HTTP calls/movie  {result['http_calls_per_movie']}{delta('http_calls_per_movie')}")
+    print(f"  DB stmts/movie    {result['db_statements_per_movie']}{delta('db_statements_per_movie')}")
+    for stage, latency in result["stage_latency_ms"].items():
+        print(f"  {stage:<10} p50 {latency['p50']:>8.2f} ms   p99 {latency['p99']:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    DB_PASSWORD = "YOUR_PASSWORD"
+
+    parser = argparse.ArgumentParser(description="Benchmark the TMDb importer end to end.")
+    parser.add_argument("--modes", nargs="+", choices=["async", "sync", "pipeline"], default=["async", "pipeline"])
+    parser.add_argument("--movies", type=int, default=200, help="Movies in the fake TMDb catalog.")
+    parser.add_argument("--people", type=int, default=None, help="People in the fake catalog (default 3 per movie).")
+    parser.add_argument("--pages", type=int, default=5, help="Pages imported from each list.")
+    parser.add_argument("--lists", nargs="+", default=["popular", "top_rated"])
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake server delay per request, in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake requests that fail.")
+    parser.add_argument("--batch-size", type=int, default=importer.DEFAULT_WRITE_BATCH_SIZE)
+    parser.add_argument("--commit-interval", type=int, default=importer.DEFAULT_COMMIT_INTERVAL)
+    parser.add_argument("--rate", type=float, default=importer.TMDB_REQUESTS_PER_SECOND,
+                        help="Client rate limit in requests/sec; raise it to measure the importer, not TMDb's quota.")
+    parser.add_argument("--cache", action="store_true", help="Use an in-memory response cache.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-db", action="store_true", help="Keep the benchmark databases for inspection.")
+    parser.add_argument("--results", default="benchmark_results.jsonl", help="JSON lines file to append results to.")
+    args = parser.parse_args()
+
+    def connect():
+        return importer.mysql.connector.connect(host="localhost", user="root", passwd=DB_PASSWORD)
+
+    for mode in args.modes:
+        result = run_benchmark(args, mode, connect)
+        print_result(result, previous_result(args.results, result))
+        with open(args.results, "a", encoding="utf-8") as results_file:
+            results_file.write(json.dumps(result) + "\n")
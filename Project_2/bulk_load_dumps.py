@@ -0,0 +1,194 @@
+"""Offline full rebuild of movie_rating_db from TMDb-style JSONL export files.
+
+Instead of calling the API, this reads two files with one JSON object per line:
+movie details (with `credits` appended, exactly as fetch_movie_details returns
+them) and person details (as fetch_person_details returns them). Plain or .gz.
+
+    python bulk_load_dumps.py --movies movies.jsonl.gz --people people.jsonl.gz
+
+Lines are parsed in a process pool with the same row mapping the importer uses
+(person_row, movie_table_rows), so both paths produce identical rows. The rows
+go to one CSV staging file per table. Those files are loaded into empty
+*_stage copies of the tables with LOAD DATA LOCAL INFILE, with unique and
+foreign-key checks off. The live tables are then replaced from the staging
+copies in a single transaction, so readers see either the old catalog or the
+new one, never a half-loaded one.
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from multiprocessing import Pool
+
+from importer_populate_db import REBUILD_STATS_SQL, create_db_connection, movie_table_rows, person_row
+
+# Same order as BufferedWriter.FLUSH_ORDER, so parents are loaded before links.
+TABLE_COLUMNS = {
+    'Person': ('PersonID', 'FullName', 'BirthDate', 'Nationality', 'Gender'),
+    'Movie': ('MovieID', 'Title', 'ReleaseYear', 'Summary', 'PosterURL', 'TMDbScore', 'DirectorID',
+              'DurationInMinutes', 'Country'),
+    'Genre': ('GenreID', 'GenreName'),
+    'Movie_Genre': ('MovieID', 'GenreID'),
+    'Movie_Actor': ('MovieID', 'PersonID'),
+}
+LINES_PER_CHUNK = 2000
+
+# Set in each pool worker by init_worker(); ids of people present in the dump.
+_known_person_ids = frozenset()
+
+
+def open_dump(path):
+    return gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')
+
+
+def read_chunks(path, lines_per_chunk=LINES_PER_CHUNK):
+    with open_dump(path) as dump:
+        chunk = []
+        for line in dump:
+            if line.strip():
+                chunk.append(line)
+            if len(chunk) >= lines_per_chunk:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def init_worker(known_person_ids):
+    global _known_person_ids
+    _known_person_ids = known_person_ids
+
+
+def parse_people(lines):
+    return [person_row(json.loads(line)) for line in lines]
+
+
+def parse_movies(lines):
+    rows = []
+    for line in lines:
+        details = json.loads(line)
+        # Person rows come from the people dump; here we only need to know who exists.
+        people_by_id = {pid: {'id': pid} for pid in _person_ids_in(details) if pid in _known_person_ids}
+        rows.extend((table, row) for table, row in movie_table_rows(details, people_by_id) if table != 'Person')
+    return rows
+
+
+def _person_ids_in(details):
+    credits = details.get('credits', {})
+    return [member.get('id') for member in credits.get('crew', []) + credits.get('cast', [])]
+
+
+def csv_field(value):
+    # LOAD DATA's escaping rules: \N is NULL, backslash escapes the delimiter and line breaks.
+    if value is None:
+        return r'\N'
+    text = str(value)
+    return (text.replace('\\', '\\\\').replace('\n', '\\n').replace('\r', '\\r')
+                .replace('\t', '\\t').replace('\0', '\\0').replace(',', '\\,'))
+
+
+class StagingFiles:
+    """One CSV file per table, with rows de-duplicated on the table's key."""
+
+    def __init__(self, staging_dir):
+        os.makedirs(staging_dir, exist_ok=True)
+        self.paths = {table: os.path.join(staging_dir, f"{table.lower()}.csv") for table in TABLE_COLUMNS}
+        self.files = {table: open(path, 'w', encoding='utf-8', newline='') for table, path in self.paths.items()}
+        self.seen = {table: set() for table in TABLE_COLUMNS}
+        self.counts = dict.fromkeys(TABLE_COLUMNS, 0)
+
+    def write(self, table, row):
+        key = row if table.startswith('Movie_') else row[0]
+        if key in self.seen[table]:
+            return
+        self.seen[table].add(key)
+        self.files[table].write(','.join(csv_field(value) for value in row) + '\n')
+        self.counts[table] += 1
+
+    def close(self):
+        for staging_file in self.files.values():
+            staging_file.close()
+
+
+def build_staging_files(movies_path, people_path, staging_dir, workers=None):
+    staging = StagingFiles(staging_dir)
+    try:
+        with Pool(workers) as pool:
+            for rows in pool.imap_unordered(parse_people, read_chunks(people_path)):
+                for row in rows:
+                    staging.write('Person', row)
+
+        known_person_ids = frozenset(staging.seen['Person'])
+        with Pool(workers, initializer=init_worker, initargs=(known_person_ids,)) as pool:
+            for rows in pool.imap_unordered(parse_movies, read_chunks(movies_path)):
+                for table, row in rows:
+                    staging.write(table, row)
+    finally:
+        staging.close()
+    return staging
+
+
+def load_staging_files(connection, staging):
+    cursor = connection.cursor()
+    cursor.execute("SET unique_checks = 0")
+    cursor.execute("SET foreign_key_checks = 0")
+    for table, columns in TABLE_COLUMNS.items():
+        stage_table = f"{table}_stage"
+        cursor.execute(f"DROP TABLE IF EXISTS {stage_table}")
+        cursor.execute(f"CREATE TABLE {stage_table} LIKE {table}")
+        started = time.perf_counter()
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s INTO TABLE {stage_table}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' ESCAPED BY '\\\\'
+            LINES TERMINATED BY '\\n'
+            ({', '.join(columns)})""", (os.path.abspath(staging.paths[table]),))
+        connection.commit()
+        print(f"Staged {staging.counts[table]:>9} rows into {stage_table} in {time.perf_counter() - started:.1f}s")
+
+    # Swap: links first on delete, parents first on insert; one transaction for all of it.
+    started = time.perf_counter()
+    connection.start_transaction()
+    for table in reversed(TABLE_COLUMNS):
+        cursor.execute(f"DELETE FROM {table}")
+    for table, columns in TABLE_COLUMNS.items():
+        column_list = ', '.join(columns)
+        cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {table}_stage")
+    # Ratings for movies that are no longer in the catalog would dangle once FK checks are back on.
+    cursor.execute("DELETE FROM Rating WHERE MovieID NOT IN (SELECT MovieID FROM Movie)")
+    for statement in REBUILD_STATS_SQL:
+        cursor.execute(statement)
+    connection.commit()
+    print(f"Swapped the new catalog into place in {time.perf_counter() - started:.1f}s")
+
+    for table in TABLE_COLUMNS:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}_stage")
+    cursor.execute("SET foreign_key_checks = 1")
+    cursor.execute("SET unique_checks = 1")
+    cursor.close()
+
+
+if __name__ == "__main__":
+    DB_PASSWORD = "YOUR_PASSWORD"
+
+    parser = argparse.ArgumentParser(description="Rebuild the catalog tables from TMDb JSONL export files.")
+    parser.add_argument("--movies", required=True, help="JSONL (or .jsonl.gz) of movie details with credits.")
+    parser.add_argument("--people", required=True, help="JSONL (or .jsonl.gz) of person details.")
+    parser.add_argument("--staging-dir", default="staging")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: one per CPU).")
+    parser.add_argument("--skip-load", action="store_true", help="Only write the CSV staging files.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    staging = build_staging_files(args.movies, args.people, args.staging_dir, args.workers)
+    print(f"Parsed dumps in {time.perf_counter() - started:.1f}s: "
+          + ", ".join(f"{table} {count}" for table, count in staging.counts.items()))
+
+    if not args.skip_load:
+        db_connection = create_db_connection("localhost", "root", DB_PASSWORD, "movie_rating_db",
+                                             allow_local_infile=True)
+        if db_connection and db_connection.is_connected():
+            load_staging_files(db_connection, staging)
+            db_connection.close()
+            print(f"Bulk load finished in {time.perf_counter() - started:.1f}s")
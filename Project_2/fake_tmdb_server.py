@@ -0,0 +1,196 @@
+"""Local stand-in for the parts of the TMDb v3 API that importer_populate_db.py uses.
+
+Run it and point the importer at it:
+
+    python fake_tmdb_server.py --port 8765 --movies 500
+    python importer_populate_db.py --api-base http://127.0.0.1:8765/3
+
+Movies and people are generated deterministically from --seed, so two runs with
+the same arguments serve the same catalog. mark_changed() bumps an entity so it
+shows up in /movie/changes or /person/changes with slightly different data.
+--latency and --error-rate make it behave like a slow or flaky upstream, and
+request_counts() reports how many calls each endpoint received.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GENRES = [(28, 'Action'), (12, 'Adventure'), (16, 'Animation'), (35, 'Comedy'), (80, 'Crime'),
+          (18, 'Drama'), (14, 'Fantasy'), (27, 'Horror'), (878, 'Science Fiction'), (53, 'Thriller')]
+COUNTRIES = ['United States of America', 'United Kingdom', 'France', 'Germany', 'Japan', 'India', 'Iran']
+PAGE_SIZE = 20
+CHANGES_PAGE_SIZE = 100
+
+
+class FakeTMDbDataset:
+    def __init__(self, movie_count=200, person_count=None, seed=42, latency=0.0, error_rate=0.0):
+        self.movie_count = movie_count
+        self.person_count = person_count or movie_count * 3
+        self.seed = seed
+        self.latency = latency
+        self.error_rate = error_rate
+        self.versions = {'movie': {}, 'person': {}}
+        self.requests = Counter()
+        self._errors = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def record_request(self, endpoint):
+        """Counts the call and returns True if it should fail with a simulated error."""
+        with self._lock:
+            self.requests[endpoint] += 1
+            return self._errors.random() < self.error_rate
+
+    def request_counts(self):
+        with self._lock:
+            return dict(self.requests)
+
+    def _rng(self, kind, entity_id):
+        return random.Random(f"{self.seed}:{kind}:{entity_id}:{self.versions[kind].get(entity_id, 0)}")
+
+    def movie(self, movie_id):
+        if not 1 <= movie_id <= self.movie_count:
+            return None
+        rng = self._rng('movie', movie_id)
+        # Cast is picked from the same random stream regardless of version, so edits never reshuffle it.
+        cast_rng = random.Random(f"{self.seed}:cast:{movie_id}")
+        cast = cast_rng.sample(range(1, self.person_count + 1), min(8, self.person_count))
+        director_id = cast_rng.randint(1, self.person_count)
+        return {
+            'id': movie_id,
+            'title': f"Fake Movie {movie_id}",
+            'release_date': f"{rng.randint(1960, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'overview': f"Synthetic summary for movie {movie_id}.",
+            'poster_path': f"/poster{movie_id}.jpg",
+            'vote_average': round(rng.uniform(3, 9.5), 1),
+            'runtime': rng.randint(70, 200),
+            'production_countries': [{'name': rng.choice(COUNTRIES)}],
+            'genres': [{'id': gid, 'name': name} for gid, name in rng.sample(GENRES, rng.randint(1, 3))],
+            'credits': {
+                'cast': [{'id': pid, 'order': order} for order, pid in enumerate(cast)],
+                'crew': [{'id': director_id, 'job': 'Director'}],
+            },
+        }
+
+    def person(self, person_id):
+        if not 1 <= person_id <= self.person_count:
+            return None
+        rng = self._rng('person', person_id)
+        return {
+            'id': person_id,
+            'name': f"Fake Person {person_id}" + (f" v{self.versions['person'][person_id]}"
+                                                   if person_id in self.versions['person'] else ""),
+            'birthday': f"{rng.randint(1930, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'place_of_birth': rng.choice(COUNTRIES),
+            'gender': rng.choice([1, 2]),
+        }
+
+    def list_page(self, list_type, page):
+        ids = list(range(1, self.movie_count + 1))
+        if list_type == 'top_rated':
+            ids.sort(key=lambda movie_id: -self.movie(movie_id)['vote_average'])
+        elif list_type != 'popular':
+            return None
+        chunk = ids[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+        return {
+            'page': page,
+            'total_pages': (len(ids) + PAGE_SIZE - 1) // PAGE_SIZE,
+            'results': [{'id': movie_id, 'title': f"Fake Movie {movie_id}"} for movie_id in chunk],
+        }
+
+    def mark_changed(self, kind, entity_id):
+        with self._lock:
+            self.versions[kind][entity_id] = self.versions[kind].get(entity_id, 0) + 1
+
+    def changes_page(self, kind, page):
+        changed = sorted(self.versions[kind])
+        chunk = changed[(page - 1) * CHANGES_PAGE_SIZE:page * CHANGES_PAGE_SIZE]
+        return {
+            'page': page,
+            'total_pages': max(1, (len(changed) + CHANGES_PAGE_SIZE - 1) // CHANGES_PAGE_SIZE),
+            'results': [{'id': entity_id, 'adult': False} for entity_id in chunk],
+        }
+
+
+class FakeTMDbHandler(BaseHTTPRequestHandler):
+    dataset = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        page = int(query.get('page', ['1'])[0])
+        parts = [part for part in url.path.split('/') if part]
+        if parts[:1] == ['3']:
+            parts = parts[1:]
+
+        if len(parts) == 2 and parts[1] == 'changes':
+            endpoint = f"{parts[0]}/changes"
+        elif len(parts) == 2 and parts[0] == 'movie' and not parts[1].isdigit():
+            endpoint = "movie/list"
+        else:
+            endpoint = parts[0] if parts else ""
+        should_fail = self.dataset.record_request(endpoint)
+        if self.dataset.latency:
+            time.sleep(self.dataset.latency)
+        if should_fail:
+            self._send(500, {'status_code': 11, 'status_message': 'Internal error (simulated).'})
+            return
+
+        body = None
+        if len(parts) == 2 and parts[1] == 'changes' and parts[0] in ('movie', 'person'):
+            body = self.dataset.changes_page(parts[0], page)
+        elif len(parts) == 2 and parts[0] == 'movie' and parts[1].isdigit():
+            body = self.dataset.movie(int(parts[1]))
+        elif len(parts) == 2 and parts[0] == 'movie':
+            body = self.dataset.list_page(parts[1], page)
+        elif len(parts) == 2 and parts[0] == 'person' and parts[1].isdigit():
+            body = self.dataset.person(int(parts[1]))
+
+        if body is None:
+            self._send(404, {'status_code': 34, 'status_message': 'The resource you requested could not be found.'})
+        else:
+            self._send(200, body)
+
+
+def start_server(dataset, host='127.0.0.1', port=0):
+    """Starts the server on a background thread and returns (server, api_base_url)."""
+    handler = type('BoundFakeTMDbHandler', (FakeTMDbHandler,), {'dataset': dataset})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/3"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a synthetic TMDb catalog for importer testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--people", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before every response.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500.")
+    args = parser.parse_args()
+
+    dataset = FakeTMDbDataset(args.movies, args.people, args.seed, args.latency, args.error_rate)
+    server, api_base = start_server(dataset, args.host, args.port)
+    print(f"Fake TMDb serving {dataset.movie_count} movies at {api_base}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
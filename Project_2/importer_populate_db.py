@@ -1,151 +1,1160 @@
+import argparse
+import asyncio
+import datetime
+import json
+import queue
+import random
+import sqlite3
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from decimal import ROUND_HALF_UP, Decimal
+
 import requests
+from requests.adapters import HTTPAdapter
 import mysql.connector
 from mysql.connector import Error
 import time
 
-def create_db_connection(host_name, user_name, user_password, db_name):
+TMDB_API_BASE = "https://api.themoviedb.org/3"
+# TMDb allows roughly 40 requests per second per IP; stay just under it.
+TMDB_REQUESTS_PER_SECOND = 38
+TMDB_BURST = 20
+MAX_CONCURRENT_REQUESTS = 16
+ACTORS_PER_MOVIE = 5
+# Rows per multi-row INSERT, and rows written between commits.
+DEFAULT_WRITE_BATCH_SIZE = 500
+DEFAULT_COMMIT_INTERVAL = 5000
+# On-disk TMDb response cache: per-endpoint freshness and a cap on stored responses.
+TMDB_CACHE_PATH = "tmdb_cache.sqlite3"
+TMDB_CACHE_TTLS = {'movie': 24 * 3600, 'person': 7 * 24 * 3600}
+TMDB_CACHE_MAX_ENTRIES = 200_000
+# TMDb's /changes endpoints accept at most 14 days per request.
+TMDB_CHANGES_WINDOW_DAYS = 14
+
+def create_db_connection(host_name, user_name, user_password, db_name, **connect_options):
     try:
-        connection = mysql.connector.connect(host=host_name, user=user_name, passwd=user_password, database=db_name)
+        connection = mysql.connector.connect(host=host_name, user=user_name, passwd=user_password, database=db_name,
+                                             **connect_options)
         print("MySQL connection successful!")
         return connection
     except Error as e:
         print(f"Database connection error: {e}")
         return None
 
-def insert_or_update_movie(cursor, movie_details, director_id):
+# Each statement has a {rows} slot so the same SQL serves single-row and multi-row writes.
+MOVIE_UPSERT_SQL = """
+    INSERT INTO Movie (MovieID, Title, ReleaseYear, Summary, PosterURL, TMDbScore, DirectorID, DurationInMinutes, Country)
+    VALUES {rows}
+    ON DUPLICATE KEY UPDATE
+        TMDbScore = VALUES(TMDbScore),
+        DirectorID = VALUES(DirectorID);
+"""
+PERSON_UPSERT_SQL = """
+    INSERT INTO Person (PersonID, FullName, BirthDate, Nationality, Gender)
+    VALUES {rows}
+    ON DUPLICATE KEY UPDATE FullName=VALUES(FullName), BirthDate=VALUES(BirthDate), 
+                            Nationality=VALUES(Nationality), Gender=VALUES(Gender);"""
+GENRE_INSERT_SQL = "INSERT IGNORE INTO Genre (GenreID, GenreName) VALUES {rows}"
+MOVIE_GENRE_INSERT_SQL = "INSERT IGNORE INTO Movie_Genre (MovieID, GenreID) VALUES {rows}"
+MOVIE_ACTOR_INSERT_SQL = "INSERT IGNORE INTO Movie_Actor (MovieID, PersonID) VALUES {rows}"
+
+# Summary tables maintained by deltas; the same tables the Django app's signals keep current.
+STATS_UPSERT_SQL = """
+    INSERT INTO {table} ({key_column}, MovieCount, ScoredCount, ScoreSum)
+    VALUES {{rows}}
+    ON DUPLICATE KEY UPDATE
+        MovieCount = MovieCount + VALUES(MovieCount),
+        ScoredCount = ScoredCount + VALUES(ScoredCount),
+        ScoreSum = ScoreSum + VALUES(ScoreSum);
+"""
+# Outbox rows for the Django app's relay (Project_3/movies/outbox.py), written in the same transaction.
+CHANGE_EVENT_INSERT_SQL = "INSERT INTO Change_Event (TableName, RowID, Action, Changes) VALUES {rows}"
+GENRE_STATS_UPSERT_SQL = STATS_UPSERT_SQL.format(table="Genre_Stats", key_column="GenreID")
+DIRECTOR_STATS_UPSERT_SQL = STATS_UPSERT_SQL.format(table="Director_Stats", key_column="DirectorID")
+# Full recomputation, for repair and after bulk loads.
+REBUILD_STATS_SQL = (
+    "DELETE FROM Genre_Stats",
+    """INSERT INTO Genre_Stats (GenreID, MovieCount, ScoredCount, ScoreSum)
+       SELECT mg.GenreID, COUNT(*), COUNT(m.TMDbScore), COALESCE(SUM(m.TMDbScore), 0)
+       FROM Movie_Genre AS mg JOIN Movie AS m ON m.MovieID = mg.MovieID
+       GROUP BY mg.GenreID""",
+    "DELETE FROM Director_Stats",
+    """INSERT INTO Director_Stats (DirectorID, MovieCount, ScoredCount, ScoreSum)
+       SELECT DirectorID, COUNT(*), COUNT(TMDbScore), COALESCE(SUM(TMDbScore), 0)
+       FROM Movie WHERE DirectorID IS NOT NULL
+       GROUP BY DirectorID""",
+)
+
+def score_contribution(tmdb_score):
+    """(movies, scored movies, score sum) one movie adds to its genre and director stats."""
+    if tmdb_score is None:
+        return (1, 0, Decimal(0))
+    # Rounded the way MySQL stores it in TMDbScore DECIMAL(3, 1).
+    return (1, 1, Decimal(str(tmdb_score)).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP))
+
+def stored_score(tmdb_score):
+    """TMDbScore as MySQL stores it, or None."""
+    return None if tmdb_score is None else score_contribution(tmdb_score)[2]
+
+def values_placeholder(row_count, column_count):
+    row = "(" + ", ".join(["%s"] * column_count) + ")"
+    return ", ".join([row] * row_count)
+
+def movie_row(movie_details, director_id):
     release_year = int(movie_details.get('release_date', '0').split('-')[0]) if movie_details.get('release_date') else None
     poster_url = f"https://image.tmdb.org/t/p/w500{movie_details.get('poster_path')}" if movie_details.get('poster_path') else None
     country = movie_details.get('production_countries', [{}])[0].get('name') if movie_details.get('production_countries') else None
-    
-    query = """
-        INSERT INTO Movie (MovieID, Title, ReleaseYear, Summary, PosterURL, TMDbScore, DirectorID, DurationInMinutes, Country)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            TMDbScore = VALUES(TMDbScore),
-            DirectorID = VALUES(DirectorID);
-    """
-    values = (
+    return (
         movie_details.get('id'), movie_details.get('title'), release_year,
         movie_details.get('overview'), poster_url, movie_details.get('vote_average'),
         director_id, movie_details.get('runtime'), country
     )
-    
-    try:
-        cursor.execute(query, values)
-    except Error as e:
-        print(f"Error inserting/updating movie {values[1]}: {e}")
 
-def insert_genre(cursor, genre_data):
-    query = "INSERT IGNORE INTO Genre (GenreID, GenreName) VALUES (%s, %s)"
-    cursor.execute(query, (genre_data.get('id'), genre_data.get('name')))
-
-def insert_or_update_person(cursor, person_details):
+def person_row(person_details):
     gender_map = {1: 'Female', 2: 'Male'}
     gender = gender_map.get(person_details.get('gender'))
     nationality = person_details.get('place_of_birth')
-    query = """
-        INSERT INTO Person (PersonID, FullName, BirthDate, Nationality, Gender)
-        VALUES (%s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE FullName=VALUES(FullName), BirthDate=VALUES(BirthDate), 
-                                Nationality=VALUES(Nationality), Gender=VALUES(Gender);"""
-    values = (
+    return (
         person_details.get('id'), person_details.get('name'), person_details.get('birthday'),
         nationality, gender
     )
-    cursor.execute(query, values)
+
+def insert_or_update_movie(cursor, movie_details, director_id):
+    values = movie_row(movie_details, director_id)
+    try:
+        cursor.execute(MOVIE_UPSERT_SQL.format(rows=values_placeholder(1, len(values))), values)
+    except Error as e:
+        print(f"Error inserting/updating movie {values[1]}: {e}")
+
+def insert_genre(cursor, genre_data):
+    cursor.execute(GENRE_INSERT_SQL.format(rows=values_placeholder(1, 2)), (genre_data.get('id'), genre_data.get('name')))
+
+def insert_or_update_person(cursor, person_details):
+    values = person_row(person_details)
+    cursor.execute(PERSON_UPSERT_SQL.format(rows=values_placeholder(1, len(values))), values)
 
 def link_movie_to_genre(cursor, movie_id, genre_id):
-    query = "INSERT IGNORE INTO Movie_Genre (MovieID, GenreID) VALUES (%s, %s)"
-    cursor.execute(query, (movie_id, genre_id))
+    cursor.execute(MOVIE_GENRE_INSERT_SQL.format(rows=values_placeholder(1, 2)), (movie_id, genre_id))
 
 def link_movie_to_actor(cursor, movie_id, person_id):
-    query = "INSERT IGNORE INTO Movie_Actor (MovieID, PersonID) VALUES (%s, %s)"
-    cursor.execute(query, (movie_id, person_id))
+    cursor.execute(MOVIE_ACTOR_INSERT_SQL.format(rows=values_placeholder(1, 2)), (movie_id, person_id))
+
+class BufferedWriter:
+    """Collects rows per table and writes them as multi-row statements.
+
+    Rows are flushed in foreign-key order (Person -> Movie -> Genre -> link
+    tables) whenever `batch_size` rows are pending, and the connection is
+    committed once at least `commit_interval` rows were written since the
+    last commit. Call close() at the end to write and commit the remainder.
+    With `maintain_stats`, each flush also applies the resulting deltas to
+    Genre_Stats and Director_Stats in the same transaction. With `emit_events`,
+    it appends a Change_Event row per movie actually inserted or changed and
+    per new genre link, also in the same transaction.
+
+    Movie rows the upsert would leave as they are (same TMDbScore and
+    DirectorID) are not written at all, so re-importing an unchanged page costs
+    reads only.
+    """
+
+    FLUSH_ORDER = (
+        ('Person', PERSON_UPSERT_SQL),
+        ('Movie', MOVIE_UPSERT_SQL),
+        ('Genre', GENRE_INSERT_SQL),
+        ('Movie_Genre', MOVIE_GENRE_INSERT_SQL),
+        ('Movie_Actor', MOVIE_ACTOR_INSERT_SQL),
+    )
+
+    def __init__(self, connection, batch_size=DEFAULT_WRITE_BATCH_SIZE,
+                 commit_interval=DEFAULT_COMMIT_INTERVAL, maintain_stats=True, emit_events=True):
+        self.connection = connection
+        self.maintain_stats = maintain_stats
+        self.emit_events = emit_events
+        self.cursor = connection.cursor()
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        # Keyed by primary key, so a row queued twice is only written once (last one wins).
+        self.pending = {table: {} for table, _ in self.FLUSH_ORDER}
+        self.pending_count = 0
+        self.uncommitted = 0
+        self.statements = 0
+        self.checkpoint = None
+
+    def add_row(self, table, row):
+        # Entity tables are keyed by their id column, link tables by the whole row.
+        self._add(table, row if table.startswith('Movie_') else row[0], row)
+
+    def _add(self, table, key, row):
+        rows = self.pending[table]
+        if key not in rows:
+            self.pending_count += 1
+        rows[key] = row
+        if self.pending_count >= self.batch_size:
+            self.flush()
+
+    def add_person(self, person_details):
+        row = person_row(person_details)
+        self._add('Person', row[0], row)
+
+    def add_movie(self, movie_details, director_id):
+        row = movie_row(movie_details, director_id)
+        self._add('Movie', row[0], row)
+
+    def add_genre(self, genre_data):
+        self._add('Genre', genre_data.get('id'), (genre_data.get('id'), genre_data.get('name')))
+
+    def link_genre(self, movie_id, genre_id):
+        self._add('Movie_Genre', (movie_id, genre_id), (movie_id, genre_id))
+
+    def link_actor(self, movie_id, person_id):
+        self._add('Movie_Actor', (movie_id, person_id), (movie_id, person_id))
+
+    def _write(self, table, sql, rows):
+        """Writes the rows and returns the ones the database rejected."""
+        failed = []
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            params = [value for row in chunk for value in row]
+            try:
+                self.cursor.execute(sql.format(rows=values_placeholder(len(chunk), len(chunk[0]))), params)
+                self.statements += 1
+            except Error as e:
+                # One bad row must not sink the whole batch: retry row by row and report it.
+                print(f"Batch write to {table} failed ({e}); retrying {len(chunk)} rows one at a time")
+                for row in chunk:
+                    try:
+                        self.cursor.execute(sql.format(rows=values_placeholder(1, len(row))), row)
+                    except Error as row_error:
+                        print(f"Error writing {table} row {row[:2]}: {row_error}")
+                        failed.append(row)
+                    self.statements += 1
+        return failed
+
+    def _select_in(self, sql, ids):
+        ids = list(ids)
+        if not ids:
+            return []
+        self.cursor.execute(sql.format(ids=', '.join(['%s'] * len(ids))), ids)
+        self.statements += 1
+        return self.cursor.fetchall()
+
+    def _stored_rows(self):
+        """({movie id: (score, director id)}, {(movie id, genre id)}) as stored now for the pending rows.
+
+        Must run before the rows are written; the deltas and events are worked
+        out afterwards, from the pending rows that were actually written.
+        """
+        movie_ids = set(self.pending['Movie']) | {movie_id for movie_id, _ in self.pending['Movie_Genre']}
+        old_movies = {movie_id: (score, director_id) for movie_id, score, director_id in self._select_in(
+            "SELECT MovieID, TMDbScore, DirectorID FROM Movie WHERE MovieID IN ({ids})", movie_ids)}
+        stored_links = set(self._select_in(
+            "SELECT MovieID, GenreID FROM Movie_Genre WHERE MovieID IN ({ids})", movie_ids))
+        return old_movies, stored_links
 
-def fetch_movies_from_list(api_key, list_type='popular', page_number=1):
-    api_url = f"https://api.themoviedb.org/3/movie/{list_type}?api_key={api_key}&language=en-US&page={page_number}"
+    def _drop_unchanged_movies(self, old_movies):
+        movies = self.pending['Movie']
+        for movie_id in [movie_id for movie_id, row in movies.items()
+                         if old_movies.get(movie_id) == (stored_score(row[5]), row[6])]:
+            del movies[movie_id]
+
+    def _change_events(self, old_movies, stored_links):
+        """Change_Event rows for the pending Movie and Movie_Genre rows; only real changes."""
+        events = []
+        for movie_id, row in self.pending['Movie'].items():
+            new = {'tmdbscore': stored_score(row[5]), 'directorid': row[6]}
+            if movie_id in old_movies:
+                old = dict(zip(('tmdbscore', 'directorid'), old_movies[movie_id]))
+                changes = {field: [old[field], value] for field, value in new.items() if old[field] != value}
+                events.append(('movie', movie_id, 'update', changes))
+            else:
+                new.update(title=row[1], releaseyear=row[2])
+                events.append(('movie', movie_id, 'insert',
+                               {field: [None, value] for field, value in new.items() if value is not None}))
+        for movie_id, genre_id in self.pending['Movie_Genre']:
+            if (movie_id, genre_id) not in stored_links:
+                events.append(('movie_genre', movie_id, 'insert', {'genreid': [None, genre_id]}))
+        return [(table, row_id, action, json.dumps(changes, default=str))
+                for table, row_id, action, changes in events]
+
+    def _stats_deltas(self, old_movies, stored_links):
+        """Genre/director stat changes the pending Movie and Movie_Genre rows will cause."""
+        genre_deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+        director_deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+
+        def add(deltas, key, contribution, sign=1):
+            if key is None:
+                return
+            for i, value in enumerate(contribution):
+                deltas[key][i] += sign * value
+
+        movies = self.pending['Movie']
+        new_links = self.pending['Movie_Genre']
+
+        for movie_id, row in movies.items():
+            new_contribution = score_contribution(row[5])
+            if movie_id in old_movies:
+                old_score, old_director_id = old_movies[movie_id]
+                old_contribution = score_contribution(old_score)
+                add(director_deltas, old_director_id, old_contribution, -1)
+                # The upsert only changes TMDbScore and DirectorID; the movie count stays.
+                score_change = [0] + [new - old for new, old in zip(new_contribution[1:], old_contribution[1:])]
+                for link_movie_id, genre_id in stored_links:
+                    if link_movie_id == movie_id:
+                        add(genre_deltas, genre_id, score_change)
+            add(director_deltas, row[6], new_contribution)
+
+        for movie_id, genre_id in new_links:
+            if (movie_id, genre_id) in stored_links:
+                continue
+            if movie_id in movies:
+                add(genre_deltas, genre_id, score_contribution(movies[movie_id][5]))
+            elif movie_id in old_movies:
+                add(genre_deltas, genre_id, score_contribution(old_movies[movie_id][0]))
+        return genre_deltas, director_deltas
+
+    def _write_stats(self, sql, deltas):
+        rows = [(key, *values) for key, values in deltas.items() if any(values)]
+        if rows:
+            self._write('stats', sql, rows)
+
+    def flush(self):
+        stored = None
+        if self.pending_count and (self.maintain_stats or self.emit_events):
+            stored = self._stored_rows()
+            self._drop_unchanged_movies(stored[0])
+        for table, sql in self.FLUSH_ORDER:
+            rows = self.pending[table]
+            if rows:
+                failed = set(self._write(table, sql, list(rows.values())))
+                # Rejected rows changed nothing, so they must not reach the stats or the events.
+                for key in [key for key, row in rows.items() if row in failed]:
+                    del rows[key]
+        if stored:
+            if self.maintain_stats:
+                genre_deltas, director_deltas = self._stats_deltas(*stored)
+                self._write_stats(GENRE_STATS_UPSERT_SQL, genre_deltas)
+                self._write_stats(DIRECTOR_STATS_UPSERT_SQL, director_deltas)
+            if self.emit_events:
+                events = self._change_events(*stored)
+                if events:
+                    self._write('Change_Event', CHANGE_EVENT_INSERT_SQL, events)
+        self.pending = {table: {} for table, _ in self.FLUSH_ORDER}
+        self.uncommitted += self.pending_count
+        self.pending_count = 0
+        if self.uncommitted >= self.commit_interval:
+            self.commit()
+
+    def set_checkpoint(self, list_name, page, movie_id):
+        # Saved with the next commit, so it never runs ahead of the rows it describes.
+        self.checkpoint = (list_name, page, movie_id)
+
+    def commit(self):
+        if self.checkpoint:
+            save_checkpoint(self.cursor, *self.checkpoint)
+            self.checkpoint = None
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.flush()
+        self.commit()
+        self.cursor.close()
+
+def save_checkpoint(cursor, list_name, page, movie_id):
+    cursor.execute("""
+        INSERT INTO Import_Checkpoint (ListName, Page, MovieID) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE Page = VALUES(Page), MovieID = VALUES(MovieID)""",
+        (list_name, page, movie_id))
+
+def load_checkpoints(cursor):
+    """Returns {list_name: (page, last_movie_id)} left behind by an unfinished run."""
+    cursor.execute("SELECT ListName, Page, MovieID FROM Import_Checkpoint")
+    return {list_name: (page, movie_id) for list_name, page, movie_id in cursor.fetchall()}
+
+def clear_checkpoints(cursor):
+    cursor.execute("DELETE FROM Import_Checkpoint")
+
+def start_import_run(cursor, mode):
+    cursor.execute("INSERT INTO Import_Run (Mode) VALUES (%s)", (mode,))
+    return cursor.lastrowid
+
+def finish_import_run(cursor, run_id):
+    cursor.execute("UPDATE Import_Run SET FinishedAt = CURRENT_TIMESTAMP WHERE RunID = %s", (run_id,))
+
+def last_successful_run_start(cursor):
+    cursor.execute("SELECT MAX(StartedAt) FROM Import_Run WHERE FinishedAt IS NOT NULL")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def existing_ids(cursor, table, id_column, ids, chunk_size=1000):
+    ids = list(ids)
+    found = set()
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        cursor.execute(
+            f"SELECT {id_column} FROM {table} WHERE {id_column} IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        found.update(row[0] for row in cursor.fetchall())
+    return found
+
+class TokenBucket:
+    """Shared rate limiter: `rate` tokens per second, bursts of up to `capacity`.
+
+    Callers reserve a token and sleep for the returned delay, so the bucket
+    itself never blocks and can be shared by threads and coroutines alike.
+    """
+
+    def __init__(self, rate=None, capacity=None):
+        # Defaults are read at call time so TMDB_REQUESTS_PER_SECOND can be changed (e.g. by benchmarks).
+        self.rate = rate or TMDB_REQUESTS_PER_SECOND
+        self.capacity = capacity or TMDB_BURST
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            # A negative balance means we borrowed from the future; wait it out.
+            return max(0.0, -self.tokens / self.rate)
+
+    def wait(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+def create_http_session(pool_size=MAX_CONCURRENT_REQUESTS):
+    # One keep-alive connection pool shared by every TMDb call.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def fetch_movies_from_list(api_key, list_type='popular', page_number=1, session=None):
+    api_url = f"{TMDB_API_BASE}/movie/{list_type}?api_key={api_key}&language=en-US&page={page_number}"
     print(f"Fetching page {page_number} from '{list_type}' list...")
     try:
-        response = requests.get(api_url)
+        response = (session or requests).get(api_url)
         response.raise_for_status()
         return response.json().get('results', [])
     except requests.exceptions.RequestException: 
         return None
 
-def fetch_movie_details(api_key, movie_id):
-    api_url = f"https://api.themoviedb.org/3/movie/{movie_id}?api_key={api_key}&language=en-US&append_to_response=credits"
+def fetch_movie_details(api_key, movie_id, session=None):
+    api_url = f"{TMDB_API_BASE}/movie/{movie_id}?api_key={api_key}&language=en-US&append_to_response=credits"
     try:
-        response = requests.get(api_url)
+        response = (session or requests).get(api_url)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException: 
         return None
 
-def fetch_person_details(api_key, person_id):
-    api_url = f"https://api.themoviedb.org/3/person/{person_id}?api_key={api_key}&language=en-US"
+def fetch_person_details(api_key, person_id, session=None):
+    api_url = f"{TMDB_API_BASE}/person/{person_id}?api_key={api_key}&language=en-US"
     try:
-        response = requests.get(api_url)
+        response = (session or requests).get(api_url)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException: 
         return None
 
+class ResponseCache:
+    """SQLite-backed cache of TMDb responses keyed by (endpoint, id).
+
+    Entries older than their endpoint's TTL count as misses. Once the table
+    holds more than `max_entries` rows the least recently used ones are
+    evicted. An in-process identity map sits in front of the disk so every
+    (endpoint, id) is loaded at most once per run, even by concurrent callers.
+    """
+
+    EVICT_CHECK_EVERY = 500
+
+    def __init__(self, path=TMDB_CACHE_PATH, ttls=None, max_entries=TMDB_CACHE_MAX_ENTRIES):
+        self.ttls = ttls or TMDB_CACHE_TTLS
+        self.max_entries = max_entries
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                endpoint TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                body TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (endpoint, id)
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self.db.commit()
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._inflight = {}
+        self._puts_since_evict = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _read(self, endpoint, key):
+        with self._lock:
+            row = self.db.execute(
+                "SELECT body, fetched_at FROM responses WHERE endpoint = ? AND id = ?", (endpoint, key)).fetchone()
+            if row is None:
+                return None
+            body, fetched_at = row
+            now = time.time()
+            if now - fetched_at > self.ttls.get(endpoint, 0):
+                return None
+            self.db.execute(
+                "UPDATE responses SET accessed_at = ? WHERE endpoint = ? AND id = ?", (now, endpoint, key))
+            self.db.commit()
+            return json.loads(body)
+
+    def _write(self, endpoint, key, value):
+        with self._lock:
+            now = time.time()
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (endpoint, id, body, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (endpoint, key, json.dumps(value), now, now))
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= self.EVICT_CHECK_EVERY:
+                self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        self._puts_since_evict = 0
+        (count,) = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.db.execute(
+                "DELETE FROM responses WHERE rowid IN "
+                "(SELECT rowid FROM responses ORDER BY accessed_at LIMIT ?)", (excess,))
+            self.evictions += excess
+
+    def fetch(self, endpoint, key, load):
+        """Returns the cached response, calling load() only on a miss."""
+        cache_key = (endpoint, key)
+        with self._lock:
+            if cache_key in self._memory:
+                self.memory_hits += 1
+                return self._memory[cache_key]
+            future = self._inflight.get(cache_key)
+            is_owner = future is None
+            if is_owner:
+                future = self._inflight[cache_key] = Future()
+        if not is_owner:
+            # Another thread is already loading this key; share its result.
+            return future.result()
+
+        try:
+            value = self._read(endpoint, key)
+            with self._lock:
+                if value is not None:
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+            if value is None:
+                value = load()
+                if value is not None:
+                    self._write(endpoint, key, value)
+            with self._lock:
+                if value is not None:
+                    self._memory[cache_key] = value
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(cache_key, None)
+
+    def invalidate(self, endpoint, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._memory.pop((endpoint, key), None)
+            self.db.executemany("DELETE FROM responses WHERE endpoint = ? AND id = ?", [(endpoint, key) for key in keys])
+            self.db.commit()
+
+    def report(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hit_rate = (self.memory_hits + self.disk_hits) / lookups * 100 if lookups else 0.0
+        print(f"TMDb cache: {lookups} lookups, {self.memory_hits} in-memory hits, {self.disk_hits} disk hits, "
+              f"{self.misses} misses ({hit_rate:.1f}% hit rate), {self.evictions} evicted")
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+def cached_fetch(cache, endpoint, key, load):
+    if cache is None:
+        return load()
+    return cache.fetch(endpoint, key, load)
+
+def fetch_changed_ids(api_key, endpoint, since, until, limiter, session=None):
+    """Collects ids from TMDb's /{endpoint}/changes list between two dates."""
+    changed = set()
+    window_start = since
+    while window_start <= until:
+        window_end = min(until, window_start + datetime.timedelta(days=TMDB_CHANGES_WINDOW_DAYS - 1))
+        page, total_pages = 1, 1
+        while page <= total_pages:
+            api_url = (f"{TMDB_API_BASE}/{endpoint}/changes?api_key={api_key}"
+                       f"&start_date={window_start.isoformat()}&end_date={window_end.isoformat()}&page={page}")
+            limiter.wait()
+            try:
+                response = (session or requests).get(api_url)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                raise RuntimeError(f"Could not read the {endpoint} change list: {e}")
+            data = response.json()
+            changed.update(item['id'] for item in data.get('results', []) if item.get('id') is not None)
+            total_pages = data.get('total_pages', 1)
+            page += 1
+        window_start = window_end + datetime.timedelta(days=1)
+    return changed
+
+def get_director_id(movie_details):
+    for member in movie_details.get('credits', {}).get('crew', []):
+        if member.get('job') == 'Director':
+            return member.get('id')
+    return None
+
+def get_cast_ids(movie_details, limit=ACTORS_PER_MOVIE):
+    return [actor.get('id') for actor in movie_details.get('credits', {}).get('cast', [])[:limit]]
+
+class AsyncTMDbFetcher:
+    """Runs the blocking fetch_* functions concurrently on a pooled session.
+
+    Every call first takes a token from the shared TokenBucket, so the overall
+    request rate stays inside TMDb's quota no matter how many run at once.
+    """
+
+    def __init__(self, api_key, requests_per_second=None,
+                 max_concurrency=MAX_CONCURRENT_REQUESTS, cache=None):
+        self.api_key = api_key
+        self.cache = cache
+        self.limiter = TokenBucket(requests_per_second, min(TMDB_BURST, max_concurrency))
+        self.session = create_http_session(max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def _call(self, fetch_func, *args):
+        await self.limiter.acquire()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, lambda: fetch_func(self.api_key, *args, session=self.session))
+
+    async def _call_cached(self, endpoint, fetch_func, key):
+        if self.cache is None:
+            return await self._call(fetch_func, key)
+
+        def load():
+            # Only cache misses spend a rate-limit token.
+            self.limiter.wait()
+            return fetch_func(self.api_key, key, session=self.session)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.cache.fetch, endpoint, key, load)
+
+    async def movies_from_list(self, list_type, page_number):
+        return await self._call(fetch_movies_from_list, list_type, page_number)
+
+    async def movie_details(self, movie_id):
+        return await self._call_cached('movie', fetch_movie_details, movie_id)
+
+    async def person_details(self, person_id):
+        return await self._call_cached('person', fetch_person_details, person_id)
+
+    async def fetch_page(self, list_type, page_number, after_movie_id=None):
+        """Returns [(movie_details, {person_id: person_details}), ...] for one list page.
+
+        With `after_movie_id`, only the movies listed after that one are fetched.
+        """
+        movies_summary_list = await self.movies_from_list(list_type, page_number)
+        if not movies_summary_list:
+            return []
+        movie_ids = [summary.get('id') for summary in movies_summary_list]
+        if after_movie_id in movie_ids:
+            movie_ids = movie_ids[movie_ids.index(after_movie_id) + 1:]
+        return await self.fetch_movies(movie_ids)
+
+    async def fetch_movies(self, movie_ids):
+        all_details = await asyncio.gather(*(self.movie_details(movie_id) for movie_id in movie_ids))
+        all_details = [details for details in all_details if details]
+
+        person_ids = set()
+        for details in all_details:
+            person_ids.update(get_cast_ids(details))
+            person_ids.add(get_director_id(details))
+        person_ids.discard(None)
+
+        people_by_id = await self.fetch_people(person_ids)
+        return [(details, people_by_id) for details in all_details]
+
+    async def fetch_people(self, person_ids):
+        person_ids = list(person_ids)
+        people = await asyncio.gather(*(self.person_details(pid) for pid in person_ids))
+        return {pid: person for pid, person in zip(person_ids, people) if person}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+def movie_table_rows(details, people_by_id):
+    """Maps one movie's TMDb data to the (table, row) pairs the importer writes."""
+    movie_id = details.get('id')
+    rows = []
+
+    director_id = get_director_id(details)
+    if director_id is not None:
+        if director_id in people_by_id:
+            rows.append(('Person', person_row(people_by_id[director_id])))
+        else:
+            director_id = None
+
+    rows.append(('Movie', movie_row(details, director_id)))
+
+    for genre in details.get('genres', []):
+        rows.append(('Genre', (genre.get('id'), genre.get('name'))))
+        rows.append(('Movie_Genre', (movie_id, genre.get('id'))))
+
+    for person_id in get_cast_ids(details):
+        if person_id in people_by_id:
+            rows.append(('Person', person_row(people_by_id[person_id])))
+            rows.append(('Movie_Actor', (movie_id, person_id)))
+    return rows
+
+def import_movie(writer, details, people_by_id):
+    for table, row in movie_table_rows(details, people_by_id):
+        writer.add_row(table, row)
+
+def import_page_sync(writer, api_key, list_name, page_num, limiter, session, cache=None, after_movie_id=None):
+    def load(fetch_func, key):
+        limiter.wait()
+        return fetch_func(api_key, key, session=session)
+
+    limiter.wait()
+    movies_summary_list = fetch_movies_from_list(api_key, list_name, page_num, session=session)
+    if not movies_summary_list: return
+
+    movie_ids = [summary.get('id') for summary in movies_summary_list]
+    if after_movie_id in movie_ids:
+        movies_summary_list = movies_summary_list[movie_ids.index(after_movie_id) + 1:]
+
+    for movie_summary in movies_summary_list:
+        print(f"Processing: {movie_summary.get('title')}")
+
+        movie_id = movie_summary.get('id')
+        details = cached_fetch(cache, 'movie', movie_id, lambda: load(fetch_movie_details, movie_id))
+        if not details: continue
+
+        people_by_id = {}
+        for person_id in [get_director_id(details)] + get_cast_ids(details):
+            if person_id is None: continue
+            person_details = cached_fetch(cache, 'person', person_id, lambda: load(fetch_person_details, person_id))
+            if person_details:
+                people_by_id[person_id] = person_details
+
+        import_movie(writer, details, people_by_id)
+        writer.set_checkpoint(list_name, page_num, movie_id)
+
+def pages_to_process(pages, checkpoint):
+    """Yields (page, after_movie_id), skipping pages a previous run already finished."""
+    resume_page, resume_movie_id = checkpoint or (None, None)
+    for page_num in pages:
+        if resume_page is not None and page_num < resume_page:
+            continue
+        yield page_num, (resume_movie_id if page_num == resume_page else None)
+
+async def import_lists_async(writer, api_key, lists_to_process, pages, cache=None, checkpoints=None):
+    checkpoints = checkpoints or {}
+    fetcher = AsyncTMDbFetcher(api_key, cache=cache)
+    next_page = None
+    try:
+        for list_name in lists_to_process:
+            print(f"\n================ PROCESSING: {list_name.upper()} ================")
+            todo = list(pages_to_process(pages, checkpoints.get(list_name)))
+            if not todo: continue
+            # Fetch the next page while the current one is being written.
+            next_page = asyncio.create_task(fetcher.fetch_page(list_name, *todo[0]))
+            for index, (page_num, _) in enumerate(todo):
+                print(f"\n--- Processing Page {page_num} from '{list_name}' list ---")
+                page_movies = await next_page
+                if index + 1 < len(todo):
+                    next_page = asyncio.create_task(fetcher.fetch_page(list_name, *todo[index + 1]))
+
+                for details, people_by_id in page_movies:
+                    print(f"Processing: {details.get('title')}")
+                    import_movie(writer, details, people_by_id)
+                    writer.set_checkpoint(list_name, page_num, details.get('id'))
+
+                print(f"--- Flushing writes for Page {page_num} of {list_name} ---")
+                writer.flush()
+    finally:
+        if next_page and not next_page.done():
+            # A failed write must not leave the prefetch running against a closed fetcher.
+            next_page.cancel()
+        fetcher.close()
+
+async def refresh_changed_async(writer, api_key, since, cache=None):
+    """Re-imports only the movies and people TMDb reports as changed since `since`."""
+    fetcher = AsyncTMDbFetcher(api_key, cache=cache)
+    try:
+        today = datetime.date.today()
+        changed_movies = fetch_changed_ids(api_key, 'movie', since, today, fetcher.limiter, fetcher.session)
+        changed_people = fetch_changed_ids(api_key, 'person', since, today, fetcher.limiter, fetcher.session)
+        # The change lists cover all of TMDb; we only refresh what we already store.
+        movie_ids = existing_ids(writer.cursor, 'Movie', 'MovieID', changed_movies)
+        person_ids = existing_ids(writer.cursor, 'Person', 'PersonID', changed_people)
+        print(f"{len(movie_ids)} stored movies and {len(person_ids)} stored people changed since {since}")
+
+        if cache:
+            cache.invalidate('movie', movie_ids)
+            cache.invalidate('person', person_ids)
+
+        for details, people_by_id in await fetcher.fetch_movies(sorted(movie_ids)):
+            print(f"Refreshing: {details.get('title')}")
+            import_movie(writer, details, people_by_id)
+
+        for person_details in (await fetcher.fetch_people(sorted(person_ids))).values():
+            writer.add_person(person_details)
+        writer.flush()
+    finally:
+        fetcher.close()
+
+PIPELINE_STOP = object()
+
+class StageMetrics:
+    LATENCY_SAMPLES = 10_000
+
+    def __init__(self, name, is_source=False):
+        self.name = name
+        self.is_source = is_source
+        # Reservoir sample of per-item busy times, for percentiles without unbounded memory.
+        self.latencies = []
+        self._rng = random.Random(0)
+        self.items = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def record(self, busy_seconds, blocked_seconds, failed=False):
+        with self._lock:
+            self.items += 1
+            self.errors += failed
+            self.busy_seconds += busy_seconds
+            self.blocked_seconds += blocked_seconds
+            if len(self.latencies) < self.LATENCY_SAMPLES:
+                self.latencies.append(busy_seconds)
+            else:
+                slot = self._rng.randrange(self.items)
+                if slot < self.LATENCY_SAMPLES:
+                    self.latencies[slot] = busy_seconds
+
+    def record_depth(self, depth):
+        with self._lock:
+            self.emitted += 1
+            self.depth_samples += 1
+            self.depth_total += depth
+            self.max_depth = max(self.max_depth, depth)
+
+    def percentile(self, fraction):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def report(self, elapsed):
+        # A source stage has no inputs, so its throughput is what it emitted.
+        count = self.emitted if self.is_source else self.items
+        rate = count / elapsed if elapsed else 0.0
+        avg_depth = self.depth_total / self.depth_samples if self.depth_samples else 0.0
+        return (f"{self.name:<10} {count:>7} items {rate:>9.1f}/s  busy {self.busy_seconds:>7.1f}s  "
+                f"blocked {self.blocked_seconds:>7.1f}s  errors {self.errors}  "
+                f"out-queue depth avg {avg_depth:.1f} max {self.max_depth}")
+
+class PipelineStage:
+    """A pool of worker threads moving items from `inbox` to `outbox`.
+
+    `handler(item)` returns an iterable of output items. A stage with no inbox
+    is a source and calls `handler(None)` once per worker. Bounded queues make
+    a fast stage block until the slower stage after it catches up; that wait is
+    reported as "blocked" time, separate from the time spent working.
+    """
+
+    def __init__(self, name, handler, workers=1, inbox=None, outbox=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.metrics = StageMetrics(name, is_source=inbox is None)
+        self.downstream_workers = 0
+        self._threads = []
+
+    def _work(self):
+        while True:
+            item = self.inbox.get() if self.inbox is not None else None
+            if item is PIPELINE_STOP:
+                return
+            started = time.perf_counter()
+            blocked = 0.0
+            failed = False
+            try:
+                for result in self.handler(item) or ():
+                    if self.outbox is None: continue
+                    put_started = time.perf_counter()
+                    self.outbox.put(result)
+                    blocked += time.perf_counter() - put_started
+                    self.metrics.record_depth(self.outbox.qsize())
+            except Exception as e:
+                print(f"[{self.name}] failed on {item!r:.80}: {e}")
+                failed = True
+            self.metrics.record(time.perf_counter() - started - blocked, blocked, failed)
+            if self.inbox is None:
+                return
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+        # Everything upstream is done: tell each worker of the next stage to stop.
+        for _ in range(self.downstream_workers):
+            self.outbox.put(PIPELINE_STOP)
+
+class PageTracker:
+    """Turns out-of-order movie completions into in-order per-list checkpoints."""
+
+    def __init__(self):
+        self._pending = {}
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def add_page(self, list_name, page, movie_ids):
+        with self._lock:
+            self._pending[(list_name, page)] = (set(movie_ids), movie_ids[-1])
+            self._pages.setdefault(list_name, []).append(page)
+
+    def movie_done(self, list_name, page, movie_id):
+        """Returns (list, page, last_movie_id) once a page and all pages before it are written."""
+        with self._lock:
+            self._pending[(list_name, page)][0].discard(movie_id)
+            checkpoint = None
+            pages = self._pages[list_name]
+            while pages and not self._pending[(list_name, pages[0])][0]:
+                done_page = pages.pop(0)
+                checkpoint = (list_name, done_page, self._pending.pop((list_name, done_page))[1])
+            return checkpoint
+
+def run_pipeline(writers, api_key, lists_to_process, pages, cache=None, checkpoints=None,
+                 fetch_workers=MAX_CONCURRENT_REQUESTS, transform_workers=2, queue_size=100):
+    """Imports through separate list, fetch, transform and write stages.
+
+    There is one write worker per BufferedWriter in `writers`, since each needs
+    its own connection, and each movie always goes to writer `movie_id %
+    len(writers)`. Checkpoints are only recorded with a single writer, because
+    with several no one commit covers every finished page.
+    """
+    checkpoints = checkpoints or {}
+    limiter = TokenBucket()
+    session = create_http_session(fetch_workers)
+    tracker = PageTracker() if len(writers) == 1 else None
+    movie_queue = queue.Queue(maxsize=queue_size)
+    fetched_queue = queue.Queue(maxsize=queue_size)
+    rows_queue = queue.Queue(maxsize=queue_size)
+
+    def load(fetch_func, key):
+        limiter.wait()
+        return fetch_func(api_key, key, session=session)
+
+    def list_movies(_):
+        for list_name in lists_to_process:
+            for page_num, after_movie_id in pages_to_process(pages, checkpoints.get(list_name)):
+                limiter.wait()
+                summaries = fetch_movies_from_list(api_key, list_name, page_num, session=session) or []
+                movie_ids = [summary.get('id') for summary in summaries]
+                if after_movie_id in movie_ids:
+                    movie_ids = movie_ids[movie_ids.index(after_movie_id) + 1:]
+                if not movie_ids: continue
+                if tracker:
+                    tracker.add_page(list_name, page_num, movie_ids)
+                for movie_id in movie_ids:
+                    yield (list_name, page_num, movie_id)
+
+    def fetch(item):
+        movie_id = item[2]
+        details = cached_fetch(cache, 'movie', movie_id, lambda: load(fetch_movie_details, movie_id))
+        people_by_id = {}
+        if details:
+            for person_id in [get_director_id(details)] + get_cast_ids(details):
+                if person_id is None: continue
+                person = cached_fetch(cache, 'person', person_id, lambda: load(fetch_person_details, person_id))
+                if person:
+                    people_by_id[person_id] = person
+        # Failed lookups still travel on, so the page tracker sees every movie finish.
+        yield item, details, people_by_id
+
+    def transform(fetched):
+        item, details, people_by_id = fetched
+        yield item, (movie_table_rows(details, people_by_id) if details else [])
+
+    # A writer works out stats deltas and change events from what its own connection
+    # reads, so every row of a movie has to go through the same writer.
+    writer_locks = [threading.Lock() for _ in writers]
+
+    def write(transformed):
+        (list_name, page_num, movie_id), rows = transformed
+        index = movie_id % len(writers)
+        with writer_locks[index]:
+            writer = writers[index]
+            for table, row in rows:
+                writer.add_row(table, row)
+            if tracker:
+                checkpoint = tracker.movie_done(list_name, page_num, movie_id)
+                if checkpoint:
+                    writer.set_checkpoint(*checkpoint)
+        return ()
+
+    stages = [
+        PipelineStage("list", list_movies, 1, None, movie_queue),
+        PipelineStage("fetch", fetch, fetch_workers, movie_queue, fetched_queue),
+        PipelineStage("transform", transform, transform_workers, fetched_queue, rows_queue),
+        PipelineStage("write", write, len(writers), rows_queue, None),
+    ]
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.downstream_workers = next_stage.workers
+
+    started = time.perf_counter()
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.join()
+    for writer in writers:
+        writer.flush()
+    session.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\nPipeline finished in {elapsed:.1f}s")
+    for stage in stages:
+        print("  " + stage.metrics.report(elapsed))
+    return stages
+
+def run_import(db_connection, api_key, lists_to_process, pages, fetch_mode="async", incremental=False,
+               resume=True, batch_size=DEFAULT_WRITE_BATCH_SIZE, commit_interval=DEFAULT_COMMIT_INTERVAL, cache=None,
+               connect=None, fetch_workers=MAX_CONCURRENT_REQUESTS, transform_workers=2, write_workers=1,
+               queue_size=100):
+    writer = BufferedWriter(db_connection, batch_size, commit_interval)
+    cursor = writer.cursor
+    since = last_successful_run_start(cursor) if incremental else None
+    if incremental and since is None:
+        print("No successful run recorded yet; falling back to a full import.")
+        incremental = False
+
+    stages = []
+    run_id = start_import_run(cursor, "incremental" if incremental else "full")
+    db_connection.commit()
+    try:
+        if incremental:
+            asyncio.run(refresh_changed_async(writer, api_key, since.date(), cache))
+        else:
+            checkpoints = load_checkpoints(cursor) if resume else {}
+            if checkpoints:
+                print(f"Resuming from checkpoints: {checkpoints}")
+            if fetch_mode == "pipeline":
+                # Extra write workers each need their own connection from `connect`.
+                extra_writers = [BufferedWriter(connect(), batch_size, commit_interval)
+                                 for _ in range(write_workers - 1)]
+                try:
+                    stages = run_pipeline([writer] + extra_writers, api_key, lists_to_process, pages, cache, checkpoints,
+                                 fetch_workers, transform_workers, queue_size)
+                finally:
+                    for extra_writer in extra_writers:
+                        extra_writer.close()
+                        extra_writer.connection.close()
+            elif fetch_mode == "async":
+                asyncio.run(import_lists_async(writer, api_key, lists_to_process, pages, cache, checkpoints))
+            else:
+                limiter = TokenBucket()
+                session = create_http_session()
+                for list_name in lists_to_process:
+                    print(f"\n================ PROCESSING: {list_name.upper()} ================")
+                    for page_num, after_movie_id in pages_to_process(pages, checkpoints.get(list_name)):
+                        print(f"\n--- Processing Page {page_num} from '{list_name}' list ---")
+                        import_page_sync(writer, api_key, list_name, page_num, limiter, session, cache, after_movie_id)
+                        print(f"--- Flushing writes for Page {page_num} of {list_name} ---")
+                        writer.flush()
+                session.close()
+            clear_checkpoints(cursor)
+        writer.flush()
+        finish_import_run(cursor, run_id)
+    finally:
+        # On failure this still commits what was written, together with its checkpoint.
+        writer.close()
+    return writer, stages
+
 if __name__ == "__main__":
     MY_API_KEY = "YOUR_API_KEY"
     DB_PASSWORD = "YOUR_PASSWORD"
-    
+
+    parser = argparse.ArgumentParser(description="Import movies and people from TMDb into movie_rating_db.")
+    parser.add_argument("--lists", nargs="+", default=['popular', 'top_rated'])
+    parser.add_argument("--pages", type=int, default=3, help="Pages to import from each list.")
+    parser.add_argument("--fetch-mode", choices=["async", "sync", "pipeline"], default="async",
+                        help="'async' fetches details and people in parallel; 'sync' does one request at a time; "
+                             "'pipeline' runs fetch, transform and write as separate worker pools.")
+    parser.add_argument("--fetch-workers", type=int, default=MAX_CONCURRENT_REQUESTS)
+    parser.add_argument("--transform-workers", type=int, default=2)
+    parser.add_argument("--write-workers", type=int, default=1,
+                        help="Pipeline write workers, each with its own MySQL connection.")
+    parser.add_argument("--queue-size", type=int, default=100, help="Capacity of each queue between pipeline stages.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only refresh stored movies and people that changed since the last successful run.")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints left by an interrupted run.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_WRITE_BATCH_SIZE,
+                        help="Rows per multi-row INSERT statement.")
+    parser.add_argument("--commit-interval", type=int, default=DEFAULT_COMMIT_INTERVAL,
+                        help="Rows written between commits.")
+    parser.add_argument("--no-cache", action="store_true", help="Always hit the API for movie and person details.")
+    parser.add_argument("--api-base", default=TMDB_API_BASE, help="TMDb API root, e.g. a local fake_tmdb_server.py.")
+    args = parser.parse_args()
+    TMDB_API_BASE = args.api_base
+
     db_connection = create_db_connection("localhost", "root", DB_PASSWORD, "movie_rating_db")
     
     if db_connection and db_connection.is_connected():
-        cursor = db_connection.cursor()
-        
-        lists_to_process = ['popular', 'top_rated']
-        
-        for list_name in lists_to_process:
-            print(f"\n================ PROCESSING: {list_name.upper()} ================")
-            for page_num in range(1, 4):
-                print(f"\n--- Processing Page {page_num} from '{list_name}' list ---")
-                movies_summary_list = fetch_movies_from_list(MY_API_KEY, list_name, page_num)
-                if not movies_summary_list: continue
-
-                for movie_summary in movies_summary_list:
-                    movie_id = movie_summary.get('id')
-                    movie_title = movie_summary.get('title')
-                    print(f"Processing: {movie_title}")
-                    
-                    details = fetch_movie_details(MY_API_KEY, movie_id)
-                    if not details: continue
-                    
-                    director_id = None
-                    crew = details.get('credits', {}).get('crew', [])
-                    for member in crew:
-                        if member.get('job') == 'Director':
-                            director_id = member.get('id')
-                            person_details = fetch_person_details(MY_API_KEY, director_id)
-                            if person_details:
-                                insert_or_update_person(cursor, person_details)
-                            time.sleep(0.2)
-                            break
-                    
-                    insert_or_update_movie(cursor, details, director_id)
-
-                    for genre in details.get('genres', []):
-                        insert_genre(cursor, genre)
-                        link_movie_to_genre(cursor, movie_id, genre.get('id'))
-
-                    for actor_summary in details.get('credits', {}).get('cast', [])[:5]:
-                        person_id = actor_summary.get('id')
-                        person_details = fetch_person_details(MY_API_KEY, person_id)
-                        if person_details:
-                            insert_or_update_person(cursor, person_details)
-                            link_movie_to_actor(cursor, movie_id, person_id)
-                        time.sleep(0.2)
-                
-                print(f"--- Committing changes for Page {page_num} of {list_name} ---")
-                db_connection.commit()
+        cache = None if args.no_cache else ResponseCache()
+        try:
+            writer, _ = run_import(db_connection, MY_API_KEY, args.lists, list(range(1, args.pages + 1)),
+                                fetch_mode=args.fetch_mode, incremental=args.incremental, resume=not args.restart,
+                                batch_size=args.batch_size, commit_interval=args.commit_interval, cache=cache,
+                                connect=lambda: create_db_connection("localhost", "root", DB_PASSWORD, "movie_rating_db"),
+                                fetch_workers=args.fetch_workers, transform_workers=args.transform_workers,
+                                write_workers=args.write_workers, queue_size=args.queue_size)
+        finally:
+            if cache:
+                cache.report()
+                cache.close()
         
-        print("\nAll data has been successfully inserted/updated!")
+        print(f"\nAll data has been successfully inserted/updated! ({writer.statements} write statements)")
         
-        cursor.close()
         db_connection.close()
         print("MySQL connection is closed.")
\ No newline at end of file
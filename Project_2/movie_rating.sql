@@ -189,19 +189,13 @@ CALL sp_GetMoviesByGenre('Drama');
 CALL sp_GetMoviesByGenre('Science Fiction');
 
 
+-- trg_AfterMovieUpdate used to add a Movie_Log row for every updated movie, including each
+-- no-op ON DUPLICATE KEY UPDATE from the importer. Real changes are now recorded, with their
+-- field diff, in Change_Event (see schema.sql and Project_3/movies/outbox.py).
 DROP TRIGGER IF EXISTS trg_AfterMovieUpdate;
 
-DELIMITER $$
-CREATE TRIGGER trg_AfterMovieUpdate
-AFTER UPDATE ON Movie
-FOR EACH ROW
-BEGIN
-    INSERT INTO Movie_Log (MovieID, ActionType)
-    VALUES (NEW.MovieID, CONCAT('Movie details updated. New score: ', NEW.TMDbScore));
-END$$
-DELIMITER ;
--- Create an index on the 'Title' column of the 'Movie' table to speed up searches.
-CREATE INDEX idx_movie_title ON Movie (Title);
+-- The index on the 'Title' column of the 'Movie' table that speeds up these searches,
+-- idx_movie_title, is created with the table in schema.sql (and by the Django migrations).
 
 SELECT * FROM Movie WHERE Title = 'Inception';
 EXPLAIN SELECT * FROM Movie WHERE Title = 'Inception';
\ No newline at end of file
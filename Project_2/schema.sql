@@ -19,7 +19,8 @@ CREATE TABLE IF NOT EXISTS Person (
   FullName VARCHAR(255) NOT NULL,
   BirthDate DATE NULL,
   Gender VARCHAR(50) NULL,
-  Nationality VARCHAR(100) NULL
+  Nationality VARCHAR(100) NULL,
+  INDEX idx_person_fullname (FullName)
 );
 
 CREATE TABLE IF NOT EXISTS Movie (
@@ -32,6 +33,11 @@ CREATE TABLE IF NOT EXISTS Movie (
   PosterURL VARCHAR(512) NULL,
   TMDbScore DECIMAL(3, 1) NULL,
   DirectorID INT NULL,
+  -- Same indexes as Movie.Meta.indexes in Project_3 (see `manage.py advise_indexes`).
+  INDEX idx_movie_tmdbscor_releasey (TMDbScore, ReleaseYear),
+  INDEX idx_movie_countr_releas_durati (Country, ReleaseYear, DurationInMinutes),
+  INDEX idx_movie_durationinminutes (DurationInMinutes),
+  INDEX idx_movie_title (Title),
   CONSTRAINT fk_director FOREIGN KEY (DirectorID) REFERENCES Person(PersonID) ON DELETE SET NULL
 );
 
@@ -69,6 +75,126 @@ CREATE TABLE IF NOT EXISTS Rating (
   FOREIGN KEY (MovieID) REFERENCES Movie(MovieID) ON DELETE CASCADE
 );
 
+-- Summary tables kept current by deltas (Django signals and the importer); see v_GenreStats for the full-scan version.
+CREATE TABLE IF NOT EXISTS Genre_Stats (
+  GenreID INT PRIMARY KEY,
+  MovieCount INT NOT NULL DEFAULT 0,
+  ScoredCount INT NOT NULL DEFAULT 0,
+  ScoreSum DECIMAL(12, 1) NOT NULL DEFAULT 0,
+  FOREIGN KEY (GenreID) REFERENCES Genre(GenreID) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS Director_Stats (
+  DirectorID INT PRIMARY KEY,
+  MovieCount INT NOT NULL DEFAULT 0,
+  ScoredCount INT NOT NULL DEFAULT 0,
+  ScoreSum DECIMAL(12, 1) NOT NULL DEFAULT 0,
+  FOREIGN KEY (DirectorID) REFERENCES Person(PersonID) ON DELETE CASCADE
+);
+
+-- Per-movie rating counters, kept current by the Django Rating signals.
+CREATE TABLE IF NOT EXISTS Movie_Rating_Stats (
+  MovieID INT PRIMARY KEY,
+  RatingCount INT NOT NULL DEFAULT 0,
+  RatingSum INT NOT NULL DEFAULT 0,
+  RatingAvg DECIMAL(4, 2),
+  UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  INDEX idx_rating_stats_count (RatingCount DESC),
+  FOREIGN KEY (MovieID) REFERENCES Movie(MovieID) ON DELETE CASCADE
+);
+
+-- Precomputed top-rated boards (Bayesian-weighted); GenreID is NULL for the overall board.
+CREATE TABLE IF NOT EXISTS Leaderboard (
+  LeaderboardID INT AUTO_INCREMENT PRIMARY KEY,
+  GenreID INT UNIQUE,
+  PriorMean DOUBLE NOT NULL DEFAULT 0,
+  MinRatings INT NOT NULL,
+  Cutoff DOUBLE,
+  -- Running totals of every rating, on the overall board only.
+  RatingCount BIGINT NOT NULL DEFAULT 0,
+  RatingSum BIGINT NOT NULL DEFAULT 0,
+  RefreshedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  FOREIGN KEY (GenreID) REFERENCES Genre(GenreID) ON DELETE CASCADE
+);
+
+-- The overall board always exists, so rating writers have a row to lock (see Project_3/movies/stats.py).
+INSERT INTO Leaderboard (GenreID, MinRatings)
+SELECT NULL, 25 FROM DUAL WHERE NOT EXISTS (SELECT 1 FROM Leaderboard WHERE GenreID IS NULL);
+
+CREATE TABLE IF NOT EXISTS Leaderboard_Entry (
+  ID INT AUTO_INCREMENT PRIMARY KEY,
+  LeaderboardID INT NOT NULL,
+  `Rank` INT NOT NULL,
+  MovieID INT NOT NULL,
+  WeightedScore DOUBLE NOT NULL,
+  RatingCount INT NOT NULL,
+  RatingAvg DECIMAL(4, 2) NOT NULL,
+  UNIQUE KEY uq_leaderboard_rank (LeaderboardID, `Rank`),
+  FOREIGN KEY (LeaderboardID) REFERENCES Leaderboard(LeaderboardID) ON DELETE CASCADE,
+  FOREIGN KEY (MovieID) REFERENCES Movie(MovieID) ON DELETE CASCADE
+);
+
+-- Inverted index for movie search (see Project_3/movies/search.py); the (Term, MovieID) key serves exact and prefix lookups.
+CREATE TABLE IF NOT EXISTS Search_Term (
+  ID INT AUTO_INCREMENT PRIMARY KEY,
+  Term VARCHAR(64) NOT NULL,
+  MovieID INT NOT NULL,
+  Weight DOUBLE NOT NULL,
+  UNIQUE KEY uq_search_term (Term, MovieID),
+  FOREIGN KEY (MovieID) REFERENCES Movie(MovieID) ON DELETE CASCADE
+);
+
+-- Item-item recommendations (see Project_3/movies/recommender.py): the top-K neighbours of each movie.
+CREATE TABLE IF NOT EXISTS Movie_Similarity (
+  ID INT AUTO_INCREMENT PRIMARY KEY,
+  MovieID INT NOT NULL,
+  SimilarMovieID INT NOT NULL,
+  Score DOUBLE NOT NULL,
+  Source VARCHAR(10) NOT NULL,
+  UNIQUE KEY uq_similarity_pair (MovieID, SimilarMovieID),
+  INDEX idx_similarity_movie_score (MovieID, Score DESC),
+  FOREIGN KEY (MovieID) REFERENCES Movie(MovieID) ON DELETE CASCADE,
+  FOREIGN KEY (SimilarMovieID) REFERENCES Movie(MovieID) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS Similarity_Run (
+  RunID INT AUTO_INCREMENT PRIMARY KEY,
+  Mode VARCHAR(12) NOT NULL,
+  StartedAt TIMESTAMP NOT NULL,
+  FinishedAt TIMESTAMP NULL,
+  Ratings INT NOT NULL DEFAULT 0,
+  Movies INT NOT NULL DEFAULT 0
+);
+
+-- Change-event outbox (see Project_3/movies/outbox.py): one row per real insert, update or
+-- delete, with the changed fields as {"field": [old, new]}. `manage.py relay_outbox` delivers
+-- the rows to the cache and search consumers and stamps DeliveredAt.
+CREATE TABLE IF NOT EXISTS Change_Event (
+  EventID BIGINT AUTO_INCREMENT PRIMARY KEY,
+  TableName VARCHAR(30) NOT NULL,
+  RowID INT NOT NULL,
+  Action VARCHAR(10) NOT NULL,
+  Changes JSON NULL,
+  CreatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  DeliveredAt TIMESTAMP NULL,
+  INDEX idx_change_event_pending (DeliveredAt, EventID)
+);
+
+-- Importer bookkeeping: one row per run, and the last movie written per list so a crashed run can resume.
+CREATE TABLE IF NOT EXISTS Import_Run (
+  RunID INT PRIMARY KEY AUTO_INCREMENT,
+  Mode VARCHAR(20) NOT NULL,
+  StartedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FinishedAt TIMESTAMP NULL
+);
+
+CREATE TABLE IF NOT EXISTS Import_Checkpoint (
+  ListName VARCHAR(50) PRIMARY KEY,
+  Page INT NOT NULL,
+  MovieID INT NULL,
+  UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
 -- Part 3: View Creation
 -- =================================================================
 CREATE OR REPLACE VIEW v_MovieWithDirector AS
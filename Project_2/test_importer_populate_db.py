@@ -0,0 +1,104 @@
+"""Importer tests that need no MySQL server: the pipeline runs against fake_tmdb_server.py.
+
+    python -m unittest test_importer_populate_db
+"""
+import threading
+import unittest
+from collections import defaultdict
+
+import importer_populate_db as importer
+from fake_tmdb_server import FakeTMDbDataset, start_server
+
+
+class RecordingWriter:
+    """Stands in for BufferedWriter and remembers which movies' rows it was given."""
+
+    def __init__(self):
+        self.movie_rows = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add_row(self, table, row):
+        if table == 'Movie':
+            with self._lock:
+                self.movie_rows[row[0]] += 1
+
+    def set_checkpoint(self, list_name, page, movie_id):
+        pass
+
+    def flush(self):
+        pass
+
+
+class RejectingCursor:
+    """A cursor on an empty database that refuses any statement carrying `bad_value`."""
+
+    def __init__(self, bad_value):
+        self.bad_value = bad_value
+        self.written = defaultdict(list)
+
+    def execute(self, sql, params=()):
+        if sql.lstrip().startswith("SELECT"):
+            return
+        if self.bad_value in params:
+            raise importer.Error("rejected")
+        table = sql.split()[2] if sql.lstrip().startswith("INSERT INTO") else sql.split()[3]
+        self.written[table].append(tuple(params))
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class RejectingConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+
+class BufferedWriterTests(unittest.TestCase):
+    def test_rejected_rows_do_not_count(self):
+        cursor = RejectingCursor("Bad Movie")
+        writer = importer.BufferedWriter(RejectingConnection(cursor))
+        writer.add_movie({'id': 1, 'title': "Good Movie", 'vote_average': 7.0}, 10)
+        writer.add_movie({'id': 2, 'title': "Bad Movie", 'vote_average': 5.0}, 20)
+        writer.flush()
+
+        self.assertEqual(cursor.written['Movie'][-1][:2], (1, "Good Movie"))
+        self.assertEqual(cursor.written['Director_Stats'], [(10, 1, 1, importer.Decimal('7.0'))])
+        events = cursor.written['Change_Event']
+        self.assertEqual([(table, row_id, action) for table, row_id, action, _ in events], [('movie', 1, 'insert')])
+
+
+class PipelineTests(unittest.TestCase):
+    def setUp(self):
+        # Every movie is on page 1 of both lists.
+        self.server, api_base = start_server(FakeTMDbDataset(movie_count=20))
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        patches = {'TMDB_API_BASE': api_base, 'TMDB_REQUESTS_PER_SECOND': 10_000, 'TMDB_BURST': 10_000}
+        for name, value in patches.items():
+            self.addCleanup(setattr, importer, name, getattr(importer, name))
+            setattr(importer, name, value)
+
+    def test_each_movie_goes_to_one_writer(self):
+        writers = [RecordingWriter(), RecordingWriter()]
+        importer.run_pipeline(writers, "test", ['popular', 'top_rated'], [1], fetch_workers=4)
+
+        for index, writer in enumerate(writers):
+            self.assertTrue(writer.movie_rows)
+            for movie_id, count in writer.movie_rows.items():
+                self.assertEqual(movie_id % len(writers), index)
+                # Once from each list, both times through the same writer.
+                self.assertEqual(count, 2)
+        self.assertEqual(sum(len(writer.movie_rows) for writer in writers), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -41,9 +41,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it sees the session and auth queries too; a no-op unless SQL_PROFILING is on.
+    'movies.middleware.QueryProfilingMiddleware',
+    # Read-your-writes for replica routing; a no-op unless DATABASE_REPLICAS is set.
+    'movies.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Adds ETags to responses and answers matching If-None-Match requests with 304.
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -82,9 +88,70 @@ DATABASES = {
         'PASSWORD': "Mohamadnabi@12",
         'HOST': '127.0.0.1',
         'PORT': '3306',
+        # Keep connections open between requests instead of a TCP + auth handshake each time,
+        # and check them before reuse so a server restart does not surface as an error.
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas (movies/routers.py): movies-app reads are spread over these hosts ("host" or
+# "host:port", same credentials as default). To try routing locally, list 127.0.0.1 itself.
+DATABASE_REPLICA_HOSTS = []
+DATABASE_REPLICAS = []
+for number, replica_host in enumerate(DATABASE_REPLICA_HOSTS, start=1):
+    replica_host, _, replica_port = replica_host.partition(':')
+    DATABASES[f'replica{number}'] = dict(DATABASES['default'], HOST=replica_host,
+                                         PORT=replica_port or DATABASES['default']['PORT'],
+                                         TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['movies.routers.ReplicaRouter']
+# After a write, the writer's reads stay on default this long (covers replication lag).
+REPLICA_STICKY_SECONDS = 5
+# A replica that failed a ping is skipped until it is checked again, this many seconds later.
+REPLICA_HEALTH_CHECK_SECONDS = 10
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local-memory caches evict least-recently-used entries once MAX_ENTRIES is reached.
+# 'queries' holds catalog query results (movies/querycache.py) for TIMEOUT seconds.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'queries': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'queries',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+
+
+# SQL profiling (movies/profiling.py): per-request query counts, N+1 warnings,
+# and text/JSON reports in SQL_PROFILE_DIR with EXPLAIN for SELECTs slower than SQL_PROFILE_EXPLAIN_MS.
+
+SQL_PROFILING = False
+SQL_PROFILE_DIR = BASE_DIR / 'sql_profiles'
+SQL_PROFILE_EXPLAIN_MS = 100
+
+
+# Async views (movies/views.py, served by movieproject/asgi.py, e.g. `uvicorn movieproject.asgi:application`)
+# run their independent reads on separate threads and connections. Turn off for SQLite.
+ASYNC_QUERY_FANOUT = True
+
+# Columnar analytics snapshot (movies/analytics.py). When set, workers memory-map the arrays
+# written there by `manage.py build_analytics_snapshot` instead of each building its own.
+ANALYTICS_SNAPSHOT_DIR = None
+
+# Change-event outbox (movies/outbox.py): events buffered by an outbox.atomic() block are bulk-written once
+# this many pile up. `manage.py relay_outbox` delivers them; its audit lines go to 'movies.audit'.
+OUTBOX_FLUSH_SIZE = 500
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,362 @@
+"""Columnar in-memory snapshot of the catalog for vectorized aggregations.
+
+Movie is held as one numpy array per column, rows sorted by MovieID:
+
+    movieid, releaseyear, durationinminutes, tmdbscore   (NULL is NaN)
+    directorid                                           (NULL is -1)
+    country                                              code into `countries` (NULL is -1)
+    alive                                                False for movies deleted since the build
+
+MovieGenre and MovieActor are link arrays of (row, genre code) and
+(row, person id). Genre ids are dictionary-encoded like countries, so a group-by
+is one np.bincount over small integers.
+
+    snapshot = get_snapshot()
+    snapshot.query().filter(releaseyear__gt=2010).top_k('tmdbscore', 5)
+    snapshot.query().group_by('genre', 'tmdbscore')      # [(genre id, movies, average score)]
+    snapshot.query().where(lambda c: c('durationinminutes') > c('tmdbscore') * 20).count()
+
+`save()` writes the arrays as .npy files. With ANALYTICS_SNAPSHOT_DIR set,
+get_snapshot() memory-maps them read-only, so every worker process shares one
+copy through the page cache. Build the files with `manage.py
+build_analytics_snapshot` (again after an import).
+
+The signal handlers in movies/signals.py queue the ids of changed movies after
+each commit. The next get_snapshot() re-reads just those movies and swaps in new
+arrays (the old ones stay valid for queries already running). A worker that
+refreshes a memory-mapped snapshot gets a private copy from then on.
+"""
+import json
+import os
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from .models import Movie, MovieActor, MovieGenre
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MOVIE_FIELDS = ('movieid', 'releaseyear', 'durationinminutes', 'tmdbscore', 'directorid', 'country')
+NUMERIC_COLUMNS = ('releaseyear', 'durationinminutes', 'tmdbscore')
+MOVIE_ARRAYS = ('movieid', 'alive', *NUMERIC_COLUMNS, 'directorid', 'country')
+LINK_ARRAYS = ('genre_row', 'genre_code', 'actor_row', 'actor_id')
+META_FILE = 'snapshot.json'
+READ_CHUNK_SIZE = 10000
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+
+_COMPARISONS = {
+    'exact': lambda column, value: column == value,
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+}
+
+
+def _require_numpy():
+    if np is None:
+        raise ImproperlyConfigured("The analytics snapshot needs numpy (pip install numpy).")
+
+
+class CatalogSnapshot:
+    def __init__(self, arrays, countries, genres):
+        _require_numpy()
+        self.arrays = arrays
+        self.countries = list(countries)
+        self.genres = list(genres)
+        self._country_codes = {country: code for code, country in enumerate(self.countries)}
+        self._genre_codes = {genre: code for code, genre in enumerate(self.genres)}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_database(cls):
+        snapshot = cls({}, [], [])
+        movies = snapshot._encode_movies(
+            Movie.objects.order_by('movieid').values_list(*MOVIE_FIELDS).iterator(READ_CHUNK_SIZE))
+        snapshot.arrays = dict(movies, **snapshot._encode_links(movies['movieid'], MovieGenre.objects.all(),
+                                                                MovieActor.objects.all()))
+        return snapshot
+
+    # --- encoding ---
+
+    def _code(self, codes, values, value):
+        if value is None:
+            return -1
+        if value not in codes:
+            codes[value] = len(values)
+            values.append(value)
+        return codes[value]
+
+    def _encode_movies(self, rows):
+        rows = list(rows)
+        movie_ids, years, durations, scores, directors, countries = zip(*rows) if rows else ((),) * 6
+        numeric = lambda values: np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+        return {
+            'movieid': np.array(movie_ids, dtype=np.int64),
+            'alive': np.ones(len(rows), dtype=bool),
+            'releaseyear': numeric(years),
+            'durationinminutes': numeric(durations),
+            'tmdbscore': numeric(scores),
+            'directorid': np.array([-1 if d is None else d for d in directors], dtype=np.int64),
+            'country': np.array([self._code(self._country_codes, self.countries, c) for c in countries],
+                                dtype=np.int32),
+        }
+
+    def _encode_links(self, movie_ids, genre_links, actor_links):
+        """Link arrays for MovieGenre / MovieActor querysets, as rows of the sorted `movie_ids`."""
+        def pairs(links, field):
+            values = list(links.values_list('movieid', field).order_by().iterator(READ_CHUNK_SIZE))
+            movies = np.array([movie for movie, _ in values], dtype=np.int64)
+            # A link committed between the movie read and this one may name a movie not in the snapshot.
+            known = np.isin(movies, movie_ids)
+            return np.searchsorted(movie_ids, movies[known]), [value for value, ok in zip(values, known) if ok]
+
+        genre_rows, genre_pairs = pairs(genre_links, 'genreid')
+        actor_rows, actor_pairs = pairs(actor_links, 'personid')
+        return {
+            'genre_row': genre_rows,
+            'genre_code': np.array([self._code(self._genre_codes, self.genres, g) for _, g in genre_pairs],
+                                   dtype=np.int32),
+            'actor_row': actor_rows,
+            'actor_id': np.array([p for _, p in actor_pairs], dtype=np.int64),
+        }
+
+    # --- persistence ---
+
+    def save(self, directory):
+        """Writes one .npy file per array plus the dictionaries; readers of older files keep their copy."""
+        os.makedirs(directory, exist_ok=True)
+        for name, values in self.arrays.items():
+            path = os.path.join(directory, f'{name}.npy')
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, values)
+            os.replace(path + '.tmp', path)
+        path = os.path.join(directory, META_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'countries': self.countries, 'genres': self.genres}, f)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        _require_numpy()
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                  for name in MOVIE_ARRAYS + LINK_ARRAYS}
+        return cls(arrays, meta['countries'], meta['genres'])
+
+    # --- incremental refresh ---
+
+    def refresh(self, movie_ids):
+        """Re-reads these movies and their links; ids no longer in the database are marked deleted."""
+        movie_ids = sorted(set(movie_ids))
+        if not movie_ids:
+            return
+        with self._lock:
+            old = self.arrays
+            fresh = self._encode_movies(
+                Movie.objects.filter(movieid__in=movie_ids).order_by('movieid').values_list(*MOVIE_FIELDS))
+            arrays = {name: np.array(old[name]) for name in MOVIE_ARRAYS}
+
+            known = np.isin(fresh['movieid'], arrays['movieid'])
+            rows = np.searchsorted(arrays['movieid'], fresh['movieid'][known])
+            for name in MOVIE_ARRAYS:
+                arrays[name][rows] = fresh[name][known]
+            requested = np.array(movie_ids, dtype=np.int64)
+            gone = requested[~np.isin(requested, fresh['movieid']) & np.isin(requested, arrays['movieid'])]
+            arrays['alive'][np.searchsorted(arrays['movieid'], gone)] = False
+
+            links = {name: old[name] for name in LINK_ARRAYS}
+            if not known.all():
+                for name in MOVIE_ARRAYS:
+                    arrays[name] = np.concatenate([arrays[name], fresh[name][~known]])
+                order = np.argsort(arrays['movieid'], kind='stable')
+                if (order != np.arange(len(order))).any():
+                    position = np.empty_like(order)
+                    position[order] = np.arange(len(order))
+                    arrays = {name: values[order] for name, values in arrays.items()}
+                    links['genre_row'], links['actor_row'] = position[links['genre_row']], position[links['actor_row']]
+
+            changed_rows = np.searchsorted(arrays['movieid'], requested[np.isin(requested, arrays['movieid'])])
+            keep_genres = ~np.isin(links['genre_row'], changed_rows)
+            keep_actors = ~np.isin(links['actor_row'], changed_rows)
+            added = self._encode_links(arrays['movieid'], MovieGenre.objects.filter(movieid__in=movie_ids),
+                                       MovieActor.objects.filter(movieid__in=movie_ids))
+            arrays['genre_row'] = np.concatenate([links['genre_row'][keep_genres], added['genre_row']])
+            arrays['genre_code'] = np.concatenate([old['genre_code'][keep_genres], added['genre_code']])
+            arrays['actor_row'] = np.concatenate([links['actor_row'][keep_actors], added['actor_row']])
+            arrays['actor_id'] = np.concatenate([old['actor_id'][keep_actors], added['actor_id']])
+            self.arrays = arrays
+
+    # --- queries ---
+
+    def query(self):
+        arrays = self.arrays
+        return SnapshotQuery(self, arrays, np.array(arrays['alive'], dtype=bool))
+
+    def __len__(self):
+        return int(np.count_nonzero(self.arrays['alive']))
+
+
+class SnapshotQuery:
+    """An immutable row selection over one version of a snapshot's arrays."""
+
+    def __init__(self, snapshot, arrays, mask):
+        self.snapshot = snapshot
+        self.arrays = arrays
+        self.mask = mask
+
+    def column(self, name):
+        return self.arrays[name]
+
+    def _link_mask(self, rows, values, wanted):
+        mask = np.zeros(len(self.mask), dtype=bool)
+        mask[rows[np.isin(values, wanted)]] = True
+        return mask
+
+    def _lookup_mask(self, key, value):
+        field, _, lookup = key.partition('__')
+        lookup = lookup or 'exact'
+        if lookup not in _COMPARISONS and lookup not in ('in', 'isnull'):
+            raise ValueError(f"Unsupported lookup '{lookup}' in {key!r}")
+        values = list(value) if lookup == 'in' else [value]
+        if field == 'genre':
+            codes = [self.snapshot._genre_codes.get(genre, -2) for genre in values]
+            return self._link_mask(self.arrays['genre_row'], self.arrays['genre_code'], codes)
+        if field == 'actor':
+            return self._link_mask(self.arrays['actor_row'], self.arrays['actor_id'], values)
+        if field not in MOVIE_FIELDS:
+            raise ValueError(f"Unknown column {field!r}")
+
+        column = self.arrays[field]
+        if lookup == 'isnull':
+            missing = np.isnan(column) if column.dtype.kind == 'f' else column == -1
+            return missing if value else ~missing
+        if field == 'country':
+            if lookup not in ('exact', 'in'):
+                raise ValueError("country supports only exact and in lookups")
+            # -2: a country missing from the dictionary matches no row.
+            values = [self.snapshot._country_codes.get(country, -2) for country in values]
+        if lookup == 'in':
+            return np.isin(column, values)
+        value = values[0]
+        return _COMPARISONS[lookup](column, float(value) if column.dtype.kind == 'f' else value)
+
+    def filter(self, **lookups):
+        """Django-style lookups: exact, gt, gte, lt, lte, in and isnull on movie columns, plus genre= and actor=."""
+        mask = self.mask.copy()
+        for key, value in lookups.items():
+            mask &= self._lookup_mask(key, value)
+        return SnapshotQuery(self.snapshot, self.arrays, mask)
+
+    def where(self, condition):
+        """Narrows by a boolean row array, or by a callable given column() that returns one."""
+        if callable(condition):
+            condition = condition(self.column)
+        return SnapshotQuery(self.snapshot, self.arrays, self.mask & np.asarray(condition, dtype=bool))
+
+    def count(self):
+        return int(np.count_nonzero(self.mask))
+
+    def movie_ids(self):
+        return self.arrays['movieid'][self.mask].tolist()
+
+    def mean(self, column):
+        """Average of the non-NULL values, as SQL AVG; None if there are none."""
+        values = self.arrays[column][self.mask]
+        values = values[~np.isnan(values)]
+        return float(values.mean()) if len(values) else None
+
+    def top_k(self, column, k=10, descending=True):
+        """[(movie id, value)] of the k best non-NULL values, ties broken by movie id."""
+        rows = np.flatnonzero(self.mask & ~np.isnan(self.arrays[column]))
+        values = self.arrays[column][rows]
+        keys = -values if descending else values
+        if len(rows) > k:
+            # Everything tied with the k-th value stays in, so the tie-break below is exact.
+            kth = np.partition(keys, k - 1)[k - 1]
+            rows, values, keys = rows[keys <= kth], values[keys <= kth], keys[keys <= kth]
+        order = np.lexsort((self.arrays['movieid'][rows], keys))[:k]
+        return [(int(self.arrays['movieid'][rows[i]]), float(values[i])) for i in order]
+
+    def group_by(self, key, column=None):
+        """[(key, row count, average of `column` or None)] sorted by key.
+
+        `key` is 'genre' or 'actor' (a movie counts once per link) or a movie
+        column; rows whose key is NULL are left out.
+        """
+        if key in ('genre', 'actor'):
+            link_rows = self.arrays[f'{key}_row']
+            selected = self.mask[link_rows]
+            rows = link_rows[selected]
+            keys = self.arrays['genre_code' if key == 'genre' else 'actor_id'][selected]
+        else:
+            rows = np.flatnonzero(self.mask)
+            keys = self.arrays[key][rows]
+            present = ~np.isnan(keys) if keys.dtype.kind == 'f' else keys != -1
+            rows, keys = rows[present], keys[present]
+
+        groups, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(groups))
+        means = [None] * len(groups)
+        if column is not None:
+            values = self.arrays[column][rows]
+            valid = ~np.isnan(values)
+            sums = np.bincount(inverse[valid], weights=values[valid], minlength=len(groups))
+            valid_counts = np.bincount(inverse[valid], minlength=len(groups))
+            means = [float(s / n) if n else None for s, n in zip(sums, valid_counts)]
+
+        if key == 'genre':
+            labels = [self.snapshot.genres[code] for code in groups]
+        elif key == 'country':
+            labels = [self.snapshot.countries[code] for code in groups]
+        else:
+            labels = [int(value) for value in groups]
+        return sorted(zip(labels, counts.tolist(), means), key=lambda group: group[0])
+
+
+def get_snapshot():
+    """The process-wide snapshot, loaded or built on first use, with queued changes applied."""
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                directory = getattr(settings, 'ANALYTICS_SNAPSHOT_DIR', None)
+                if directory and os.path.exists(os.path.join(directory, META_FILE)):
+                    _snapshot = CatalogSnapshot.load(directory)
+                else:
+                    _snapshot = CatalogSnapshot.from_database()
+    with _pending_lock:
+        movie_ids = set(_pending)
+        _pending.clear()
+    _snapshot.refresh(movie_ids)
+    return _snapshot
+
+
+def reset_snapshot():
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
+    with _pending_lock:
+        _pending.clear()
+
+
+def _queue(movie_id):
+    # Only a loaded snapshot needs updating; the next build reads the database anyway.
+    if _snapshot is not None:
+        with _pending_lock:
+            _pending.add(movie_id)
+
+
+def schedule_refresh(movie_id):
+    transaction.on_commit(partial(_queue, movie_id))
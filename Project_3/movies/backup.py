@@ -0,0 +1,354 @@
+"""Parallel, chunked backup and restore of the catalog tables.
+
+backup() splits each table into primary-key ranges of about `chunk_rows` rows
+and dumps the ranges on `workers` threads, each on its own connection. The
+range bounds come from walking the key index, so chunks stay even however
+sparse the ids are. A chunk is a gzip-compressed JSON-lines file, one row
+array per line, written as it is read. On MySQL the server encodes each row
+(JSON_ARRAY), so the workers only wait on the socket and zlib, neither of
+which holds the GIL:
+
+    <directory>/manifest.json
+    <directory>/movie/00000.jsonl.gz
+    <directory>/movie/00001.jsonl.gz
+    ...
+
+The manifest is written last. It lists every chunk with its key range, row
+count and the SHA-256 of its uncompressed lines.
+
+restore() checks every chunk against the manifest, then loads the chunks in
+parallel, one transaction per chunk. Foreign-key (and on MySQL, unique)
+checks are off while loading and foreign keys are checked once at the end.
+The models' secondary indexes (Meta.indexes) are dropped first and rebuilt
+after, so the load is plain appends.
+
+Every chunk is read from the same snapshot of the database. On MySQL, backup()
+holds FLUSH TABLES WITH READ LOCK (which needs the RELOAD privilege) just
+long enough for every worker to START TRANSACTION WITH CONSISTENT SNAPSHOT;
+writes wait only for that moment, not for the dump. SQLite reads on a single
+connection, in one transaction. Summary tables, the search index and the
+other derived tables are not backed up; rebuild them after a restore.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from queue import Empty, Queue
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .querycache import bump_model_version
+
+# Parents before the tables that reference them. movie_log only exists in databases created from Project_2.
+TABLES = ('person', 'genre', 'movie', 'movie_genre', 'movie_actor', 'user', 'rating', 'movie_log')
+DEFAULT_CHUNK_ROWS = 50000
+DEFAULT_WORKERS = os.cpu_count() or 4
+FETCH_SIZE = 2000
+INSERT_BATCH_SIZE = 1000
+# Level 6 compresses these rows nearly as well as 9 at a fraction of the CPU.
+COMPRESS_LEVEL = 6
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+
+def _existing_tables(using):
+    """{lower-cased name: name} of the tables in the database."""
+    return {name.lower(): name for name in connections[using].introspection.table_names()}
+
+
+def _workers(workers, using):
+    # SQLite serialises access to the database anyway.
+    return 1 if connections[using].vendor == 'sqlite' else workers
+
+
+def _describe(table, using):
+    """(column names, first primary-key column or None) of `table`."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        columns = [column.name for column in connection.introspection.get_table_description(cursor, table)]
+        key = connection.introspection.get_primary_key_columns(cursor, table)
+    return columns, key[0] if key else None
+
+
+def plan_chunks(table, key, chunk_rows=DEFAULT_CHUNK_ROWS, using=DEFAULT_DB_ALIAS):
+    """[(low, high)] key ranges of about `chunk_rows` rows each; high is None for the last one.
+
+    Each bound is found with one index range read of `chunk_rows` keys, so
+    planning costs one pass over the key index.
+    """
+    if key is None:
+        return [(None, None)]
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    bounds = []
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({qn(key)}) FROM {qn(table)}")
+        low = cursor.fetchone()[0]
+        while low is not None:
+            bounds.append(low)
+            cursor.execute(f"SELECT {qn(key)} FROM {qn(table)} WHERE {qn(key)} >= %s ORDER BY {qn(key)} "
+                           f"LIMIT 1 OFFSET %s", [low, chunk_rows])
+            row = cursor.fetchone()
+            low = row[0] if row else None
+            # A composite key can repeat its first column over more than chunk_rows rows.
+            if low is not None and low == bounds[-1]:
+                cursor.execute(f"SELECT MIN({qn(key)}) FROM {qn(table)} WHERE {qn(key)} > %s", [low])
+                low = cursor.fetchone()[0]
+    # Open-ended at both ends: rows written between planning and the snapshot still land in a chunk.
+    return list(zip([None] + bounds[1:], bounds[1:] + [None])) or [(None, None)]
+
+
+def _range_condition(key, low, high, qn):
+    conditions, params = [], []
+    if low is not None:
+        conditions.append(f"{qn(key)} >= %s")
+        params.append(low)
+    if high is not None:
+        conditions.append(f"{qn(key)} < %s")
+        params.append(high)
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+def _text(value):
+    return value if isinstance(value, str) else value.decode()
+
+
+def _dump_chunk(connection, directory, name, table, columns, key, low, high):
+    qn = connection.ops.quote_name
+    where, params = _range_condition(key, low, high, qn)
+    order = f" ORDER BY {qn(key)}" if key else ""
+    encoded = connection.vendor == 'mysql'
+    select = f"JSON_ARRAY({', '.join(map(qn, columns))})" if encoded else ', '.join(map(qn, columns))
+    path = os.path.join(directory, name)
+    digest, rows = hashlib.sha256(), 0
+    with connection.cursor() as cursor, gzip.open(path + '.tmp', 'wb', compresslevel=COMPRESS_LEVEL) as out:
+        cursor.execute(f"SELECT {select} FROM {qn(table)}{where}{order}", params)
+        while batch := cursor.fetchmany(FETCH_SIZE):
+            if encoded:
+                data = ''.join(_text(row[0]) + '\n' for row in batch).encode()
+            else:
+                data = ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in batch).encode()
+            digest.update(data)
+            out.write(data)
+            rows += len(batch)
+    os.replace(path + '.tmp', path)
+    return {'file': name, 'low': low, 'high': high, 'rows': rows, 'sha256': digest.hexdigest()}
+
+
+@contextmanager
+def _snapshot(connection):
+    """Keeps `connection` on one consistent view of the database until the block ends."""
+    if connection.vendor != 'mysql':
+        with transaction.atomic(using=connection.alias):
+            yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        try:
+            yield
+        finally:
+            cursor.execute("COMMIT")
+
+
+def _dump_chunks(jobs, workers, using):
+    """Runs `jobs`, the arguments of _dump_chunk(), on worker threads sharing one snapshot; returns their results."""
+    connection = connections[using]
+    # Only MySQL can start several connections on the same snapshot.
+    workers = max(1, min(workers if connection.vendor == 'mysql' else 1, len(jobs)))
+    queue = Queue()
+    for i, job in enumerate(jobs):
+        queue.put((i, job))
+    results, errors = [None] * len(jobs), []
+    started = threading.Barrier(workers + 1)
+
+    def work():
+        worker_connection = connections[using]
+        try:
+            with _snapshot(worker_connection):
+                started.wait()
+                while True:
+                    try:
+                        i, job = queue.get_nowait()
+                    except Empty:
+                        return
+                    results[i] = _dump_chunk(worker_connection, *job)
+        except BaseException as e:
+            errors.append(e)
+            started.abort()
+        finally:
+            # Worker threads open their own connection; don't leave it to the garbage collector.
+            worker_connection.close()
+
+    threads = [threading.Thread(target=work, name=f'backup-{i}') for i in range(workers)]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            # Nothing commits until every worker has its snapshot, so they all see the same point in time.
+            cursor.execute("FLUSH TABLES WITH READ LOCK")
+        try:
+            for thread in threads:
+                thread.start()
+            started.wait()
+        except threading.BrokenBarrierError:
+            pass
+        finally:
+            if connection.vendor == 'mysql':
+                cursor.execute("UNLOCK TABLES")
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def backup(directory, tables=TABLES, chunk_rows=DEFAULT_CHUNK_ROWS, workers=DEFAULT_WORKERS,
+           using=DEFAULT_DB_ALIAS):
+    """Dumps the `tables` that exist into `directory`; returns the manifest."""
+    existing = _existing_tables(using)
+    manifest = {'format': FORMAT_VERSION, 'vendor': connections[using].vendor,
+                'created': timezone.now().isoformat(), 'tables': {}}
+    jobs = []
+    for name in tables:
+        table = existing.get(name.lower())
+        if table is None:
+            continue
+        columns, key = _describe(table, using)
+        manifest['tables'][name] = {'columns': columns, 'key': key, 'chunks': []}
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+        for i, (low, high) in enumerate(plan_chunks(table, key, chunk_rows, using)):
+            jobs.append((name, (directory, f"{name}/{i:05d}.jsonl.gz", table, columns, key, low, high)))
+
+    for (name, _), chunk in zip(jobs, _dump_chunks([arguments for _, arguments in jobs], workers, using)):
+        manifest['tables'][name]['chunks'].append(chunk)
+    for entry in manifest['tables'].values():
+        entry['rows'] = sum(chunk['rows'] for chunk in entry['chunks'])
+
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+    return manifest
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported backup format {manifest.get('format')!r}")
+    return manifest
+
+
+def _check_chunk(directory, chunk):
+    digest, rows = hashlib.sha256(), 0
+    with gzip.open(os.path.join(directory, chunk['file']), 'rb') as dump:
+        for line in dump:
+            digest.update(line)
+            rows += 1
+    if rows != chunk['rows'] or digest.hexdigest() != chunk['sha256']:
+        raise ValueError(f"{chunk['file']} does not match the manifest")
+
+
+def verify(directory, workers=DEFAULT_WORKERS):
+    """Raises ValueError unless every chunk matches its row count and checksum; returns the manifest."""
+    manifest = read_manifest(directory)
+    chunks = [chunk for entry in manifest['tables'].values() for chunk in entry['chunks']]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda chunk: _check_chunk(directory, chunk), chunks))
+    return manifest
+
+
+def _load_chunk(directory, chunk, table, columns, using):
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    sql = (f"INSERT INTO {qn(table)} ({', '.join(map(qn, columns))}) "
+           f"VALUES ({', '.join(['%s'] * len(columns))})")
+    digest, rows = hashlib.sha256(), 0
+    try:
+        # Checks are per connection, and SQLite only turns them off outside a transaction.
+        with connection.constraint_checks_disabled(), transaction.atomic(using=using), \
+                connection.cursor() as cursor, gzip.open(os.path.join(directory, chunk['file']), 'rb') as dump:
+            if connection.vendor == 'mysql':
+                cursor.execute("SET unique_checks = 0")
+            batch = []
+            for line in dump:
+                digest.update(line)
+                # Exact decimals: MySQL's JSON_ARRAY writes DECIMAL columns as numbers.
+                batch.append(json.loads(line, parse_float=Decimal))
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    cursor.executemany(sql, batch)
+                    rows += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                rows += len(batch)
+            if rows != chunk['rows'] or digest.hexdigest() != chunk['sha256']:
+                raise ValueError(f"{chunk['file']} does not match the manifest")
+    finally:
+        connection.close()
+    return rows
+
+
+def _deferrable_indexes(models):
+    """(model, index) for the Meta.indexes that no foreign key depends on."""
+    # MySQL refuses to drop the index backing a foreign key, so keep any that starts with one.
+    return [(model, index) for model in models for index in model._meta.indexes
+            if not model._meta.get_field(index.fields[0].lstrip('-')).is_relation]
+
+
+def restore(directory, tables=None, workers=DEFAULT_WORKERS, replace=False, using=DEFAULT_DB_ALIAS):
+    """Loads a backup() directory into existing tables; returns {table: rows}.
+
+    The tables must be empty unless `replace`, which empties them first. A
+    chunk that fails to load is rolled back, but chunks loaded before it stay.
+    """
+    connection = connections[using]
+    manifest = verify(directory, workers)
+    existing = _existing_tables(using)
+    selected = {name: entry for name, entry in manifest['tables'].items() if tables is None or name in tables}
+    targets = {}
+    for name in selected:
+        if name.lower() not in existing:
+            raise ValueError(f"Table {name} does not exist; run migrate (or Project_2/schema.sql) first.")
+        targets[name] = existing[name.lower()]
+
+    if not replace:
+        with connection.cursor() as cursor:
+            for name, table in targets.items():
+                cursor.execute(f"SELECT 1 FROM {connection.ops.quote_name(table)} LIMIT 1")
+                if cursor.fetchone():
+                    raise ValueError(f"Table {name} is not empty; restore with replace=True.")
+
+    target_tables = {table.lower() for table in targets.values()}
+    models = [model for model in apps.get_models() if model._meta.db_table.lower() in target_tables]
+    deferred = _deferrable_indexes(models)
+    with connection.schema_editor() as editor:
+        for model, index in deferred:
+            editor.remove_index(model, index)
+    try:
+        if replace:
+            # Derived tables (stats, search terms) may still point at these rows; they are rebuilt afterwards.
+            with connection.constraint_checks_disabled():
+                connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), list(targets.values())))
+        with ThreadPoolExecutor(max_workers=_workers(workers, using)) as pool:
+            futures = [(name, pool.submit(_load_chunk, directory, chunk, targets[name],
+                                          selected[name]['columns'], using))
+                       for name in selected for chunk in selected[name]['chunks']]
+            loaded = dict.fromkeys(selected, 0)
+            for name, future in futures:
+                loaded[name] += future.result()
+    finally:
+        with connection.schema_editor() as editor:
+            for model, index in deferred:
+                editor.add_index(model, index)
+    connection.check_constraints(table_names=list(targets.values()))
+    for model in models:
+        bump_model_version(model)
+    return loaded
@@ -0,0 +1,152 @@
+"""Streaming export of the whole catalog as CSV, JSON lines or Parquet.
+
+One row per movie: its columns, director, genres, cast and rating counters.
+Movies are read CHUNK_SIZE at a time by primary key (keyset pagination:
+WHERE MovieID > last ORDER BY MovieID LIMIT n). Each chunk comes with its
+director and rating counters joined in and its genres and cast fetched in
+one query each. MySQL's client library buffers a whole result set, so
+iterator() alone would not bound memory there; fixed-size key ranges do,
+on every backend.
+
+stream() turns the chunks into byte strings as they are read, so memory
+stays flat however large the catalog is. The `export_catalog` command
+writes them to a file and the /api/export/movies/ view to a
+StreamingHttpResponse. CSV joins genres and cast with '|'. Parquet, which
+needs pyarrow, writes one row group per chunk.
+"""
+import csv
+import io
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Prefetch
+
+from .models import Genre, Movie, Person
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+DEFAULT_CHUNK_SIZE = 2000
+COLUMNS = ('movieid', 'title', 'releaseyear', 'durationinminutes', 'country', 'tmdbscore', 'director',
+           'genres', 'cast', 'ratingcount', 'ratingavg')
+LIST_SEPARATOR = '|'
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def movie_chunks(chunk_size=DEFAULT_CHUNK_SIZE, queryset=None):
+    """Lists of up to `chunk_size` movies in id order, with their relations loaded."""
+    queryset = (Movie.objects.all() if queryset is None else queryset).select_related(
+        'directorid', 'rating_stats',
+    ).prefetch_related(
+        Prefetch('genres', queryset=Genre.objects.order_by('genrename')),
+        Prefetch('actors', queryset=Person.objects.only('fullname').order_by('fullname')),
+    ).order_by('movieid')
+    last = None
+    while True:
+        chunk = list((queryset if last is None else queryset.filter(movieid__gt=last))[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1].movieid
+
+
+def movie_row(movie):
+    stats = getattr(movie, 'rating_stats', None)
+    return {
+        'movieid': movie.movieid,
+        'title': movie.title,
+        'releaseyear': movie.releaseyear,
+        'durationinminutes': movie.durationinminutes,
+        'country': movie.country,
+        'tmdbscore': float(movie.tmdbscore) if movie.tmdbscore is not None else None,
+        'director': movie.directorid.fullname if movie.directorid else None,
+        'genres': [genre.genrename for genre in movie.genres.all()],
+        'cast': [person.fullname for person in movie.actors.all()],
+        'ratingcount': stats.ratingcount if stats else 0,
+        'ratingavg': float(stats.ratingavg) if stats and stats.ratingavg is not None else None,
+    }
+
+
+def _csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for chunk in chunks:
+        for movie in chunk:
+            row = movie_row(movie)
+            writer.writerow([LIST_SEPARATOR.join(value) if isinstance(value, list) else value
+                             for value in row.values()])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _jsonl(chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(movie_row(movie), ensure_ascii=False) + '\n' for movie in chunk).encode()
+
+
+class _Sink(io.RawIOBase):
+    """A write-only file that hands back what was written since the last take()."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def parquet_schema():
+    return pa.schema([
+        ('movieid', pa.int64()), ('title', pa.string()), ('releaseyear', pa.int32()),
+        ('durationinminutes', pa.int32()), ('country', pa.string()), ('tmdbscore', pa.float64()),
+        ('director', pa.string()), ('genres', pa.list_(pa.string())), ('cast', pa.list_(pa.string())),
+        ('ratingcount', pa.int64()), ('ratingavg', pa.float64()),
+    ])
+
+
+def _parquet(chunks):
+    schema = parquet_schema()
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in chunks:
+        writer.write_table(pa.Table.from_pylist([movie_row(movie) for movie in chunk], schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+ENCODERS = {'csv': _csv, 'jsonl': _jsonl, 'parquet': _parquet}
+
+
+def stream(fmt, chunk_size=DEFAULT_CHUNK_SIZE, queryset=None):
+    """Byte strings that make up the export in `fmt` ('csv', 'jsonl' or 'parquet')."""
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unknown export format {fmt!r} (expected one of: {', '.join(ENCODERS)})")
+    # Checked here rather than on first iteration, so a view can still answer with an error.
+    if fmt == 'parquet' and pa is None:
+        raise ImproperlyConfigured("Parquet export needs pyarrow (pip install pyarrow).")
+    return ENCODERS[fmt](movie_chunks(chunk_size, queryset))
@@ -0,0 +1,225 @@
+"""In-memory co-star graph over movie credits.
+
+Credits are (person, movie) pairs from Movie_Actor and Movie.DirectorID. They
+are held twice in compressed sparse row (CSR) form, using typed arrays of
+database ids:
+
+    person_ids[i]                          sorted ids of every credited person
+    person_movies[person_offsets[i]:person_offsets[i + 1]]   that person's movies, sorted
+
+and the same from the movie side. A row is found by bisecting the sorted id
+array, so no per-object Python structures are kept for the bulk of the graph.
+
+Changes after the build go into a small overlay: the new cast of each changed
+movie, plus per-person added/removed movie sets. Once the overlay passes
+COMPACT_THRESHOLD edges, it is folded back into fresh arrays. The signal
+handlers in movies/signals.py keep the process-wide graph (get_graph()) in
+step after each commit.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .models import Movie, MovieActor
+
+COMPACT_THRESHOLD = 10000
+DEFAULT_MAX_DEPTH = 6
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def _csr(pairs):
+    """(sorted row ids, offsets, column ids) for (row, column) pairs sorted by row then column."""
+    ids, offsets, columns = array('q'), array('q', [0]), array('q')
+    for row, column in pairs:
+        if not ids or ids[-1] != row:
+            if ids:
+                offsets.append(len(columns))
+            ids.append(row)
+        columns.append(column)
+    if ids:
+        offsets.append(len(columns))
+    return ids, offsets, columns
+
+
+def _row(ids, offsets, columns, key):
+    i = bisect_left(ids, key)
+    if i < len(ids) and ids[i] == key:
+        return columns[offsets[i]:offsets[i + 1]]
+    return array('q')
+
+
+class CoStarGraph:
+    def __init__(self, credits):
+        """`credits` is an iterable of (person_id, movie_id); duplicates are ignored."""
+        pairs = sorted(set(credits))
+        self.person_ids, self.person_offsets, self.person_movies = _csr(pairs)
+        self.movie_ids, self.movie_offsets, self.movie_people = _csr(sorted((m, p) for p, m in pairs))
+        self._movie_overrides = {}
+        self._person_added = defaultdict(set)
+        self._person_removed = defaultdict(set)
+        self._override_edges = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_database(cls):
+        credits = list(MovieActor.objects.values_list('personid', 'movieid'))
+        credits += Movie.objects.filter(directorid__isnull=False).values_list('directorid', 'movieid')
+        return cls(credits)
+
+    # --- reads ---
+
+    def movies_of(self, person_id):
+        base = _row(self.person_ids, self.person_offsets, self.person_movies, person_id)
+        added, removed = self._person_added.get(person_id), self._person_removed.get(person_id)
+        if not added and not removed:
+            return set(base)
+        return (set(base) - (removed or set())) | (added or set())
+
+    def people_of(self, movie_id):
+        if movie_id in self._movie_overrides:
+            return set(self._movie_overrides[movie_id])
+        return set(_row(self.movie_ids, self.movie_offsets, self.movie_people, movie_id))
+
+    def co_star_movies(self, person_ids):
+        """Ids of the movies every one of `person_ids` is credited in."""
+        with self._lock:
+            movie_sets = sorted((self.movies_of(p) for p in set(person_ids)), key=len)
+        if not movie_sets:
+            return []
+        common = movie_sets[0]
+        for movies in movie_sets[1:]:
+            common = common & movies
+            if not common:
+                break
+        return sorted(common)
+
+    def top_collaborators(self, person_id, limit=10):
+        """[(person_id, shared movie count)] for the people most often credited alongside `person_id`."""
+        counts = Counter()
+        with self._lock:
+            for movie_id in self.movies_of(person_id):
+                counts.update(self.people_of(movie_id))
+        counts.pop(person_id, None)
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def shortest_path(self, source, target, max_depth=DEFAULT_MAX_DEPTH):
+        """[person, movie, person, ..., person] linking source to target, or None.
+
+        A bidirectional breadth-first search, one person-to-person hop (through a
+        shared movie) per level, expanding the smaller frontier each time.
+        """
+        if source == target:
+            return [source]
+        with self._lock:
+            parents = ({source: None}, {target: None})
+            frontiers = ([source], [target])
+            for _ in range(max_depth):
+                side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+                seen, other = parents[side], parents[1 - side]
+                next_frontier = []
+                for person in frontiers[side]:
+                    for movie in self.movies_of(person):
+                        for neighbour in self.people_of(movie):
+                            if neighbour in seen:
+                                continue
+                            seen[neighbour] = (person, movie)
+                            if neighbour in other:
+                                return self._join(parents, neighbour)
+                            next_frontier.append(neighbour)
+                if not next_frontier:
+                    return None
+                frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+        return None
+
+    @staticmethod
+    def _join(parents, meeting):
+        forward, backward = parents
+        path = [meeting]
+        step = forward[meeting]
+        while step is not None:
+            person, movie = step
+            path[:0] = [person, movie]
+            step = forward[person]
+        step = backward[meeting]
+        while step is not None:
+            person, movie = step
+            path += [movie, person]
+            step = backward[person]
+        return path
+
+    # --- incremental updates ---
+
+    def set_movie_people(self, movie_id, people):
+        """Replaces the credited people of one movie (an empty set for a deleted movie)."""
+        with self._lock:
+            old, new = self.people_of(movie_id), set(people)
+            base = set(_row(self.movie_ids, self.movie_offsets, self.movie_people, movie_id))
+            for person in old - new:
+                if person in base:
+                    self._person_removed[person].add(movie_id)
+                else:
+                    self._person_added[person].discard(movie_id)
+            for person in new - old:
+                if person in base:
+                    self._person_removed[person].discard(movie_id)
+                else:
+                    self._person_added[person].add(movie_id)
+            previous = self._movie_overrides.get(movie_id)
+            self._override_edges += len(new) - (len(previous) if previous is not None else 0)
+            self._movie_overrides[movie_id] = frozenset(new)
+            if self._override_edges + len(self._movie_overrides) > COMPACT_THRESHOLD:
+                self._compact()
+
+    def _compact(self):
+        credits = [(p, m) for m, people in self._movie_overrides.items() for p in people]
+        for i, movie_id in enumerate(self.movie_ids):
+            if movie_id not in self._movie_overrides:
+                credits.extend((p, movie_id) for p in self.movie_people[self.movie_offsets[i]:self.movie_offsets[i + 1]])
+        fresh = CoStarGraph(credits)
+        self.person_ids, self.person_offsets, self.person_movies = (
+            fresh.person_ids, fresh.person_offsets, fresh.person_movies)
+        self.movie_ids, self.movie_offsets, self.movie_people = (
+            fresh.movie_ids, fresh.movie_offsets, fresh.movie_people)
+        self._movie_overrides.clear()
+        self._person_added.clear()
+        self._person_removed.clear()
+        self._override_edges = 0
+
+
+def get_graph():
+    """The process-wide graph, built from the database on first use."""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = CoStarGraph.from_database()
+    return _graph
+
+
+def reset_graph():
+    global _graph
+    with _graph_lock:
+        _graph = None
+
+
+def credited_people(movie_id):
+    people = set(MovieActor.objects.filter(movieid=movie_id).values_list('personid', flat=True))
+    director = Movie.objects.filter(movieid=movie_id).values_list('directorid', flat=True).first()
+    if director is not None:
+        people.add(director)
+    return people
+
+
+def refresh_movie(movie_id):
+    # Only a graph that has been built needs updating; the next build reads the database anyway.
+    if _graph is not None:
+        _graph.set_movie_people(movie_id, credited_people(movie_id))
+
+
+def schedule_refresh(movie_id):
+    transaction.on_commit(lambda: refresh_movie(movie_id))
@@ -0,0 +1,247 @@
+"""Index advice for the known query workload.
+
+WORKLOAD mirrors the queries of run_queries.py and Project_2/queries.sql. For
+each one, `analyze()` reads the database's plan (EXPLAIN on MySQL, EXPLAIN
+QUERY PLAN on SQLite) to flag full table scans and sorts that cannot use an
+index. It also derives a candidate index from the query itself, per table:
+equality columns first, then the ORDER BY columns, then range columns.
+Candidates already served by an existing index (by column prefix, taken from
+the live schema so hand-made indexes count) are dropped.
+
+The `advise_indexes` management command prints the report. It can time the
+workload with and without the proposed indexes, and can write them as an
+AddIndex migration.
+"""
+import hashlib
+import statistics
+import time
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models
+from django.db.models.expressions import Col, OrderBy
+from django.db.models.sql.where import AND
+
+from .models import Genre, Movie, Person
+
+# Django caps index names at 30 characters.
+MAX_INDEX_NAME_LENGTH = 30
+EQUALITY_LOOKUPS = {'exact', 'iexact', 'in'}
+RANGE_LOOKUPS = {'gt', 'gte', 'lt', 'lte', 'range', 'year', 'startswith'}
+
+WORKLOAD = [
+    ("Q1 movies after 2010 by score",
+     lambda: Movie.objects.filter(releaseyear__gt=2010).order_by('-tmdbscore')[:5]),
+    ("Q2 movies in a genre",
+     lambda: Movie.objects.filter(moviegenre__genreid__genrename='Action')[:5]),
+    ("Q3 top actors by movie count",
+     lambda: Person.objects.annotate(movie_count=models.Count('movieactor__movieid')).order_by('-movie_count')[:10]),
+    ("Q4 genre stats with HAVING",
+     lambda: Genre.objects.annotate(
+         numberofmovies=models.Count('moviegenre__movieid'),
+         averagescore=models.Avg('moviegenre__movieid__tmdbscore'),
+     ).filter(numberofmovies__gt=5).order_by('-averagescore')),
+    ("Q5 long or high-scoring movies",
+     lambda: Movie.objects.filter(models.Q(durationinminutes__gt=180) | models.Q(tmdbscore__gt=8.5))
+     .order_by('-tmdbscore')[:10]),
+    ("Q7 above-average movies after 2000",
+     lambda: Movie.objects.filter(tmdbscore__gt=7.0, releaseyear__gt=2000).order_by('-tmdbscore')[:5]),
+    ("Q8 movies with two given actors",
+     lambda: Movie.objects.filter(movieactor__personid__fullname__in=['Leonardo DiCaprio', 'Tom Hardy'])
+     .annotate(actor_count=models.Count('movieid')).filter(actor_count=2)),
+    ("Q9 short recent movies from one country",
+     lambda: Movie.objects.filter(country='United States of America', releaseyear__gt=2010,
+                                  durationinminutes__lt=110, durationinminutes__isnull=False)
+     .order_by('-releaseyear')[:5]),
+    ("Q11 longest movies",
+     lambda: Movie.objects.filter(durationinminutes__isnull=False).order_by('-durationinminutes')[:5]),
+]
+
+
+class PlanIssue:
+    def __init__(self, table, kind, detail):
+        self.table = table
+        self.kind = kind
+        self.detail = detail
+
+    def __str__(self):
+        return f"{self.kind} on {self.table or '?'}: {self.detail}"
+
+
+class IndexProposal:
+    def __init__(self, model, fields, queries):
+        self.model = model
+        self.fields = fields
+        self.queries = queries
+
+    @property
+    def name(self):
+        table = self.model._meta.db_table
+        # Full field names if they fit, else each one shortened as little as needed.
+        for length in (None, 8, 6, 5, 4, 3):
+            name = f"idx_{table}_{'_'.join(field[:length] for field in self.fields)}"
+            if len(name) <= MAX_INDEX_NAME_LENGTH:
+                return name
+        digest = hashlib.sha1(name.encode()).hexdigest()[:8]
+        return f"idx_{table[:MAX_INDEX_NAME_LENGTH - 13]}_{digest}"
+
+    def index(self):
+        return models.Index(fields=list(self.fields), name=self.name)
+
+    def meta_line(self):
+        return f"models.Index(fields={list(self.fields)!r}, name={self.name!r}),"
+
+
+def _model_for_table(table):
+    for model in apps.get_models(include_auto_created=True):
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def _field_name(model, column):
+    for field in model._meta.concrete_fields:
+        if field.column == column:
+            return field.name
+    return None
+
+
+def _lookups(node):
+    """Lookups reachable through AND nodes only; OR branches would need an index merge."""
+    if getattr(node, 'children', None) is not None:
+        if node.connector != AND or node.negated:
+            return
+        for child in node.children:
+            yield from _lookups(child)
+    elif isinstance(getattr(node, 'lhs', None), Col):
+        yield node
+
+
+def candidate_columns(queryset):
+    """{model: [field names]} for the index each table of `queryset` would want."""
+    query = queryset.query
+    wanted = {}
+
+    def add(model, kind, name):
+        if model is not None and name is not None:
+            columns = wanted.setdefault(model, {'eq': [], 'sort': [], 'range': []})
+            if name not in columns[kind]:
+                columns[kind].append(name)
+
+    for lookup in _lookups(query.where):
+        table = query.alias_map[lookup.lhs.alias].table_name
+        model = _model_for_table(table)
+        if model is None:
+            continue
+        name = _field_name(model, lookup.lhs.target.column)
+        # IS NULL pins one value; IS NOT NULL is a range.
+        if lookup.lookup_name in EQUALITY_LOOKUPS or (lookup.lookup_name == 'isnull' and lookup.rhs):
+            add(model, 'eq', name)
+        elif lookup.lookup_name == 'isnull':
+            add(model, 'range', name)
+        elif lookup.lookup_name in RANGE_LOOKUPS:
+            add(model, 'range', name)
+
+    for item in query.order_by:
+        if isinstance(item, OrderBy):
+            item = getattr(item.expression, 'name', None)
+        if isinstance(item, str) and '__' not in item.lstrip('-'):
+            name = item.lstrip('-')
+            if name in query.annotations:
+                continue
+            try:
+                field = query.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            add(query.model, 'sort', field.name)
+
+    result = {}
+    for model, columns in wanted.items():
+        fields = []
+        for name in columns['eq'] + columns['sort'] + columns['range']:
+            if name not in fields:
+                fields.append(name)
+        if fields:
+            result[model] = fields
+    return result
+
+
+def existing_indexes(model, using='default'):
+    """Column lists of every index on the model's table, as the live database reports them."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return [info['columns'] for info in constraints.values()
+            if info.get('index') or info.get('primary_key') or info.get('unique')]
+
+
+def _covered(model, fields, indexes):
+    columns = [model._meta.get_field(name).column for name in fields]
+    return any(index[:len(columns)] == columns for index in indexes)
+
+
+def plan_issues(queryset):
+    connection = connections[queryset.db]
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0].lower() for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        elif connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            rows = [{'detail': row[-1]} for row in cursor.fetchall()]
+        else:
+            raise NotImplementedError(f"No plan reader for {connection.vendor}")
+
+    issues = []
+    for row in rows:
+        if connection.vendor == 'mysql':
+            extra = row.get('extra') or ''
+            if row.get('type') == 'ALL':
+                issues.append(PlanIssue(row.get('table'), 'full scan', f"~{row.get('rows')} rows"))
+            if 'Using filesort' in extra or 'Using temporary' in extra:
+                issues.append(PlanIssue(row.get('table'), 'filesort', extra))
+        else:
+            detail = row['detail']
+            if detail.startswith('SCAN ') and ' USING ' not in detail:
+                issues.append(PlanIssue(detail.split()[1], 'full scan', detail))
+            if 'USE TEMP B-TREE' in detail:
+                issues.append(PlanIssue(None, 'filesort', detail))
+    return issues
+
+
+def time_query(queryset, repeat=5):
+    """Median wall time of evaluating `queryset`, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def analyze(workload=WORKLOAD, using='default'):
+    """Returns ([(label, queryset, issues)], [IndexProposal])."""
+    analyzed = []
+    wanted = {}
+    for label, build in workload:
+        queryset = build().using(using)
+        analyzed.append((label, queryset, plan_issues(queryset)))
+        for model, fields in candidate_columns(queryset).items():
+            wanted.setdefault((model, tuple(fields)), []).append(label)
+
+    # A candidate that is a prefix of a longer one on the same table is served by it.
+    for (model, fields), labels in list(wanted.items()):
+        longer = [key for key in wanted
+                  if key[0] is model and len(key[1]) > len(fields) and key[1][:len(fields)] == fields]
+        if longer:
+            wanted[longer[0]].extend(labels)
+            del wanted[(model, fields)]
+
+    proposals = [
+        IndexProposal(model, list(fields), labels)
+        for (model, fields), labels in wanted.items()
+        if not _covered(model, fields, existing_indexes(model, using))
+    ]
+    return analyzed, proposals
@@ -0,0 +1,219 @@
+"""Bulk loading of ratings from MovieLens-style files.
+
+read_ratings() streams (user id, movie id, score, rated at) rows out of a
+ratings file, plain or gzip-compressed. The file is either a CSV file with a
+header (MovieLens' userId,movieId,rating,timestamp, or user,movie,score,
+timestamp) or a JSON-lines file with those keys. Scores are multiplied by
+`scale` (2 turns MovieLens' 0.5-5 stars into 1-10). Rows whose score is then
+not a whole number from 1 to 10 (the CHECK on Rating.Score) come out as None.
+
+load_ratings() drops invalid rows and rows for movies the catalog does not
+have. It groups the rest into batches and writes them on a thread pool, each
+worker on its own connection. At most 2 * workers batches are held at once,
+so memory stays flat however long the file is. Per batch:
+
+- the users the database does not have yet are created in one INSERT;
+- the ratings are upserted on the table's key, (UserID, MovieID), in one
+  multi-row INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT on SQLite); a
+  later row for the same pair wins.
+
+The upsert skips the Rating signal handlers, so MovieRatingStats and the
+leaderboards are rebuilt once at the end.
+"""
+import csv
+import datetime
+import gzip
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+from .models import Movie, Rating, User
+from .querycache import bump_model_version
+from .stats import rebuild_rating_stats
+
+MIN_SCORE, MAX_SCORE = 1, 10
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_WORKERS = 4
+# Concurrent upserts that share users can deadlock on MySQL; the loser is retried.
+WRITE_ATTEMPTS = 3
+COLUMN_ALIASES = {
+    'user': ('user', 'userid', 'user_id'),
+    'movie': ('movie', 'movieid', 'movie_id'),
+    'score': ('score', 'rating'),
+    'timestamp': ('timestamp', 'ratedat', 'rated_at'),
+}
+# Users known only from a ratings file get a placeholder account that cannot log in.
+IMPORTED_USERNAME = 'imported-{}'
+IMPORTED_EMAIL = 'imported-{}@ratings.invalid'
+
+
+class IngestStats:
+    def __init__(self):
+        self.read = 0
+        self.loaded = 0
+        self.invalid = 0
+        self.unknown_movies = 0
+        self.users_created = 0
+        self.started = time.perf_counter()
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        """Rows read per second so far."""
+        return self.read / self.seconds if self.seconds else 0.0
+
+
+def _columns(names):
+    """{column: name in the file} for `names`, a CSV header or the keys of a JSON record."""
+    lowered = {name.strip().lower(): name for name in names}
+    found = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        found[column] = next((lowered[alias] for alias in aliases if alias in lowered), None)
+        if found[column] is None and column != 'timestamp':
+            raise ValueError(f"No {column} column (expected one of: {', '.join(aliases)})")
+    return found
+
+
+def _rated_at(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)) or value.replace('.', '', 1).isdigit():
+        return datetime.datetime.fromtimestamp(float(value), tz=datetime.timezone.utc)
+    rated_at = datetime.datetime.fromisoformat(value)
+    return rated_at if rated_at.tzinfo else rated_at.replace(tzinfo=datetime.timezone.utc)
+
+
+def parse_rating(record, columns, scale=1):
+    """(user id, movie id, score, rated at) from one record, or None if it is not a valid rating."""
+    try:
+        score = float(record[columns['score']]) * scale
+        if score != int(score) or not MIN_SCORE <= score <= MAX_SCORE:
+            return None
+        return (int(record[columns['user']]), int(record[columns['movie']]), int(score),
+                _rated_at(record.get(columns['timestamp']) if columns['timestamp'] else None))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def read_ratings(path, scale=1):
+    """Yields parse_rating() of every record in a .csv or .jsonl file (optionally .gz)."""
+    name = path[:-3] if path.endswith('.gz') else path
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        if name.endswith(('.jsonl', '.ndjson', '.json')):
+            columns = None
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    yield None
+                    continue
+                if columns is None:
+                    columns = _columns(record)
+                yield parse_rating(record, columns, scale)
+        else:
+            reader = csv.DictReader(f)
+            columns = _columns(reader.fieldnames or [])
+            for record in reader:
+                yield parse_rating(record, columns, scale)
+
+
+def rating_key(using=DEFAULT_DB_ALIAS):
+    """Rating fields of the table's primary key as the database has it: (UserID, MovieID) once 0008 has run.
+
+    The upsert conflicts on it. MySQL's ON DUPLICATE KEY UPDATE takes no
+    target and fires on any unique key, which for Rating is the same one.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        columns = connection.introspection.get_primary_key_columns(cursor, Rating._meta.db_table)
+    return [field.name for field in Rating._meta.concrete_fields if field.column in columns]
+
+
+def _write_batch(batch, key, using):
+    """Creates the batch's missing users and upserts its ratings; returns the number of users created."""
+    ratings = {(user_id, movie_id): (score, rated_at) for user_id, movie_id, score, rated_at in batch}
+    user_ids = {user_id for user_id, _ in ratings}
+    conflict = {'unique_fields': key} if connections[using].features.supports_update_conflicts_with_target else {}
+    try:
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                with transaction.atomic(using=using):
+                    existing = User.objects.using(using).filter(userid__in=user_ids).values_list('userid', flat=True)
+                    missing = user_ids - set(existing)
+                    User.objects.using(using).bulk_create([
+                        User(userid=user_id, username=IMPORTED_USERNAME.format(user_id),
+                             email=IMPORTED_EMAIL.format(user_id), passwordhash='!')
+                        for user_id in missing
+                    ], ignore_conflicts=True)
+                    Rating.objects.using(using).bulk_create([
+                        Rating(userid_id=user_id, movieid_id=movie_id, score=score, ratedat=rated_at)
+                        for (user_id, movie_id), (score, rated_at) in ratings.items()
+                    ], update_conflicts=True, update_fields=['score', 'ratedat'], **conflict)
+                return len(missing)
+            except OperationalError:
+                if attempt == WRITE_ATTEMPTS - 1:
+                    raise
+    finally:
+        connections[using].close()
+
+
+def load_ratings(rows, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS, rebuild_stats=True,
+                 progress=None, using=DEFAULT_DB_ALIAS):
+    """Upserts (user id, movie id, score, rated at) rows, None for invalid ones; returns IngestStats.
+
+    `progress(stats)` is called after each batch is queued.
+    """
+    stats = IngestStats()
+    movie_ids = set(Movie.objects.using(using).values_list('movieid', flat=True))
+    key = rating_key(using)
+
+    def valid(rows):
+        for row in rows:
+            stats.read += 1
+            if row is None:
+                stats.invalid += 1
+            elif row[1] not in movie_ids:
+                stats.unknown_movies += 1
+            else:
+                stats.loaded += 1
+                yield row
+
+    def collect(future):
+        stats.users_created += future.result()
+
+    # SQLite allows one writer at a time.
+    if connections[using].vendor == 'sqlite':
+        workers = 1
+    in_flight = threading.BoundedSemaphore(2 * workers)
+    pending = deque()
+    rows = valid(rows)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while batch := list(islice(rows, batch_size)):
+            in_flight.acquire()
+            future = pool.submit(_write_batch, batch, key, using)
+            future.add_done_callback(lambda future: in_flight.release())
+            pending.append(future)
+            # Collecting as we go surfaces a failed batch early and keeps `pending` short.
+            while pending and pending[0].done():
+                collect(pending.popleft())
+            if progress is not None:
+                progress(stats)
+        while pending:
+            collect(pending.popleft())
+
+    bump_model_version(User)
+    bump_model_version(Rating)
+    if rebuild_stats:
+        rebuild_rating_stats()
+    return stats
@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, migrations
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+from movies.indexadvisor import analyze, time_query
+
+
+class Command(BaseCommand):
+    help = ("EXPLAIN the known query workload (run_queries.py / queries.sql), flag full scans and "
+            "filesorts, and propose composite indexes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--compare', action='store_true',
+                            help="Time the workload before and after temporarily creating the proposed indexes.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per query when timing (the median is shown).")
+        parser.add_argument('--analyze', action='store_true',
+                            help="Also print EXPLAIN ANALYZE for each query (MySQL 8.0.18+).")
+        parser.add_argument('--write-migration', action='store_true',
+                            help="Write the proposals as an AddIndex migration of the movies app.")
+
+    def handle(self, *args, **options):
+        using = options['database']
+        try:
+            analyzed, proposals = analyze(using=using)
+        except NotImplementedError as e:
+            raise CommandError(str(e))
+
+        for label, queryset, issues in analyzed:
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for issue in issues:
+                self.stdout.write(f"  {issue}")
+            if not issues:
+                self.stdout.write("  no full scans or filesorts")
+            if options['analyze']:
+                self.stdout.write(queryset.explain(analyze=True))
+
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS("\nExisting indexes already serve the workload."))
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING("\nProposed indexes (add to the model's Meta.indexes):"))
+        for proposal in proposals:
+            self.stdout.write(f"  {proposal.model.__name__}: {proposal.meta_line()}")
+            self.stdout.write(f"      for {', '.join(proposal.queries)}")
+
+        if options['compare']:
+            self.compare(analyzed, proposals, using, options['repeat'])
+        if options['write_migration']:
+            self.write_migration(proposals)
+
+    def compare(self, analyzed, proposals, using, repeat):
+        before = {label: time_query(queryset, repeat) for label, queryset, _ in analyzed}
+        connection = connections[using]
+        with connection.schema_editor() as editor:
+            for proposal in proposals:
+                editor.add_index(proposal.model, proposal.index())
+        try:
+            after = {label: time_query(queryset, repeat) for label, queryset, _ in analyzed}
+        finally:
+            # Migrations stay the only way indexes get into the schema for good.
+            with connection.schema_editor() as editor:
+                for proposal in proposals:
+                    editor.remove_index(proposal.model, proposal.index())
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nMedian latency over {repeat} runs (ms):"))
+        self.stdout.write(f"  {'query':45} {'before':>9} {'after':>9} {'speedup':>8}")
+        for label, _, _ in analyzed:
+            speedup = before[label] / after[label] if after[label] else float('inf')
+            self.stdout.write(f"  {label:45} {before[label]:9.2f} {after[label]:9.2f} {speedup:7.1f}x")
+
+    def write_migration(self, proposals):
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        leaf = loader.graph.leaf_nodes('movies')[0]
+        number = int(leaf[1].split('_')[0]) + 1
+        migration = type('Migration', (migrations.Migration,), {
+            'dependencies': [leaf],
+            'operations': [
+                migrations.AddIndex(model_name=proposal.model._meta.model_name, index=proposal.index())
+                for proposal in proposals
+            ],
+        })(f"{number:04d}_advised_indexes", 'movies')
+        writer = MigrationWriter(migration)
+        with open(writer.path, 'w', encoding='utf-8') as f:
+            f.write(writer.as_string())
+        self.stdout.write(self.style.SUCCESS(
+            f"\nWrote {writer.path}. Add the Meta.indexes lines above to movies/models.py so "
+            f"makemigrations stays in step."))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.analytics import CatalogSnapshot
+
+
+class Command(BaseCommand):
+    help = "Write the columnar analytics snapshot that worker processes memory-map (run after an import)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help="Directory for the .npy files (default: settings.ANALYTICS_SNAPSHOT_DIR).")
+
+    def handle(self, *args, **options):
+        directory = options['output'] or settings.ANALYTICS_SNAPSHOT_DIR
+        if not directory:
+            raise CommandError("Pass --output or set ANALYTICS_SNAPSHOT_DIR.")
+        try:
+            snapshot = CatalogSnapshot.from_database()
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        snapshot.save(directory)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(snapshot)} movies, {len(snapshot.arrays['genre_row'])} genre links and "
+            f"{len(snapshot.arrays['actor_row'])} cast links to {directory}."))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.perf import BASELINE_PATH, DEFAULT_REPEAT, DEFAULT_TOLERANCE, compare, load_baseline, measure, \
+    save_baseline
+
+
+class Command(BaseCommand):
+    help = ("Count the queries and time the run_queries.py workload, API views and admin changelists, "
+            "and compare them with the stored baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON file.")
+        parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                            help="Timed runs per path (the median is kept).")
+        parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                            help="Allowed slowdown as a multiple of the baseline time.")
+        parser.add_argument('--queries-only', action='store_true',
+                            help="Only compare query counts, e.g. on a machine the baseline was not recorded on.")
+        parser.add_argument('--update-baseline', action='store_true', help="Save this run as the new baseline.")
+
+    def handle(self, *args, **options):
+        try:
+            results = measure(repeat=options['repeat'], using=options['database'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['update_baseline']:
+            save_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Saved a baseline of {len(results)} paths to {options['baseline']}."))
+            return
+
+        try:
+            baseline = load_baseline(options['baseline'])
+        except FileNotFoundError:
+            raise CommandError(f"No baseline at {options['baseline']}; record one with --update-baseline.")
+        for label, result in results.items():
+            expected = baseline.get(label, {})
+            self.stdout.write(f"{label:<40} {result['queries']:>3} queries (baseline {expected.get('queries', '-')})  "
+                              f"{result['ms']:>9.2f} ms (baseline {expected.get('ms', '-')})")
+        regressions = compare(results, baseline, options['tolerance'], check_time=not options['queries_only'])
+        if regressions:
+            raise CommandError("Performance regressions:\n" + "\n".join(
+                f"  {label}: {message}" for label, message in regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions in {len(results)} paths."))
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.export import DEFAULT_CHUNK_SIZE, ENCODERS, stream
+
+
+class Command(BaseCommand):
+    help = "Export every movie with its director, genres, cast and rating counters as CSV, JSON lines or Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write, or - for standard output.")
+        parser.add_argument('--format', choices=list(ENCODERS), default=None,
+                            help="Output format (default: from the file extension, else csv).")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Movies read per query.")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or next((fmt for fmt in ENCODERS if output.endswith('.' + fmt)), 'csv')
+        try:
+            chunks = stream(fmt, chunk_size=options['chunk_size'])
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        size = 0
+        out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for data in chunks:
+                out.write(data)
+                size += len(data)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(f"Wrote {size:,} bytes of {fmt} to {output}."))
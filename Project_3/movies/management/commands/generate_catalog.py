@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from movies.synthetic import DEFAULT_BATCH_SIZE, generate
+
+
+class Command(BaseCommand):
+    help = ("Add a synthetic catalog with realistic genre, cast and rating skew, for load and "
+            "performance testing (e.g. --movies 1000000 --people 500000 --ratings 50000000).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=1000)
+        parser.add_argument('--people', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--ratings', type=int, default=5000)
+        parser.add_argument('--genres-per-movie', type=int, default=3, help="Most genres one movie gets.")
+        parser.add_argument('--cast-size', type=int, default=8, help="Most actors one movie gets.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows per INSERT.")
+        parser.add_argument('--seed', type=int, default=0, help="The same seed generates the same catalog.")
+        parser.add_argument('--search-index', action='store_true', help="Also rebuild the search index.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            added = generate(movies=options['movies'], people=options['people'], users=options['users'],
+                             ratings=options['ratings'], genres_per_movie=options['genres_per_movie'],
+                             cast_size=options['cast_size'], batch_size=options['batch_size'], seed=options['seed'],
+                             search_index=options['search_index'])
+        except DatabaseError as e:
+            raise CommandError(str(e))
+        summary = ', '.join(f"{rows:,} {name}" for name, rows in added.items())
+        self.stdout.write(self.style.SUCCESS(f"Added {summary} in {time.perf_counter() - started:.1f}s."))
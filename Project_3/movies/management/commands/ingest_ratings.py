@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from movies.ingest import DEFAULT_BATCH_SIZE, DEFAULT_WORKERS, load_ratings, read_ratings
+
+PROGRESS_SECONDS = 5
+
+
+class Command(BaseCommand):
+    help = "Stream ratings from a MovieLens-style CSV or JSON-lines file (optionally .gz) into Rating."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="userId,movieId,rating,timestamp CSV, or JSON lines with those keys.")
+        parser.add_argument('--scale', type=float, default=1,
+                            help="Multiplier applied to each score before the 1-10 check (2 for MovieLens stars).")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Ratings per INSERT.")
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Batches written at once.")
+        parser.add_argument('--no-rebuild-stats', action='store_true',
+                            help="Leave MovieRatingStats and the leaderboards for a later rebuild_stats.")
+
+    def handle(self, *args, **options):
+        last_report = time.perf_counter()
+
+        def progress(stats):
+            nonlocal last_report
+            if time.perf_counter() - last_report >= PROGRESS_SECONDS:
+                last_report = time.perf_counter()
+                self.stdout.write(f"{stats.read:,} rows read, {stats.rate:,.0f} rows/s")
+
+        try:
+            stats = load_ratings(read_ratings(options['path'], scale=options['scale']),
+                                 batch_size=options['batch_size'], workers=options['workers'],
+                                 rebuild_stats=not options['no_rebuild_stats'], progress=progress)
+        except (OSError, ValueError, DatabaseError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {stats.loaded:,} of {stats.read:,} ratings in {stats.seconds:.1f}s ({stats.rate:,.0f} rows/s); "
+            f"skipped {stats.invalid:,} invalid and {stats.unknown_movies:,} for unknown movies; "
+            f"created {stats.users_created:,} users."))
@@ -0,0 +1,47 @@
+import importlib
+import runpy
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.profiling import DEFAULT_N_PLUS_ONE_THRESHOLD, QueryProfiler
+
+
+class Command(BaseCommand):
+    help = ("Run a script (path/to/script.py) or a callable (package.module:function) and report "
+            "every SQL statement it sends, with timings, origins and likely N+1 patterns.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', help="A .py file to run as __main__, or module:function to call.")
+        parser.add_argument('--json', dest='json_path', help="Also write the report as JSON to this file.")
+        parser.add_argument('--text', dest='text_path', help="Also write the text report to this file.")
+        parser.add_argument('--explain-slow', type=float, metavar='MS',
+                            help="Capture EXPLAIN for SELECTs slower than this many milliseconds.")
+        parser.add_argument('--threshold', type=int, default=DEFAULT_N_PLUS_ONE_THRESHOLD,
+                            help="Runs of one query shape from one line that count as N+1.")
+        parser.add_argument('--fail-on-n-plus-one', action='store_true',
+                            help="Exit with an error if any N+1 pattern is found.")
+
+    def load(self, target):
+        if target.endswith('.py'):
+            return lambda: runpy.run_path(target, run_name='__main__')
+        module_name, _, function_name = target.partition(':')
+        if not function_name:
+            raise CommandError("Target must be a .py file or module:function.")
+        try:
+            return getattr(importlib.import_module(module_name), function_name)
+        except (ImportError, AttributeError) as e:
+            raise CommandError(f"Cannot load {target}: {e}")
+
+    def handle(self, *args, **options):
+        run = self.load(options['target'])
+        with QueryProfiler(n_plus_one_threshold=options['threshold'],
+                           explain_slower_than_ms=options['explain_slow'], label=options['target']) as profiler:
+            run()
+        report = profiler.report()
+
+        self.stdout.write(report.as_text())
+        for path in (options['json_path'], options['text_path']):
+            if path:
+                report.write(path)
+        if options['fail_on_n_plus_one'] and report.n_plus_one():
+            raise CommandError(f"{len(report.n_plus_one())} likely N+1 pattern(s) found.")
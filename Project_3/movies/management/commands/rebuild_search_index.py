@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from movies.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search_term index over titles, summaries, directors and cast (run after an import)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Movies reindexed per transaction.")
+
+    def handle(self, *args, **options):
+        movies = rebuild_search_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {movies} movies."))
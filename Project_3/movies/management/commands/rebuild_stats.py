@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from movies.stats import rebuild_rating_stats, rebuild_stats
+
+
+class Command(BaseCommand):
+    help = ("Recompute the summary tables (genre_stats, director_stats, movie_rating_stats) "
+            "and the top-rated leaderboards from the base tables.")
+
+    def handle(self, *args, **options):
+        genre_rows, director_rows = rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats for {genre_rows} genres and {director_rows} directors."))
+        movie_rows, boards = rebuild_rating_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rating stats for {movie_rows} movies and {boards} leaderboards."))
@@ -0,0 +1,35 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from movies.outbox import DEFAULT_RELAY_BATCH_SIZE, purge_delivered, relay
+
+
+class Command(BaseCommand):
+    help = "Deliver change events to the cache, search and audit consumers (keeps polling unless --once)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Deliver what is pending now, then exit.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to wait when nothing is pending.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_RELAY_BATCH_SIZE,
+                            help="Events delivered per transaction.")
+        parser.add_argument('--keep-days', type=int, default=30,
+                            help="Delete events delivered more than this many days ago.")
+
+    def handle(self, *args, **options):
+        delivered = 0
+        while True:
+            batch = relay(batch_size=options['batch_size'])
+            delivered += batch
+            if batch:
+                continue
+            purged = purge_delivered(timezone.now() - datetime.timedelta(days=options['keep_days']))
+            if options['once']:
+                break
+            if delivered or purged:
+                self.stdout.write(f"Delivered {delivered} events, purged {purged}.")
+                delivered = 0
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Delivered {delivered} events, purged {purged}."))
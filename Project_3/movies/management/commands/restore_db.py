@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.backup import DEFAULT_WORKERS, restore
+
+
+class Command(BaseCommand):
+    help = "Load a backup_db directory back, in parallel, after checking every chunk against its manifest."
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help="A directory written by backup_db.")
+        parser.add_argument('--tables', nargs='+', help="Only these tables (default: all in the backup).")
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Chunks loaded at once.")
+        parser.add_argument('--replace', action='store_true', help="Empty the tables first.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            loaded = restore(options['directory'], tables=options['tables'], workers=options['workers'],
+                             replace=options['replace'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        for name, rows in loaded.items():
+            self.stdout.write(f"{name}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored in {time.perf_counter() - start:.1f}s. Run rebuild_stats, rebuild_search_index and "
+            f"train_recommender to rebuild the derived tables."))
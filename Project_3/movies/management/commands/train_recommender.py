@@ -0,0 +1,26 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.recommender import DEFAULT_BLOCK_SIZE, DEFAULT_MIN_SUPPORT, DEFAULT_TOP_K, train
+
+
+class Command(BaseCommand):
+    help = "Precompute each movie's most similar movies from Rating (item-item), with genre/director fallback."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help="Only retrain movies whose ratings changed since the last finished run.")
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help="Neighbours stored per movie.")
+        parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                            help="Movies per similarity block; bounds memory.")
+        parser.add_argument('--min-support', type=int, default=DEFAULT_MIN_SUPPORT,
+                            help="Users who must have rated both movies for a rating-based pair.")
+
+    def handle(self, *args, **options):
+        try:
+            run = train(incremental=options['incremental'], top_k=options['top_k'],
+                        block_size=options['block_size'], min_support=options['min_support'])
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"{run.mode.capitalize()} run {run.runid}: {run.movies} movies from {run.ratings} ratings."))
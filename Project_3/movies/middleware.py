@@ -0,0 +1,84 @@
+import logging
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .profiling import QueryProfiler
+from .routers import PIN_COOKIE, request_pin, sticky_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfilingMiddleware:
+    """Profiles the SQL of each request (see movies/profiling.py).
+
+    Active only when settings.SQL_PROFILING is true. Adds X-SQL-Query-Count and
+    X-SQL-Time-Ms response headers, logs a warning for likely N+1 patterns and,
+    if settings.SQL_PROFILE_DIR is set, writes a text and a JSON report per request.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.report_dir = getattr(settings, 'SQL_PROFILE_DIR', None)
+        self.explain_ms = getattr(settings, 'SQL_PROFILE_EXPLAIN_MS', None)
+
+    def __call__(self, request):
+        label = f"{request.method} {request.get_full_path()}"
+        with QueryProfiler(explain_slower_than_ms=self.explain_ms, label=label) as profiler:
+            response = self.get_response(request)
+        report = profiler.report()
+
+        response['X-SQL-Query-Count'] = str(len(report.queries))
+        response['X-SQL-Time-Ms'] = f"{report.total_ms:.1f}"
+        for shape, origin, queries in report.n_plus_one():
+            logger.warning("Possible N+1 in %s: %d x %s from %s", label, len(queries), shape[:120], origin)
+        if self.report_dir:
+            os.makedirs(self.report_dir, exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{request.path.strip('/').replace('/', '_') or 'root'}"
+            base = os.path.join(self.report_dir, name)
+            report.write(base + '.txt')
+            report.write(base + '.json')
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """Read-your-writes across requests when reads go to replicas (see movies/routers.py).
+
+    A request that writes sets a cookie for REPLICA_STICKY_SECONDS; the client's
+    requests carrying it read from 'default' until replication has caught up.
+    Unused unless settings.DATABASE_REPLICAS is set.
+    """
+
+    sync_capable = True
+    # Async too, so it does not force async views under ASGI onto a thread.
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DATABASE_REPLICAS', ()):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        with request_pin(bool(request.COOKIES.get(PIN_COOKIE))) as pin:
+            response = self.get_response(request)
+        return self._remember(pin, response)
+
+    async def _acall(self, request):
+        with request_pin(bool(request.COOKIES.get(PIN_COOKIE))) as pin:
+            response = await self.get_response(request)
+        return self._remember(pin, response)
+
+    @staticmethod
+    def _remember(pin, response):
+        if pin.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=sticky_seconds(), httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectorStats',
+            fields=[
+                ('directorid', models.OneToOneField(db_column='DirectorID', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='director_stats', serialize=False, to='movies.person')),
+                ('moviecount', models.IntegerField(db_column='MovieCount', default=0)),
+                ('scoredcount', models.IntegerField(db_column='ScoredCount', default=0)),
+                ('scoresum', models.DecimalField(db_column='ScoreSum', decimal_places=1, default=0, max_digits=12)),
+            ],
+            options={
+                'db_table': 'director_stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='GenreStats',
+            fields=[
+                ('genreid', models.OneToOneField(db_column='GenreID', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='movies.genre')),
+                ('moviecount', models.IntegerField(db_column='MovieCount', default=0)),
+                ('scoredcount', models.IntegerField(db_column='ScoredCount', default=0)),
+                ('scoresum', models.DecimalField(db_column='ScoreSum', decimal_places=1, default=0, max_digits=12)),
+            ],
+            options={
+                'db_table': 'genre_stats',
+            },
+        ),
+    ]
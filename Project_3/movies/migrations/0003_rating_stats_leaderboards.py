@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_summary_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('leaderboardid', models.AutoField(db_column='LeaderboardID', primary_key=True, serialize=False)),
+                ('priormean', models.FloatField(db_column='PriorMean', default=0)),
+                ('minratings', models.IntegerField(db_column='MinRatings')),
+                ('cutoff', models.FloatField(blank=True, db_column='Cutoff', null=True)),
+                ('refreshedat', models.DateTimeField(auto_now=True, db_column='RefreshedAt')),
+                ('genreid', models.OneToOneField(blank=True, db_column='GenreID', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard', to='movies.genre')),
+            ],
+            options={
+                'db_table': 'leaderboard',
+            },
+        ),
+        migrations.CreateModel(
+            name='MovieRatingStats',
+            fields=[
+                ('movieid', models.OneToOneField(db_column='MovieID', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='movies.movie')),
+                ('ratingcount', models.IntegerField(db_column='RatingCount', default=0)),
+                ('ratingsum', models.IntegerField(db_column='RatingSum', default=0)),
+                ('ratingavg', models.DecimalField(blank=True, db_column='RatingAvg', decimal_places=2, max_digits=4, null=True)),
+            ],
+            options={
+                'db_table': 'movie_rating_stats',
+                'indexes': [models.Index(fields=['-ratingcount'], name='idx_rating_stats_count')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(db_column='ID', primary_key=True, serialize=False)),
+                ('rank', models.IntegerField(db_column='Rank')),
+                ('weightedscore', models.FloatField(db_column='WeightedScore')),
+                ('ratingcount', models.IntegerField(db_column='RatingCount')),
+                ('ratingavg', models.DecimalField(db_column='RatingAvg', decimal_places=2, max_digits=4)),
+                ('leaderboardid', models.ForeignKey(db_column='LeaderboardID', on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='movies.leaderboard')),
+                ('movieid', models.ForeignKey(db_column='MovieID', on_delete=django.db.models.deletion.CASCADE, to='movies.movie')),
+            ],
+            options={
+                'db_table': 'leaderboard_entry',
+                'ordering': ['rank'],
+                'unique_together': {('leaderboardid', 'rank')},
+            },
+        ),
+    ]
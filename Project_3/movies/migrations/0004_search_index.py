@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_rating_stats_leaderboards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(db_column='ID', primary_key=True, serialize=False)),
+                ('term', models.CharField(db_column='Term', max_length=64)),
+                ('weight', models.FloatField(db_column='Weight')),
+                ('movieid', models.ForeignKey(db_column='MovieID', on_delete=django.db.models.deletion.CASCADE, to='movies.movie')),
+            ],
+            options={
+                'db_table': 'search_term',
+                'unique_together': {('term', 'movieid')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+INDEXES = [
+    ('Movie', models.Index(fields=['tmdbscore', 'releaseyear'], name='idx_movie_tmdbscor_releasey')),
+    ('Movie', models.Index(fields=['country', 'releaseyear', 'durationinminutes'], name='idx_movie_countr_releas_durati')),
+    ('Movie', models.Index(fields=['durationinminutes'], name='idx_movie_durationinminutes')),
+    ('Person', models.Index(fields=['fullname'], name='idx_person_fullname')),
+]
+
+
+def add_indexes(apps, schema_editor):
+    """Adds the indexes unless Project_2/schema.sql already created them."""
+    for model_name, index in INDEXES:
+        model = apps.get_model('movies', model_name)
+        with schema_editor.connection.cursor() as cursor:
+            constraints = schema_editor.connection.introspection.get_constraints(cursor, model._meta.db_table)
+        if index.name not in constraints:
+            schema_editor.add_index(model, index)
+
+
+def remove_indexes(apps, schema_editor):
+    for model_name, index in INDEXES:
+        schema_editor.remove_index(apps.get_model('movies', model_name), index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name=model_name.lower(), index=index)
+                              for model_name, index in INDEXES],
+            database_operations=[migrations.RunPython(add_indexes, remove_indexes)],
+        ),
+    ]
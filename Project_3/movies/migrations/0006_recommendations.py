@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_advised_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityRun',
+            fields=[
+                ('runid', models.AutoField(db_column='RunID', primary_key=True, serialize=False)),
+                ('mode', models.CharField(db_column='Mode', max_length=12)),
+                ('startedat', models.DateTimeField(db_column='StartedAt')),
+                ('finishedat', models.DateTimeField(blank=True, db_column='FinishedAt', null=True)),
+                ('ratings', models.IntegerField(db_column='Ratings', default=0)),
+                ('movies', models.IntegerField(db_column='Movies', default=0)),
+            ],
+            options={
+                'db_table': 'similarity_run',
+            },
+        ),
+        migrations.AddField(
+            model_name='movieratingstats',
+            name='updatedat',
+            field=models.DateTimeField(auto_now=True, db_column='UpdatedAt'),
+        ),
+        migrations.CreateModel(
+            name='MovieSimilarity',
+            fields=[
+                ('id', models.AutoField(db_column='ID', primary_key=True, serialize=False)),
+                ('score', models.FloatField(db_column='Score')),
+                ('source', models.CharField(choices=[('ratings', 'Co-ratings'), ('content', 'Genres and director')], db_column='Source', max_length=10)),
+                ('movieid', models.ForeignKey(db_column='MovieID', on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='movies.movie')),
+                ('similarmovieid', models.ForeignKey(db_column='SimilarMovieID', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.movie')),
+            ],
+            options={
+                'db_table': 'movie_similarity',
+                'indexes': [models.Index(fields=['movieid', '-score'], name='idx_similarity_movie_score')],
+                'unique_together': {('movieid', 'similarmovieid')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:57
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('eventid', models.BigAutoField(db_column='EventID', primary_key=True, serialize=False)),
+                ('tablename', models.CharField(db_column='TableName', max_length=30)),
+                ('rowid', models.IntegerField(db_column='RowID')),
+                ('action', models.CharField(choices=[('insert', 'Insert'), ('update', 'Update'), ('delete', 'Delete')], db_column='Action', max_length=10)),
+                ('changes', models.JSONField(blank=True, db_column='Changes', encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('createdat', models.DateTimeField(auto_now_add=True, db_column='CreatedAt')),
+                ('deliveredat', models.DateTimeField(blank=True, db_column='DeliveredAt', null=True)),
+            ],
+            options={
+                'db_table': 'change_event',
+                'indexes': [models.Index(fields=['deliveredat', 'eventid'], name='idx_change_event_pending')],
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The Project_2 schema keys these tables on both columns; 0001 declared only the first one.
+KEYS = {'MovieGenre': ('MovieID', 'GenreID'), 'MovieActor': ('MovieID', 'PersonID'), 'Rating': ('UserID', 'MovieID')}
+
+
+def drop_foreign_keys(schema_editor, table):
+    """Drops the table's foreign keys so create_model can reuse their names."""
+    connection = schema_editor.connection
+    # SQLite scopes constraint names to their table; MySQL keeps them after a rename and names must be unique per schema.
+    if connection.vendor == 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    for name, constraint in constraints.items():
+        if constraint['foreign_key']:
+            schema_editor.execute(schema_editor.sql_delete_fk % {
+                'table': connection.ops.quote_name(table),
+                'name': connection.ops.quote_name(name),
+            })
+
+
+def rebuild_with_composite_keys(apps, schema_editor):
+    """Rebuilds the tables 0001 created with a one-column key; tables from schema.sql already have the right one."""
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    for name, key in KEYS.items():
+        model = apps.get_model('movies', name)
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if tuple(connection.introspection.get_primary_key_columns(cursor, table)) == key:
+                continue
+        columns = ', '.join(qn(field.column) for field in model._meta.local_concrete_fields)
+        schema_editor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(table + '__old')}")
+        drop_foreign_keys(schema_editor, table + '__old')
+        schema_editor.create_model(model)
+        schema_editor.execute(f"INSERT INTO {qn(table)} ({columns}) SELECT {columns} FROM {qn(table + '__old')}")
+        schema_editor.execute(f"DROP TABLE {qn(table + '__old')}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_change_event'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AddField(
+                model_name='moviegenre',
+                name='pk',
+                field=models.CompositePrimaryKey('movieid', 'genreid', blank=True, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='moviegenre',
+                name='movieid',
+                field=models.ForeignKey(db_column='MovieID', on_delete=django.db.models.deletion.CASCADE, to='movies.movie'),
+            ),
+            migrations.AddField(
+                model_name='movieactor',
+                name='pk',
+                field=models.CompositePrimaryKey('movieid', 'personid', blank=True, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='movieactor',
+                name='movieid',
+                field=models.ForeignKey(db_column='MovieID', on_delete=django.db.models.deletion.CASCADE, to='movies.movie'),
+            ),
+            migrations.AddField(
+                model_name='rating',
+                name='pk',
+                field=models.CompositePrimaryKey('userid', 'movieid', blank=True, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='rating',
+                name='userid',
+                field=models.ForeignKey(db_column='UserID', on_delete=django.db.models.deletion.CASCADE, to='movies.user'),
+            ),
+        ]),
+        # The old single-column key still holds the composite one's rows, so there is nothing to undo.
+        migrations.RunPython(rebuild_with_composite_keys, migrations.RunPython.noop),
+    ]
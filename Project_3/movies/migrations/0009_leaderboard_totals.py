@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:25
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+# movies.stats.LEADERBOARD_MIN_RATINGS when this migration was written.
+LEADERBOARD_MIN_RATINGS = 25
+
+
+def create_overall_board(apps, schema_editor):
+    """Creates the overall board with the current totals, so rating writers always have a row to lock."""
+    Leaderboard = apps.get_model('movies', 'Leaderboard')
+    MovieRatingStats = apps.get_model('movies', 'MovieRatingStats')
+    totals = MovieRatingStats.objects.aggregate(count=Sum('ratingcount'), total=Sum('ratingsum'))
+    board = Leaderboard.objects.filter(genreid=None).first() or Leaderboard(minratings=LEADERBOARD_MIN_RATINGS)
+    board.ratingcount = totals['count'] or 0
+    board.ratingsum = totals['total'] or 0
+    board.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_composite_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leaderboard',
+            name='ratingcount',
+            field=models.BigIntegerField(db_column='RatingCount', default=0),
+        ),
+        migrations.AddField(
+            model_name='leaderboard',
+            name='ratingsum',
+            field=models.BigIntegerField(db_column='RatingSum', default=0),
+        ),
+        migrations.RunPython(create_overall_board, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+INDEX = models.Index(fields=['title'], name='idx_movie_title')
+
+
+def add_index(apps, schema_editor):
+    """Adds the index unless Project_2/movie_rating.sql already created it."""
+    model = apps.get_model('movies', 'Movie')
+    with schema_editor.connection.cursor() as cursor:
+        constraints = schema_editor.connection.introspection.get_constraints(cursor, model._meta.db_table)
+    if INDEX.name not in constraints:
+        schema_editor.add_index(model, INDEX)
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('movies', 'Movie'), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_leaderboard_totals'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='movie', index=INDEX)],
+            database_operations=[migrations.RunPython(add_index, remove_index)],
+        ),
+    ]
@@ -1,11 +1,16 @@
 # Final, perfected models.py with ManyToManyField for robust relationships
 import datetime
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+
+from .querycache import CachingQuerySet
 
 class Genre(models.Model):
     genreid = models.AutoField(db_column='GenreID', primary_key=True)
     genrename = models.CharField(db_column='GenreName', unique=True, max_length=100)
-    
+
+    objects = CachingQuerySet.as_manager()
+
     def __str__(self):
         return self.genrename
 
@@ -19,6 +24,8 @@ class Person(models.Model):
     gender = models.CharField(db_column='Gender', max_length=50, blank=True, null=True)
     nationality = models.CharField(db_column='Nationality', max_length=100, blank=True, null=True)
 
+    objects = CachingQuerySet.as_manager()
+
     @property
     def age(self):
         if not self.birthdate: return None
@@ -30,6 +37,16 @@ class Person(models.Model):
 
     class Meta:
         db_table = 'person'
+        # Proposed by `manage.py advise_indexes` for the run_queries.py workload.
+        indexes = [
+            models.Index(fields=['fullname'], name='idx_person_fullname'),
+        ]
+
+class MovieQuerySet(CachingQuerySet):
+    def search(self, query, prefix=False):
+        """Movies matching `query` in title, summary, director or cast, ranked by relevance."""
+        from .search import search_movies
+        return search_movies(self, query, prefix=prefix)
 
 class Movie(models.Model):
     movieid = models.AutoField(db_column='MovieID', primary_key=True)
@@ -46,6 +63,8 @@ class Movie(models.Model):
     genres = models.ManyToManyField(Genre, through='MovieGenre')
     actors = models.ManyToManyField(Person, through='MovieActor')
 
+    objects = MovieQuerySet.as_manager()
+
     def get_duration_display(self):
         if self.durationinminutes:
             hours = self.durationinminutes // 60
@@ -58,6 +77,14 @@ class Movie(models.Model):
 
     class Meta:
         db_table = 'movie'
+        # Proposed by `manage.py advise_indexes` for the run_queries.py workload.
+        indexes = [
+            models.Index(fields=['tmdbscore', 'releaseyear'], name='idx_movie_tmdbscor_releasey'),
+            models.Index(fields=['country', 'releaseyear', 'durationinminutes'], name='idx_movie_countr_releas_durati'),
+            models.Index(fields=['durationinminutes'], name='idx_movie_durationinminutes'),
+            # Exact title lookups, as in Project_2/movie_rating.sql.
+            models.Index(fields=['title'], name='idx_movie_title'),
+        ]
 
 class User(models.Model):
     userid = models.AutoField(db_column='UserID', primary_key=True)
@@ -73,24 +100,224 @@ class User(models.Model):
         db_table = 'user'
 
 class MovieGenre(models.Model):
-    movieid = models.ForeignKey(Movie, models.CASCADE, db_column='MovieID', primary_key=True)
+    pk = models.CompositePrimaryKey('movieid', 'genreid')
+    movieid = models.ForeignKey(Movie, models.CASCADE, db_column='MovieID')
     genreid = models.ForeignKey(Genre, models.CASCADE, db_column='GenreID')
     class Meta:
         db_table = 'movie_genre'
         unique_together = (('movieid', 'genreid'),)
 
 class MovieActor(models.Model):
-    movieid = models.ForeignKey(Movie, models.CASCADE, db_column='MovieID', primary_key=True)
+    pk = models.CompositePrimaryKey('movieid', 'personid')
+    movieid = models.ForeignKey(Movie, models.CASCADE, db_column='MovieID')
     personid = models.ForeignKey(Person, models.CASCADE, db_column='PersonID')
     class Meta:
         db_table = 'movie_actor'
         unique_together = (('movieid', 'personid'),)
 
+class RatingQuerySet(CachingQuerySet):
+    """Bulk deletes and updates keep the rating counters (movies/stats.py) right, as Rating.delete() does.
+
+    The cascades from a Movie or User delete bypass these; their pre_delete handlers cover them.
+    """
+
+    def _totals_by_movie(self, **extra):
+        return self.order_by().values('movieid').annotate(
+            count=models.Count('score'), total=models.Sum('score'), **extra)
+
+    def delete(self):
+        from .querycache import bump_model_version
+        from .stats import apply_rating_delta
+        with transaction.atomic(using=self.db):
+            removed = list(self._totals_by_movie())
+            deleted = super().delete()
+            for row in removed:
+                apply_rating_delta(row['movieid'], -row['count'], -row['total'])
+            bump_model_version(Rating)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def update(self, **kwargs):
+        from .querycache import bump_model_version
+        from .stats import apply_rating_delta, rebuild_rating_stats
+        moves = {'movieid', 'movieid_id'} & kwargs.keys()
+        if 'score' not in kwargs and not moves:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            if moves:
+                # Ratings moving between movies: recount rather than track both sides.
+                updated = super().update(**kwargs)
+                rebuild_rating_stats()
+            else:
+                score = kwargs['score']
+                if not hasattr(score, 'resolve_expression'):
+                    score = models.Value(score)
+                # Old and new totals in one read, before the filter may stop matching the changed rows.
+                changed = list(self._totals_by_movie(new_total=models.Sum(score)))
+                updated = super().update(**kwargs)
+                for row in changed:
+                    apply_rating_delta(row['movieid'], 0, row['new_total'] - row['total'])
+            bump_model_version(Rating)
+        return updated
+
+    update.alters_data = True
+
 class Rating(models.Model):
-    userid = models.ForeignKey(User, models.CASCADE, db_column='UserID', primary_key=True)
+    pk = models.CompositePrimaryKey('userid', 'movieid')
+    userid = models.ForeignKey(User, models.CASCADE, db_column='UserID')
     movieid = models.ForeignKey(Movie, models.CASCADE, db_column='MovieID')
     score = models.IntegerField(db_column='Score')
     ratedat = models.DateTimeField(db_column='RatedAt', blank=True, null=True)
+
+    objects = RatingQuerySet.as_manager()
+
+    def delete(self, using=None, keep_parents=False):
+        # Not a pre_delete receiver: any delete receiver on Rating makes the cascades from Movie and User
+        # fetch every rating and delete them one at a time instead of with one DELETE.
+        from .querycache import bump_model_version
+        from .stats import apply_rating_delta
+        # Deleting clears the key, and with it movieid.
+        movie_id, score = self.movieid_id, self.score
+        with transaction.atomic(using=using):
+            deleted = super().delete(using, keep_parents)
+            apply_rating_delta(movie_id, -1, -score)
+            bump_model_version(Rating)
+        return deleted
+
     class Meta:
         db_table = 'rating'
-        unique_together = (('userid', 'movieid'),)
\ No newline at end of file
+        unique_together = (('userid', 'movieid'),)
+
+# --- Summary tables, kept up to date by deltas (see movies/stats.py) ---
+
+class GenreStats(models.Model):
+    genreid = models.OneToOneField(Genre, models.CASCADE, db_column='GenreID', primary_key=True, related_name='stats')
+    moviecount = models.IntegerField(db_column='MovieCount', default=0)
+    scoredcount = models.IntegerField(db_column='ScoredCount', default=0)
+    scoresum = models.DecimalField(db_column='ScoreSum', max_digits=12, decimal_places=1, default=0)
+
+    @property
+    def averagescore(self):
+        return self.scoresum / self.scoredcount if self.scoredcount else None
+
+    class Meta:
+        db_table = 'genre_stats'
+
+class DirectorStats(models.Model):
+    directorid = models.OneToOneField(Person, models.CASCADE, db_column='DirectorID', primary_key=True, related_name='director_stats')
+    moviecount = models.IntegerField(db_column='MovieCount', default=0)
+    scoredcount = models.IntegerField(db_column='ScoredCount', default=0)
+    scoresum = models.DecimalField(db_column='ScoreSum', max_digits=12, decimal_places=1, default=0)
+
+    @property
+    def averagescore(self):
+        return self.scoresum / self.scoredcount if self.scoredcount else None
+
+    class Meta:
+        db_table = 'director_stats'
+
+class MovieRatingStats(models.Model):
+    movieid = models.OneToOneField(Movie, models.CASCADE, db_column='MovieID', primary_key=True, related_name='rating_stats')
+    ratingcount = models.IntegerField(db_column='RatingCount', default=0)
+    ratingsum = models.IntegerField(db_column='RatingSum', default=0)
+    ratingavg = models.DecimalField(db_column='RatingAvg', max_digits=4, decimal_places=2, blank=True, null=True)
+    # When this movie's ratings last changed; incremental recommender training starts from it.
+    updatedat = models.DateTimeField(db_column='UpdatedAt', auto_now=True)
+
+    class Meta:
+        db_table = 'movie_rating_stats'
+        indexes = [models.Index(fields=['-ratingcount'], name='idx_rating_stats_count')]
+
+# --- Top-rated leaderboards, refreshed by movies/stats.py when a rating can change them ---
+
+class Leaderboard(models.Model):
+    leaderboardid = models.AutoField(db_column='LeaderboardID', primary_key=True)
+    # genreid is NULL for the overall board.
+    genreid = models.OneToOneField(Genre, models.CASCADE, db_column='GenreID', blank=True, null=True, related_name='leaderboard')
+    priormean = models.FloatField(db_column='PriorMean', default=0)
+    minratings = models.IntegerField(db_column='MinRatings')
+    # Weighted score of the last entry when the board is full, otherwise NULL.
+    cutoff = models.FloatField(db_column='Cutoff', blank=True, null=True)
+    # Running totals of every rating, kept on the overall board only; the prior mean comes from them.
+    ratingcount = models.BigIntegerField(db_column='RatingCount', default=0)
+    ratingsum = models.BigIntegerField(db_column='RatingSum', default=0)
+    refreshedat = models.DateTimeField(db_column='RefreshedAt', auto_now=True)
+
+    class Meta:
+        db_table = 'leaderboard'
+
+class LeaderboardEntry(models.Model):
+    id = models.AutoField(db_column='ID', primary_key=True)
+    leaderboardid = models.ForeignKey(Leaderboard, models.CASCADE, db_column='LeaderboardID', related_name='entries')
+    rank = models.IntegerField(db_column='Rank')
+    movieid = models.ForeignKey(Movie, models.CASCADE, db_column='MovieID')
+    weightedscore = models.FloatField(db_column='WeightedScore')
+    ratingcount = models.IntegerField(db_column='RatingCount')
+    ratingavg = models.DecimalField(db_column='RatingAvg', max_digits=4, decimal_places=2)
+
+    class Meta:
+        db_table = 'leaderboard_entry'
+        unique_together = (('leaderboardid', 'rank'),)
+        ordering = ['rank']
+
+# --- Inverted index for movie search (see movies/search.py) ---
+
+class SearchTerm(models.Model):
+    id = models.AutoField(db_column='ID', primary_key=True)
+    term = models.CharField(db_column='Term', max_length=64)
+    movieid = models.ForeignKey(Movie, models.CASCADE, db_column='MovieID')
+    weight = models.FloatField(db_column='Weight')
+
+    class Meta:
+        db_table = 'search_term'
+        # Serves both exact and prefix (LIKE 'term%') lookups.
+        unique_together = (('term', 'movieid'),)
+
+# --- Item-item recommendations (see movies/recommender.py) ---
+
+class MovieSimilarity(models.Model):
+    SOURCE_CHOICES = [('ratings', 'Co-ratings'), ('content', 'Genres and director')]
+
+    id = models.AutoField(db_column='ID', primary_key=True)
+    movieid = models.ForeignKey(Movie, models.CASCADE, db_column='MovieID', related_name='similarities')
+    similarmovieid = models.ForeignKey(Movie, models.CASCADE, db_column='SimilarMovieID', related_name='+')
+    score = models.FloatField(db_column='Score')
+    source = models.CharField(db_column='Source', max_length=10, choices=SOURCE_CHOICES)
+
+    class Meta:
+        db_table = 'movie_similarity'
+        unique_together = (('movieid', 'similarmovieid'),)
+        # One range read returns a movie's neighbours best first.
+        indexes = [models.Index(fields=['movieid', '-score'], name='idx_similarity_movie_score')]
+
+class SimilarityRun(models.Model):
+    runid = models.AutoField(db_column='RunID', primary_key=True)
+    mode = models.CharField(db_column='Mode', max_length=12)
+    startedat = models.DateTimeField(db_column='StartedAt')
+    finishedat = models.DateTimeField(db_column='FinishedAt', blank=True, null=True)
+    ratings = models.IntegerField(db_column='Ratings', default=0)
+    movies = models.IntegerField(db_column='Movies', default=0)
+
+    class Meta:
+        db_table = 'similarity_run'
+
+# --- Change-event outbox (see movies/outbox.py) ---
+
+class ChangeEvent(models.Model):
+    ACTION_CHOICES = [('insert', 'Insert'), ('update', 'Update'), ('delete', 'Delete')]
+
+    eventid = models.BigAutoField(db_column='EventID', primary_key=True)
+    tablename = models.CharField(db_column='TableName', max_length=30)
+    rowid = models.IntegerField(db_column='RowID')
+    action = models.CharField(db_column='Action', max_length=10, choices=ACTION_CHOICES)
+    # {field: [old, new]}
+    changes = models.JSONField(db_column='Changes', encoder=DjangoJSONEncoder, blank=True, null=True)
+    createdat = models.DateTimeField(db_column='CreatedAt', auto_now_add=True)
+    deliveredat = models.DateTimeField(db_column='DeliveredAt', blank=True, null=True)
+
+    class Meta:
+        db_table = 'change_event'
+        # The relay reads undelivered rows in order.
+        indexes = [models.Index(fields=['deliveredat', 'eventid'], name='idx_change_event_pending')]
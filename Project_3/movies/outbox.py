@@ -0,0 +1,222 @@
+"""Change-event outbox.
+
+Every real insert, update or delete of a tracked row (Movie, Person, Genre
+here; Movie and Movie_Genre from the importer) becomes a ChangeEvent row
+holding the changed fields as {field: [old, new]}. A save that changes
+nothing records nothing: the signal handlers in movies/signals.py diff the
+instance against the row read in pre_save.
+
+Every event is written inside the transaction of the change it records, so
+it commits, or rolls back with its savepoint, together with the row. By
+default that is one INSERT per event. Inside `outbox.atomic()` the events of
+the block itself are kept in memory and written with one bulk INSERT just
+before the block exits, or whenever OUTBOX_FLUSH_SIZE of them are waiting.
+Events from a nested savepoint (a transaction.atomic() inside the block) are
+written at once, inside that savepoint, so rolling it back drops them.
+Outside a transaction an event is written at once.
+
+`relay()` hands undelivered events, oldest first, to the registered
+consumers (query cache invalidation, search reindexing, the audit log) and
+stamps DeliveredAt. Delivery is at least once, so consumers must be
+idempotent. Run it with `manage.py relay_outbox`.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import ChangeEvent, Genre, Movie, Person
+from .querycache import bump_model_version, model_for_table
+from .search import movies_of_person, schedule_reindex
+
+TRACKED_MODELS = (Movie, Person, Genre)
+DEFAULT_FLUSH_SIZE = 500
+DEFAULT_RELAY_BATCH_SIZE = 500
+# Fields whose change alters a movie's search terms (see movies/search.py).
+SEARCH_FIELDS = {'title', 'summary', 'directorid'}
+
+audit_log = logging.getLogger('movies.audit')
+
+_local = threading.local()
+_consumers = []
+
+
+def flush_size():
+    return getattr(settings, 'OUTBOX_FLUSH_SIZE', DEFAULT_FLUSH_SIZE)
+
+
+# --- diffs ---
+
+def tracked_fields(model):
+    return [field for field in model._meta.concrete_fields if not field.primary_key]
+
+
+def row_values(instance):
+    """{field name: value} of `instance`, in the form values() returns them."""
+    return {field.name: field.to_python(getattr(instance, field.attname)) for field in tracked_fields(type(instance))}
+
+
+def diff(old, new):
+    """{field: [old, new]} for the fields that differ; every set field of `new` when `old` is None."""
+    if old is None:
+        return {name: [None, value] for name, value in new.items() if value is not None}
+    return {name: [old.get(name), value] for name, value in new.items() if old.get(name) != value}
+
+
+def changed(instance, *fields):
+    """False only if the last save of `instance` is known to have changed none of `fields` (or nothing)."""
+    changes = getattr(instance, '_outbox_changes', None)
+    if changes is None:
+        return True
+    return any(name in changes for name in fields) if fields else bool(changes)
+
+
+# --- recording ---
+
+class _Buffer:
+    """The events recorded directly inside one outbox.atomic() block, at its savepoint level."""
+
+    def __init__(self, using, level):
+        self.using = using
+        self.level = level
+        self.events = []
+
+    def write(self):
+        events, self.events = self.events, []
+        if events:
+            ChangeEvent.objects.using(self.using).bulk_create(events)
+
+
+def _stack(using):
+    """The open outbox.atomic() blocks of this thread on `using`, innermost last."""
+    if not hasattr(_local, 'stacks'):
+        _local.stacks = {}
+    return _local.stacks.setdefault(using, [])
+
+
+def _level(connection):
+    return tuple(connection.savepoint_ids)
+
+
+def _current_buffer(using):
+    """The innermost outbox.atomic() block's buffer, if no savepoint has been opened inside it since."""
+    stack = _stack(using)
+    connection = connections[using]
+    if stack and connection.in_atomic_block and stack[-1].level == _level(connection):
+        return stack[-1]
+    return None
+
+
+def record(table, row_id, action, changes=None, using=DEFAULT_DB_ALIAS):
+    event = ChangeEvent(tablename=table, rowid=row_id, action=action, changes=changes)
+    buffer = _current_buffer(using)
+    if buffer is None:
+        event.save(using=using)
+        return
+    buffer.events.append(event)
+    if len(buffer.events) >= flush_size():
+        buffer.write()
+
+
+def record_save(instance, old, using=DEFAULT_DB_ALIAS):
+    """Records the insert or update of `instance` against `old` (its row before, or None); returns the changes."""
+    changes = diff(old, row_values(instance))
+    if changes:
+        record(instance._meta.db_table, instance.pk, 'update' if old is not None else 'insert', changes, using)
+    return changes
+
+
+def record_delete(instance, using=DEFAULT_DB_ALIAS):
+    changes = {name: [value, None] for name, value in row_values(instance).items()}
+    record(instance._meta.db_table, instance.pk, 'delete', changes, using)
+
+
+def flush(using=DEFAULT_DB_ALIAS):
+    """Writes the events the enclosing outbox.atomic() block has buffered so far, in one INSERT."""
+    buffer = _current_buffer(using)
+    if buffer is not None:
+        buffer.write()
+
+
+@contextmanager
+def atomic(using=DEFAULT_DB_ALIAS):
+    """transaction.atomic() that buffers the block's events and writes them in one INSERT before it exits.
+
+    If the block raises, its savepoint is rolled back and the buffer dropped with it.
+    """
+    stack = _stack(using)
+    with transaction.atomic(using=using):
+        buffer = _Buffer(using, _level(connections[using]))
+        stack.append(buffer)
+        try:
+            yield
+        finally:
+            stack.remove(buffer)
+        buffer.write()
+
+
+# --- delivery ---
+
+def consumer(*tables):
+    """Registers `function(events)` for events of `tables` (all tables if none are given)."""
+    def register(function):
+        _consumers.append((frozenset(tables), function))
+        return function
+    return register
+
+
+def relay(batch_size=DEFAULT_RELAY_BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+    """Delivers the oldest undelivered events to the consumers; returns how many were delivered.
+
+    A consumer error rolls the batch back, so it is delivered again on the next call.
+    """
+    with transaction.atomic(using=using):
+        pending = ChangeEvent.objects.using(using).filter(deliveredat__isnull=True).order_by('eventid')
+        # Lets several relays share the queue without delivering the same batch.
+        if connections[using].features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        events = list(pending[:batch_size])
+        for tables, function in _consumers:
+            selected = [event for event in events if not tables or event.tablename in tables]
+            if selected:
+                function(selected)
+        ChangeEvent.objects.using(using).filter(pk__in=[event.pk for event in events]).update(
+            deliveredat=timezone.now())
+    return len(events)
+
+
+def purge_delivered(before, using=DEFAULT_DB_ALIAS):
+    """Deletes events delivered before `before`; returns how many."""
+    deleted, _ = ChangeEvent.objects.using(using).filter(deliveredat__lt=before).delete()
+    return deleted
+
+
+@consumer()
+def invalidate_query_cache(events):
+    # Rows the importer wrote never went through the signal handlers that bump versions.
+    for table in {event.tablename for event in events}:
+        model = model_for_table(table)
+        if model is not None:
+            bump_model_version(model)
+
+
+@consumer('movie', 'person')
+def reindex_search(events):
+    movie_ids = set()
+    for event in events:
+        fields = set(event.changes or ())
+        if event.tablename == 'movie' and (event.action != 'update' or fields & SEARCH_FIELDS):
+            movie_ids.add(event.rowid)
+        elif event.tablename == 'person' and event.action == 'update' and 'fullname' in fields:
+            movie_ids.update(movies_of_person(event.rowid))
+    if movie_ids:
+        schedule_reindex(movie_ids)
+
+
+@consumer()
+def write_audit_log(events):
+    for event in events:
+        audit_log.info("%s %s #%s %s", event.tablename, event.action, event.rowid, event.changes or {})
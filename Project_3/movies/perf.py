@@ -0,0 +1,143 @@
+"""Query-count and latency regression checks.
+
+CODE_PATHS are the run_queries.py workload (indexadvisor.WORKLOAD plus Query
+10, the prefetch example), the API views and the admin changelists, searched
+and not. Each one is called once to warm the query cache and the admin's
+cached filter choices, then `repeat` more times. measure() records the queries of the first warm
+call and the median wall time of the others.
+
+The baseline is the result of a run saved as JSON (movies/perf_baseline.json
+by default). compare() reports a path as a regression when it runs more
+queries than its baseline, which is a new N+1 or a lost select_related or
+prefetch_related. With `check_time` it also reports a path that takes longer
+than `tolerance` times its baseline plus SLACK_MS. Query counts do not depend
+on the size of the catalog or the machine, so they can be checked anywhere,
+including the test suite. Times only mean something against a baseline
+recorded on the same machine and catalog. Record that baseline with
+`manage.py generate_catalog`, then `manage.py check_performance
+--update-baseline`.
+"""
+import json
+import os
+import statistics
+import time
+
+from django.contrib.auth.models import User as AdminUser
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from .indexadvisor import WORKLOAD
+from .models import Genre, Movie, MovieActor, Person
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'perf_baseline.json')
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 1.5
+# Added to every time budget, so sub-millisecond paths don't fail on noise.
+SLACK_MS = 5.0
+
+QUERY_10 = ("Q10 top directors with their movies",
+            lambda: Person.objects.annotate(movie_count=models.Count('movie')).order_by('-movie_count')
+            .prefetch_related('movie_set')[:5])
+
+
+def _sample_ids():
+    """Ids the parametrised paths are called with: the first movie, genre, director and actor."""
+    ids = {
+        'movie_id': Movie.objects.order_by('movieid').values_list('movieid', flat=True).first(),
+        'genre_id': Genre.objects.order_by('genreid').values_list('genreid', flat=True).first(),
+        'director_id': Movie.objects.filter(directorid__isnull=False).order_by('movieid')
+        .values_list('directorid', flat=True).first(),
+        'actor_id': MovieActor.objects.order_by('movieid').values_list('personid', flat=True).first(),
+    }
+    missing = [name for name, value in ids.items() if value is None]
+    if missing:
+        raise ValueError(f"No rows for {', '.join(missing)}; load a catalog (manage.py generate_catalog) first.")
+    return ids
+
+
+def _get(url, **params):
+    """Calls the view for `url` directly, as a superuser, and renders the response."""
+    request = RequestFactory(SERVER_NAME='localhost').get(url, params)
+    # Never saved: the admin only asks it for permissions, which a superuser has without a query.
+    request.user = AdminUser(username='perf', is_active=True, is_staff=True, is_superuser=True)
+    match = resolve(request.path_info)
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        raise ValueError(f"GET {url} returned {response.status_code}")
+
+
+def _evaluate(build):
+    return lambda: list(build())
+
+
+def code_paths():
+    """[(label, function)] of the paths measure() runs, in order."""
+    ids = _sample_ids()
+    return [(label, _evaluate(build)) for label, build in [*WORKLOAD, QUERY_10]] + [
+        ("API movie list", lambda: _get(reverse('movies:movie-list'))),
+        ("API movie detail", lambda: _get(reverse('movies:movie-detail', args=[ids['movie_id']]))),
+        ("API movies by genre", lambda: _get(reverse('movies:movies-by-genre', args=[ids['genre_id']]))),
+        ("API movies by director", lambda: _get(reverse('movies:movies-by-director', args=[ids['director_id']]))),
+        ("API movies by actor", lambda: _get(reverse('movies:movies-by-actor', args=[ids['actor_id']]))),
+        ("API top rated", lambda: _get(reverse('movies:top-rated'))),
+        ("API most rated", lambda: _get(reverse('movies:most-rated'))),
+        ("API search", lambda: _get(reverse('movies:search'), q='night')),
+        ("Admin movie changelist", lambda: _get(reverse('admin:movies_movie_changelist'))),
+        ("Admin movie changelist filtered",
+         lambda: _get(reverse('admin:movies_movie_changelist'), country='United States of America')),
+        ("Admin movie search", lambda: _get(reverse('admin:movies_movie_changelist'), q='night')),
+        ("Admin person changelist", lambda: _get(reverse('admin:movies_person_changelist'))),
+    ]
+
+
+def count_queries(function, using=DEFAULT_DB_ALIAS):
+    with CaptureQueriesContext(connections[using]) as queries:
+        function()
+    return len(queries)
+
+
+def measure(repeat=DEFAULT_REPEAT, using=DEFAULT_DB_ALIAS):
+    """{label: {'queries': n, 'ms': median milliseconds}} for every code path."""
+    results = {}
+    for label, function in code_paths():
+        function()
+        queries = count_queries(function, using)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[label] = {'queries': queries, 'ms': round(statistics.median(timings), 3)}
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+        f.write('\n')
+    os.replace(path + '.tmp', path)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, check_time=True):
+    """[(label, message)] for every path that regressed against `baseline`; paths it lacks are skipped."""
+    regressions = []
+    for label, result in results.items():
+        expected = baseline.get(label)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            regressions.append((label, f"{result['queries']} queries, baseline {expected['queries']}"))
+        budget = expected['ms'] * tolerance + SLACK_MS
+        if check_time and result['ms'] > budget:
+            regressions.append((label, f"{result['ms']:.1f} ms, budget {budget:.1f} ms "
+                                       f"(baseline {expected['ms']:.1f} ms)"))
+    return regressions
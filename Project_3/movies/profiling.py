@@ -0,0 +1,220 @@
+"""SQL profiling for ORM code paths.
+
+    with QueryProfiler(explain_slower_than_ms=50) as profiler:
+        ...
+    print(profiler.report().as_text())
+
+Every statement this thread sends on any database connection is recorded
+with its time, row count and the first stack frame outside Django and the
+standard library (where in our code it came from). Statements that differ only in their parameters share a shape; a shape
+run `n_plus_one_threshold` times or more from the same line is flagged as a
+likely N+1. Slow SELECTs can have their EXPLAIN plan captured.
+
+QueryProfilingMiddleware does the same per request and the `profile_sql`
+management command per script.
+"""
+import json
+import os
+import re
+import sysconfig
+import time
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.db import connections
+
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+# A list of placeholders, as in "IN (%s, %s, %s)", is one shape whatever its length.
+_PLACEHOLDER_LIST_RE = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+_IGNORED_PATHS = (
+    os.sep + 'django' + os.sep,
+    os.sep + 'MySQLdb' + os.sep,
+    os.sep + 'mysql' + os.sep,
+    os.sep + 'asgiref' + os.sep,
+    __file__,
+)
+_STDLIB = sysconfig.get_paths()['stdlib']
+
+
+def query_shape(sql):
+    return _WHITESPACE_RE.sub(' ', _PLACEHOLDER_LIST_RE.sub('(...)', sql)).strip()
+
+
+def stack_origin():
+    """'path:line in function' of the innermost frame that is not Django or this module."""
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        if not frame.filename.startswith(_STDLIB) and not any(part in frame.filename for part in _IGNORED_PATHS):
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return None
+
+
+class QueryRecord:
+    __slots__ = ('alias', 'sql', 'params', 'duration_ms', 'rowcount', 'origin', 'explain', 'error')
+
+    def __init__(self, alias, sql, params, duration_ms, rowcount, origin, error=None):
+        self.alias = alias
+        self.sql = sql
+        self.params = params
+        self.duration_ms = duration_ms
+        self.rowcount = rowcount
+        self.origin = origin
+        self.explain = None
+        self.error = error
+
+    @property
+    def shape(self):
+        return query_shape(self.sql)
+
+    def to_dict(self):
+        return {
+            'alias': self.alias,
+            'sql': self.sql,
+            'params': [repr(param) for param in self.params or ()],
+            'duration_ms': round(self.duration_ms, 3),
+            'rowcount': self.rowcount,
+            'origin': self.origin,
+            'explain': self.explain,
+            'error': self.error,
+        }
+
+
+class QueryProfiler:
+    """Context manager recording every SQL statement run inside it, on every connection."""
+
+    def __init__(self, aliases=None, n_plus_one_threshold=DEFAULT_N_PLUS_ONE_THRESHOLD,
+                 explain_slower_than_ms=None, label=None):
+        self.aliases = list(aliases) if aliases is not None else list(connections)
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.explain_slower_than_ms = explain_slower_than_ms
+        self.label = label
+        self.queries = []
+        self.elapsed_ms = 0.0
+        self._stack = None
+        self._explaining = False
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in self.aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self._wrapper(alias)))
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed_ms = (time.perf_counter() - self._started) * 1000
+        self._stack.close()
+        return False
+
+    def _wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            if self._explaining:
+                return execute(sql, params, many, context)
+            error = None
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                duration_ms = (time.perf_counter() - start) * 1000
+                rowcount = getattr(context['cursor'], 'rowcount', -1)
+                query = QueryRecord(alias, sql, params, duration_ms,
+                                    rowcount if rowcount is not None and rowcount >= 0 else None,
+                                    stack_origin(), error)
+                self.queries.append(query)
+                if error is None and not many and self._should_explain(query):
+                    query.explain = self._explain(alias, sql, params)
+        return record
+
+    def _should_explain(self, query):
+        return (self.explain_slower_than_ms is not None
+                and query.duration_ms >= self.explain_slower_than_ms
+                and query.sql.lstrip()[:6].upper() == 'SELECT')
+
+    def _explain(self, alias, sql, params):
+        connection = connections[alias]
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        self._explaining = True
+        try:
+            # A separate cursor, so the profiled cursor's pending rows are untouched.
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            return [{'error': f"{type(e).__name__}: {e}"}]
+        finally:
+            self._explaining = False
+
+    def report(self):
+        return ProfileReport(self)
+
+
+class ProfileReport:
+    def __init__(self, profiler):
+        self.label = profiler.label
+        self.queries = list(profiler.queries)
+        self.elapsed_ms = profiler.elapsed_ms
+        self.n_plus_one_threshold = profiler.n_plus_one_threshold
+
+    @property
+    def total_ms(self):
+        return sum(query.duration_ms for query in self.queries)
+
+    def shapes(self):
+        """[(shape, origin, [queries])] most-repeated first."""
+        groups = defaultdict(list)
+        for query in self.queries:
+            groups[(query.shape, query.origin)].append(query)
+        return sorted(((shape, origin, queries) for (shape, origin), queries in groups.items()),
+                      key=lambda item: (-len(item[2]), -sum(q.duration_ms for q in item[2])))
+
+    def n_plus_one(self):
+        return [item for item in self.shapes() if len(item[2]) >= self.n_plus_one_threshold]
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'query_count': len(self.queries),
+            'sql_time_ms': round(self.total_ms, 3),
+            'elapsed_ms': round(self.elapsed_ms, 3),
+            'n_plus_one': [
+                {'shape': shape, 'origin': origin, 'count': len(queries),
+                 'total_ms': round(sum(q.duration_ms for q in queries), 3)}
+                for shape, origin, queries in self.n_plus_one()
+            ],
+            'queries': [query.to_dict() for query in self.queries],
+        }
+
+    def as_json(self):
+        return json.dumps(self.to_dict(), indent=2, default=str)
+
+    def as_text(self, slowest=10):
+        lines = [
+            f"SQL profile{f' for {self.label}' if self.label else ''}: {len(self.queries)} queries, "
+            f"{self.total_ms:.1f} ms in SQL, {self.elapsed_ms:.1f} ms elapsed",
+        ]
+        suspects = self.n_plus_one()
+        if suspects:
+            lines.append("")
+            lines.append(f"Possible N+1 ({self.n_plus_one_threshold}+ runs of the same shape from one line):")
+            for shape, origin, queries in suspects:
+                lines.append(f"  {len(queries)}x {origin or '<unknown>'}")
+                lines.append(f"      {shape[:200]}")
+        if self.queries:
+            lines.append("")
+            lines.append(f"Slowest {min(slowest, len(self.queries))}:")
+            for query in sorted(self.queries, key=lambda q: -q.duration_ms)[:slowest]:
+                rows = '?' if query.rowcount is None else query.rowcount
+                lines.append(f"  {query.duration_ms:8.2f} ms  rows={rows}  {query.origin or '<unknown>'}")
+                lines.append(f"      {query.shape[:200]}")
+                for row in query.explain or ():
+                    lines.append(f"      EXPLAIN {row}")
+        return "\n".join(lines)
+
+    def write(self, path):
+        """Writes the report as JSON if `path` ends in .json, as text otherwise."""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.as_json() if str(path).endswith('.json') else self.as_text() + "\n")
@@ -0,0 +1,156 @@
+"""Query-result cache for repeated catalog reads.
+
+`queryset.cached()` stores the evaluated rows in the 'queries' cache (see
+CACHES in settings.py: an LRU local-memory cache with a TTL). The key is the
+query's SQL and parameters plus a version number for every model the query
+reads: its own table, every joined table and every prefetched relation. The
+signal handlers in movies/signals.py bump a model's version whenever one of
+its rows is saved or deleted, so stale entries are never read again and just
+age out of the LRU.
+
+Versions live in the same cache. With the local-memory backend they are per
+process, so other processes only see a change after the TTL; point the
+'queries' alias at a shared backend (file, memcached, redis) to invalidate
+across processes.
+"""
+import hashlib
+import threading
+import time
+
+from django.apps import apps
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.db import models
+
+CACHE_ALIAS = 'queries'
+VERSION_KEY = 'querycache:version:{}'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+_models_by_table = None
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _fresh_version():
+    # Not 1: a version evicted from the LRU must not come back as a number old entries used.
+    return time.time_ns()
+
+
+def bump_model_version(model):
+    """Invalidates every cached query that reads `model`."""
+    cache = _cache()
+    key = VERSION_KEY.format(model._meta.label_lower)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), None)
+
+
+def model_versions(labels):
+    cache = _cache()
+    keys = [VERSION_KEY.format(label) for label in sorted(labels)]
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def model_for_table(table):
+    global _models_by_table
+    if _models_by_table is None:
+        _models_by_table = {model._meta.db_table: model for model in apps.get_models(include_auto_created=True)}
+    return _models_by_table.get(table)
+
+
+def _prefetched_models(model, lookups):
+    """Models read by prefetch_related(); each relation's through table counts too."""
+    found = set()
+    for lookup in lookups:
+        current = model
+        path = lookup.prefetch_through if isinstance(lookup, models.Prefetch) else lookup
+        for name in path.split('__'):
+            try:
+                field = current._meta.get_field(name)
+            except FieldDoesNotExist:
+                break
+            current = field.related_model
+            if current is None:
+                break
+            found.add(current)
+            through = getattr(getattr(field, 'remote_field', None), 'through', None) or getattr(field, 'through', None)
+            if through is not None:
+                found.add(through)
+    return found
+
+
+def dependencies(queryset, depends_on=()):
+    """Every model whose changes can alter the result of `queryset`."""
+    found = {queryset.model, *depends_on}
+    for alias in queryset.query.alias_map.values():
+        model = model_for_table(alias.table_name)
+        if model is not None:
+            found.add(model)
+    found |= _prefetched_models(queryset.model, queryset._prefetch_related_lookups)
+    return found
+
+
+def stats():
+    """Hits, misses and hit rate of this process since start (or the last reset_stats())."""
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def _cached_call(queryset, kind, compute, timeout, depends_on):
+    try:
+        sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    except EmptyResultSet:
+        return compute()
+    labels = {model._meta.label_lower for model in dependencies(queryset, depends_on)}
+    key_source = repr((kind, queryset.db, sql, params, queryset._prefetch_related_lookups,
+                       sorted(labels), model_versions(labels)))
+    key = 'querycache:' + hashlib.sha1(key_source.encode()).hexdigest()
+
+    cache = _cache()
+    missing = object()
+    result = cache.get(key, missing)
+    if result is not missing:
+        _count('hits')
+        return result
+    _count('misses')
+    result = compute()
+    cache.set(key, result, timeout)
+    return result
+
+
+class CachingQuerySet(models.QuerySet):
+    def cached(self, timeout=DEFAULT_TIMEOUT, depends_on=()):
+        """Evaluates the queryset through the query cache and returns the rows as a list.
+
+        `depends_on` names extra models the caller reads from the results.
+        `timeout` overrides the cache's TTL.
+        """
+        # A fresh clone, so a miss never returns rows this queryset object already holds.
+        return _cached_call(self, 'rows', lambda: list(self.all()), timeout, depends_on)
+
+    def cached_aggregate(self, *args, timeout=DEFAULT_TIMEOUT, depends_on=(), **kwargs):
+        """aggregate() through the query cache."""
+        kind = ('aggregate', repr(args), repr(sorted(kwargs.items())))
+        return _cached_call(self, kind, lambda: self.aggregate(*args, **kwargs), timeout, depends_on)
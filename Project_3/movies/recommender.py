@@ -0,0 +1,273 @@
+"""Item-item recommendations: "people who liked this movie also liked ...".
+
+Training reads Rating once, streamed in chunks into typed arrays, and builds a
+sparse user x movie matrix. Scores are centred on each user's mean (adjusted
+cosine, so a harsh rater's 6 and a generous rater's 9 can mean the same thing)
+and every movie column is scaled to unit length. The similarity of two movies
+is then the dot product of their columns. It is computed for `block_size`
+movies at a time as one sparse matrix product, so memory follows the block,
+not movies squared. Pairs rated by fewer than `min_support` common users are
+dropped, and the rest are shrunk by n / (n + SHRINKAGE) so thin evidence
+counts less.
+
+The best `top_k` neighbours of each movie go into MovieSimilarity, so a lookup
+is one read of the (MovieID, Score) index. Movies with fewer than
+COLD_START_RATINGS ratings, or no rated neighbours, get content neighbours
+instead: shared genres (Jaccard) plus a bonus for the same director. A movie
+with no stored rows at all (added since the last run) is answered live from
+MovieGenre and Movie.directorid.
+
+`manage.py train_recommender --incremental` retrains only the movies whose
+ratings changed since the last finished run (MovieRatingStats.UpdatedAt), plus
+the movies that list them or that they now list as neighbours. Run it from cron
+as ratings arrive, and a full run now and then.
+"""
+from array import array
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import Movie, MovieGenre, MovieRatingStats, MovieSimilarity, Rating, SimilarityRun
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+DEFAULT_TOP_K = 20
+DEFAULT_BLOCK_SIZE = 500
+DEFAULT_MIN_SUPPORT = 3
+SHRINKAGE = 10.0
+COLD_START_RATINGS = 5
+DIRECTOR_WEIGHT = 0.5
+READ_CHUNK_SIZE = 10000
+# Similarity blocks are dense-ish (most movies share a genre or a rater), so they are capped by cells.
+MAX_BLOCK_CELLS = 20_000_000
+WRITE_BATCH_SIZE = 1000
+
+
+def _require_numpy():
+    if np is None:
+        raise ImproperlyConfigured("The recommender needs numpy and scipy (pip install numpy scipy).")
+
+
+def load_ratings(chunk_size=READ_CHUNK_SIZE):
+    """(user ids, movie ids, scores) as numpy arrays, read without building model instances."""
+    _require_numpy()
+    users, movies, scores = array('q'), array('q'), array('b')
+    rows = Rating.objects.values_list('userid', 'movieid', 'score').order_by().iterator(chunk_size=chunk_size)
+    for user_id, movie_id, score in rows:
+        users.append(user_id)
+        movies.append(movie_id)
+        scores.append(score)
+    return (np.frombuffer(users, dtype=np.int64) if users else np.empty(0, dtype=np.int64),
+            np.frombuffer(movies, dtype=np.int64) if movies else np.empty(0, dtype=np.int64),
+            np.frombuffer(scores, dtype=np.int8) if scores else np.empty(0, dtype=np.int8))
+
+
+def rating_matrices(users, movie_columns, scores, movie_count):
+    """CSR matrices (normalised, normalised by movie, rated, rated by movie).
+
+    `normalised` is the centred, column-normalised users x movies matrix and
+    `rated` its 0/1 pattern; the "by movie" ones are their transposes, kept so
+    a block of movie rows can be sliced without converting the whole matrix.
+    `movie_columns` holds each rating's column index, not its movie id.
+    """
+    _require_numpy()
+    user_rows, user_index = np.unique(users, return_inverse=True)
+    shape = (len(user_rows), movie_count)
+    counts = np.bincount(user_index, minlength=shape[0])
+    means = np.bincount(user_index, weights=scores, minlength=shape[0]) / np.maximum(counts, 1)
+    centred = sparse.csr_matrix((scores - means[user_index], (user_index, movie_columns)), shape=shape)
+    norms = np.sqrt(np.asarray(centred.multiply(centred).sum(axis=0)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalised = (centred @ sparse.diags(scale)).tocsr()
+    rated = sparse.csr_matrix((np.ones(len(scores)), (user_index, movie_columns)), shape=shape)
+    return normalised, normalised.T.tocsr(), rated, rated.T.tocsr()
+
+
+def top_neighbours(similarities, rows, top_k):
+    """{row: [(column, score)]} of the best positive scores in each row of a CSR block, itself excluded."""
+    neighbours = {}
+    for i, row in enumerate(rows):
+        start, end = similarities.indptr[i], similarities.indptr[i + 1]
+        columns, values = similarities.indices[start:end], similarities.data[start:end]
+        keep = (columns != row) & (values > 0)
+        columns, values = columns[keep], values[keep]
+        if len(values) > top_k:
+            best = np.argpartition(-values, top_k - 1)[:top_k]
+            columns, values = columns[best], values[best]
+        order = np.lexsort((columns, -values))
+        neighbours[row] = [(int(columns[j]), float(values[j])) for j in order]
+    return neighbours
+
+
+def rating_neighbours(matrices, rows, top_k=DEFAULT_TOP_K, min_support=DEFAULT_MIN_SUPPORT, shrinkage=SHRINKAGE):
+    """Shrunk adjusted-cosine neighbours of the movie columns in `rows`; `matrices` as rating_matrices() returns."""
+    normalised, by_movie, rated, rated_by_movie = matrices
+    rows = np.asarray(rows)
+    neighbours = {}
+    # Each row of the block can score every movie, so only a bounded number of rows is scored at a time.
+    step = max(1, MAX_BLOCK_CELLS // max(normalised.shape[1], 1))
+    for start in range(0, len(rows), step):
+        chunk = rows[start:start + step]
+        similarities = (by_movie[chunk] @ normalised).tocsr()
+        support = (rated_by_movie[chunk] @ rated).tocsr()
+        support.data = np.where(support.data >= min_support, support.data / (support.data + shrinkage), 0.0)
+        support.eliminate_zeros()
+        neighbours.update(top_neighbours(similarities.multiply(support).tocsr(), chunk, top_k))
+    return neighbours
+
+
+def content_matrices(movie_ids):
+    """(movies x genres, movies x directors) one-hot CSR matrices, rows in `movie_ids` order."""
+    _require_numpy()
+    column_of = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+
+    def one_hot(pairs):
+        rows, keys = array('q'), array('q')
+        for movie_id, key in pairs:
+            if movie_id in column_of and key is not None:
+                rows.append(column_of[movie_id])
+                keys.append(key)
+        rows, keys = np.array(rows, dtype=np.int64), np.array(keys, dtype=np.int64)
+        key_ids, key_index = np.unique(keys, return_inverse=True)
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, key_index)), shape=(len(movie_ids), len(key_ids)))
+
+    genres = one_hot(MovieGenre.objects.values_list('movieid', 'genreid').order_by().iterator(READ_CHUNK_SIZE))
+    directors = one_hot(Movie.objects.values_list('movieid', 'directorid').order_by().iterator(READ_CHUNK_SIZE))
+    return genres, directors
+
+
+def content_neighbours(genres, directors, rows, top_k=DEFAULT_TOP_K):
+    """Genre-Jaccard plus same-director neighbours of the movie rows in `rows`."""
+    rows = np.asarray(rows)
+    shared = (genres[rows] @ genres.T).tocoo()
+    sizes = np.asarray(genres.sum(axis=1)).ravel()
+    jaccard = shared.data / (sizes[rows[shared.row]] + sizes[shared.col] - shared.data)
+    scores = sparse.csr_matrix((jaccard, (shared.row, shared.col)), shape=shared.shape)
+    scores = scores + DIRECTOR_WEIGHT * (directors[rows] @ directors.T)
+    return top_neighbours(scores.tocsr(), rows, top_k)
+
+
+def content_similar_movies(movie_id, limit=DEFAULT_TOP_K):
+    """[(Movie, score)] from genres and director, straight from the catalog tables."""
+    genre_ids = list(MovieGenre.objects.filter(movieid=movie_id).values_list('genreid', flat=True))
+    director_id = Movie.objects.filter(movieid=movie_id).values_list('directorid', flat=True).first()
+    # Not directorid=None: movies without a director have nothing in common.
+    same_director = Q(directorid=director_id) if director_id is not None else Q(pk__in=[])
+    movies = (Movie.objects.filter(Q(moviegenre__genreid__in=genre_ids) | same_director).exclude(movieid=movie_id)
+              .annotate(shared_genres=Count('moviegenre__genreid', distinct=True,
+                                            filter=Q(moviegenre__genreid__in=genre_ids)),
+                        same_director=Case(When(same_director, then=Value(1)), default=Value(0),
+                                           output_field=IntegerField()))
+              .annotate(similarity=ExpressionWrapper(
+                  F('shared_genres') * Value(1.0 / max(len(genre_ids), 1)) + F('same_director') * Value(DIRECTOR_WEIGHT),
+                  output_field=FloatField()))
+              .order_by('-similarity', 'movieid')[:limit])
+    return [(movie, movie.similarity) for movie in movies]
+
+
+def similar_movies(movie_id, limit=DEFAULT_TOP_K):
+    """[(Movie, score)] best first: the stored neighbours, or content ones if none are stored."""
+    rows = (MovieSimilarity.objects.filter(movieid=movie_id).select_related('similarmovieid')
+            .order_by('-score')[:limit])
+    found = [(row.similarmovieid, row.score) for row in rows]
+    return found or content_similar_movies(movie_id, limit)
+
+
+def _store(movie_ids, neighbours, source):
+    """Replaces the stored neighbours of the movies (column indexes) in `neighbours`."""
+    with transaction.atomic():
+        MovieSimilarity.objects.filter(movieid__in=[int(movie_ids[row]) for row in neighbours]).delete()
+        MovieSimilarity.objects.bulk_create([
+            MovieSimilarity(movieid_id=int(movie_ids[row]), similarmovieid_id=int(movie_ids[column]),
+                            score=score, source=source)
+            for row, columns in neighbours.items()
+            for column, score in columns
+        ], batch_size=WRITE_BATCH_SIZE)
+
+
+class Trainer:
+    """One training run; `train()` is the entry point."""
+
+    def __init__(self, top_k=DEFAULT_TOP_K, block_size=DEFAULT_BLOCK_SIZE, min_support=DEFAULT_MIN_SUPPORT):
+        _require_numpy()
+        self.top_k = top_k
+        self.block_size = block_size
+        self.min_support = min_support
+        # Taken before reading, so ratings written during the run are retrained by the next one.
+        self.started = timezone.now()
+        self.movie_ids = np.array(sorted(Movie.objects.values_list('movieid', flat=True)), dtype=np.int64)
+        users, movies, scores = load_ratings()
+        self.rating_count = len(scores)
+        # Ratings of movies added or deleted mid-read fall outside the catalog snapshot; drop them.
+        known = np.isin(movies, self.movie_ids)
+        self.matrices = rating_matrices(users[known], np.searchsorted(self.movie_ids, movies[known]),
+                                        scores[known], len(self.movie_ids))
+        self.ratings_per_movie = np.diff(self.matrices[3].indptr)
+        self._content = None
+
+    def columns_of(self, movie_ids):
+        movie_ids = np.asarray(list(movie_ids), dtype=np.int64)
+        return np.unique(np.searchsorted(self.movie_ids, movie_ids[np.isin(movie_ids, self.movie_ids)]))
+
+    def train_rows(self, rows):
+        """Computes and stores the neighbours of the given columns; returns their rating neighbours."""
+        found = {}
+        for start in range(0, len(rows), self.block_size):
+            block = np.asarray(rows[start:start + self.block_size])
+            warm = block[self.ratings_per_movie[block] >= COLD_START_RATINGS]
+            by_ratings = rating_neighbours(self.matrices, warm, self.top_k, self.min_support) if len(warm) else {}
+            by_ratings = {row: columns for row, columns in by_ratings.items() if columns}
+            cold = [row for row in block if row not in by_ratings]
+            by_content = {}
+            step = max(1, MAX_BLOCK_CELLS // max(len(self.movie_ids), 1))
+            for i in range(0, len(cold), step):
+                by_content.update(content_neighbours(*self.content, cold[i:i + step], self.top_k))
+            with transaction.atomic():
+                _store(self.movie_ids, by_ratings, 'ratings')
+                _store(self.movie_ids, by_content, 'content')
+            found.update(by_ratings)
+        return found
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = content_matrices(self.movie_ids)
+        return self._content
+
+    def train(self, incremental=False):
+        """Runs a full or incremental training and returns its SimilarityRun."""
+        last = SimilarityRun.objects.filter(finishedat__isnull=False).order_by('-startedat').first()
+        mode = 'incremental' if incremental and last is not None else 'full'
+        run = SimilarityRun.objects.create(mode=mode, startedat=self.started, ratings=self.rating_count)
+
+        if mode == 'full':
+            rows = np.arange(len(self.movie_ids))
+            self.train_rows(rows)
+            trained = len(rows)
+        else:
+            changed = list(MovieRatingStats.objects.filter(updatedat__gte=last.startedat)
+                           .values_list('movieid', flat=True))
+            listing = MovieSimilarity.objects.filter(similarmovieid__in=changed).values_list('movieid', flat=True)
+            rows = self.columns_of(set(changed) | set(listing))
+            found = self.train_rows(rows) if len(rows) else {}
+            # Movies that now have a changed movie among their neighbours need new lists too.
+            new_neighbours = {column for row in self.columns_of(changed) for column, _ in found.get(row, ())}
+            extra = np.array(sorted(new_neighbours - set(rows.tolist())), dtype=np.int64)
+            if len(extra):
+                self.train_rows(extra)
+            trained = len(rows) + len(extra)
+
+        run.movies = trained
+        run.finishedat = timezone.now()
+        run.save(update_fields=['movies', 'finishedat'])
+        return run
+
+
+def train(incremental=False, **options):
+    return Trainer(**options).train(incremental=incremental)
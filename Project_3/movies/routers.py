@@ -0,0 +1,151 @@
+"""Read-replica routing for the movies app.
+
+ORM reads of movies models go to the aliases in settings.DATABASE_REPLICAS,
+round robin, skipping any replica that failed its last health check. Writes,
+and every read inside a transaction, go to 'default'. The other apps (auth,
+sessions, admin) are left alone.
+
+Read-your-writes: a write pins this context's reads to 'default' for
+REPLICA_STICKY_SECONDS, covering replication lag. ReplicaPinningMiddleware
+carries the pin over to the client's next requests with a short-lived cookie,
+so a user who just rated a movie sees the rating on the next page.
+
+A replica is pinged at most every REPLICA_HEALTH_CHECK_SECONDS per process.
+While none is healthy, reads fall back to 'default'.
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+REPLICA_APPS = {'movies'}
+PIN_COOKIE = 'db_pinned'
+DEFAULT_STICKY_SECONDS = 5
+DEFAULT_HEALTH_CHECK_SECONDS = 10
+
+
+class _Pin:
+    __slots__ = ('until', 'wrote')
+
+    def __init__(self, until=0.0):
+        self.until = until
+        self.wrote = False
+
+
+# Per request (and per thread or task outside requests); a mutable object so that
+# sync_to_async code and the middleware see the same pin.
+_pin = ContextVar('replica_pin', default=None)
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+
+
+def pin_to_primary(seconds=None):
+    """Sends this context's reads to 'default' for the next `seconds` (REPLICA_STICKY_SECONDS by default)."""
+    pin = _pin.get()
+    if pin is None:
+        pin = _Pin()
+        _pin.set(pin)
+    pin.until = max(pin.until, time.monotonic() + (sticky_seconds() if seconds is None else seconds))
+    pin.wrote = True
+
+
+@contextmanager
+def request_pin(pinned):
+    """A fresh pin for one request, pinned from the start if `pinned`; yields it so the caller can see `wrote`."""
+    pin = _Pin(time.monotonic() + sticky_seconds() if pinned else 0.0)
+    token = _pin.set(pin)
+    try:
+        yield pin
+    finally:
+        _pin.reset(token)
+
+
+def is_pinned():
+    pin = _pin.get()
+    return pin is not None and pin.until > time.monotonic()
+
+
+def ping(alias):
+    """True if a connection to `alias` can be opened and used."""
+    try:
+        connection = connections[alias]
+        connection.ensure_connection()
+        return connection.is_usable()
+    except DatabaseError:
+        return False
+
+
+class ReplicaPool:
+    def __init__(self):
+        self._turn = itertools.count()
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def healthy(self, alias):
+        interval = getattr(settings, 'REPLICA_HEALTH_CHECK_SECONDS', DEFAULT_HEALTH_CHECK_SECONDS)
+        now = time.monotonic()
+        with self._lock:
+            checked = self._health.get(alias)
+        if checked is not None and now - checked[1] < interval:
+            return checked[0]
+        healthy = ping(alias)
+        with self._lock:
+            self._health[alias] = (healthy, now)
+        return healthy
+
+    def choose(self, replicas):
+        """The next healthy replica in turn, or None if none is."""
+        start = next(self._turn)
+        for i in range(len(replicas)):
+            alias = replicas[(start + i) % len(replicas)]
+            if self.healthy(alias):
+                return alias
+        return None
+
+    def reset(self):
+        with self._lock:
+            self._health.clear()
+
+
+pool = ReplicaPool()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', ())
+        if not replicas or model._meta.app_label not in REPLICA_APPS:
+            return None
+        # Rows fetched through an instance come from where the instance did.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return pool.choose(list(replicas)) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in REPLICA_APPS:
+            return None
+        if getattr(settings, 'DATABASE_REPLICAS', ()):
+            pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as 'default'.
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, 'DATABASE_REPLICAS', ())}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema through replication.
+        if db in getattr(settings, 'DATABASE_REPLICAS', ()):
+            return False
+        return None
+
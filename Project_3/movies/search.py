@@ -0,0 +1,121 @@
+"""Inverted index over movie titles, summaries, director and cast names.
+
+SearchTerm holds one row per (term, movie) with a weight that grows with how
+often the term occurs and in which field (a title hit counts more than a
+summary hit). A query touches only the index rows of its own terms, through the
+(Term, MovieID) key, so its cost follows the number of matching movies rather
+than the size of the catalog. Matches are ranked by the sum of weight * idf over
+the query terms, so rare terms count more than common ones.
+
+The signal handlers in movies/signals.py reindex a movie after it, its cast or
+its director change. The importer writes with plain SQL; its movie change
+events reach the index through `manage.py relay_outbox` (movies/outbox.py), and
+`manage.py rebuild_search_index` rebuilds it from scratch.
+"""
+import math
+import re
+from collections import Counter
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+
+from .models import Movie, SearchTerm
+
+FIELD_WEIGHTS = {'title': 3.0, 'director': 2.0, 'actor': 1.5, 'summary': 1.0}
+MAX_TERM_LENGTH = 64
+MIN_PREFIX_LENGTH = 2
+# A short prefix such as "th" can expand to thousands of terms; keep the most common ones.
+MAX_PREFIX_EXPANSIONS = 50
+# idf only needs the catalog size roughly, so don't count the movie table on every query.
+CATALOG_SIZE_CACHE_SECONDS = 300
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has he in is it its of on or that the to was were will with'.split()
+)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Lower-cased word tokens of `text`, without stop words."""
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in _TOKEN_RE.findall((text or '').lower())
+        if token not in STOP_WORDS
+    ]
+
+
+def document_terms(movie):
+    """{term: weight} for one movie, from its title, summary, director and cast."""
+    fields = [('title', movie.title), ('summary', movie.summary)]
+    if movie.directorid is not None:
+        fields.append(('director', movie.directorid.fullname))
+    fields.extend(('actor', actor.fullname) for actor in movie.actors.all())
+
+    weights = Counter()
+    for field, text in fields:
+        for term, count in Counter(tokenize(text)).items():
+            weights[term] += FIELD_WEIGHTS[field] * (1 + math.log(count))
+    return weights
+
+
+def index_movies(movie_ids):
+    """Replaces the index rows of these movies; ids of deleted movies just lose their rows."""
+    movie_ids = list(movie_ids)
+    movies = Movie.objects.filter(movieid__in=movie_ids).select_related('directorid').prefetch_related('actors')
+    with transaction.atomic():
+        SearchTerm.objects.filter(movieid__in=movie_ids).delete()
+        SearchTerm.objects.bulk_create([
+            SearchTerm(term=term, movieid=movie, weight=weight)
+            for movie in movies
+            for term, weight in document_terms(movie).items()
+        ])
+
+
+def schedule_reindex(movie_ids):
+    # After commit, so the index sees the final cast and never points at a deleted movie.
+    transaction.on_commit(partial(index_movies, list(movie_ids)))
+
+
+def movies_of_person(person_id):
+    return Movie.objects.filter(Q(directorid=person_id) | Q(movieactor__personid=person_id)).values_list(
+        'movieid', flat=True).distinct()
+
+
+def rebuild_search_index(chunk_size=1000):
+    """Reindexes the whole catalog, chunk_size movies at a time; returns the number of movies."""
+    SearchTerm.objects.all().delete()
+    movie_ids = list(Movie.objects.order_by('movieid').values_list('movieid', flat=True))
+    for start in range(0, len(movie_ids), chunk_size):
+        index_movies(movie_ids[start:start + chunk_size])
+    return len(movie_ids)
+
+
+def search_movies(queryset, query, prefix=False):
+    """`queryset` narrowed to movies matching `query`, annotated with `rank` and best first.
+
+    With `prefix`, the last word also matches longer terms that start with it,
+    which is what a search-as-you-type box needs.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return queryset.none()
+
+    document_frequencies = SearchTerm.objects.values_list('term').annotate(df=Count('movieid'))
+    frequencies = dict(document_frequencies.filter(term__in=terms))
+    if prefix and len(terms[-1]) >= MIN_PREFIX_LENGTH:
+        frequencies.update(
+            document_frequencies.filter(term__startswith=terms[-1]).order_by('-df')[:MAX_PREFIX_EXPANSIONS])
+    if not frequencies:
+        return queryset.none()
+
+    total = max(cache.get_or_set('movies:search:catalog-size', Movie.objects.count, CATALOG_SIZE_CACHE_SECONDS), 1)
+    rank = Sum(Case(
+        *[When(searchterm__term=term, then=F('searchterm__weight') * Value(math.log(1 + total / df)))
+          for term, df in frequencies.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    ))
+    return (queryset.filter(searchterm__term__in=list(frequencies))
+            .annotate(rank=rank).order_by('-rank', '-movieid'))
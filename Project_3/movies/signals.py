@@ -1,15 +1,267 @@
-from django.db.models.signals import post_save, pre_delete # pre_delete را اضافه کنید
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import Movie
+from . import outbox
+from .models import Genre, Movie, MovieActor, MovieGenre, Person, Rating, User
+from .analytics import schedule_refresh as schedule_snapshot_refresh
+from .graph import schedule_refresh as schedule_graph_refresh
+from .querycache import bump_model_version
+from .search import movies_of_person, schedule_reindex
+from .stats import (
+    apply_director_delta, apply_genre_delta, apply_rating_delta, contribution, difference, forget_movie, negate,
+    schedule_leaderboard_refresh,
+)
+
+
+# --- Change events (movies/outbox.py) ---
+# Connected first, so the handlers below can skip saves that changed nothing.
+
+def remember_row(sender, instance, raw=False, using=None, **kwargs):
+    instance._outbox_old = None
+    if instance.pk is not None and not raw:
+        instance._outbox_old = sender.objects.using(using).filter(pk=instance.pk).values(
+            *(field.name for field in outbox.tracked_fields(sender))).first()
+
+def record_save_event(sender, instance, raw=False, using=None, **kwargs):
+    instance._outbox_changes = None if raw else outbox.record_save(instance, instance._outbox_old, using)
+
+def record_delete_event(sender, instance, using=None, **kwargs):
+    outbox.record_delete(instance, using)
+
+for model in outbox.TRACKED_MODELS:
+    pre_save.connect(remember_row, sender=model, dispatch_uid=f'outbox-pre-save-{model.__name__}')
+    post_save.connect(record_save_event, sender=model, dispatch_uid=f'outbox-save-{model.__name__}')
+    post_delete.connect(record_delete_event, sender=model, dispatch_uid=f'outbox-delete-{model.__name__}')
+
+
+# --- Summary-table maintenance (GenreStats / DirectorStats) ---
+
+@receiver(pre_save, sender=Movie)
+def remember_movie_stats_fields(sender, instance, **kwargs):
+    # The row as it is in the database now (read by remember_row), so post_save can compute the delta.
+    instance._stats_old = instance._outbox_old
 
 @receiver(post_save, sender=Movie)
-def movie_saved_handler(sender, instance, created, **kwargs):
-    if created:
-        print(f"\n>>> SIGNAL DETECTED: A new movie was created: '{instance.title}'")
+def update_stats_on_movie_save(sender, instance, created, raw=False, **kwargs):
+    if raw or not outbox.changed(instance, 'tmdbscore', 'directorid'):
+        return
+    old = getattr(instance, '_stats_old', None)
+    new_contribution = contribution(instance.tmdbscore)
+    if old is None:
+        apply_director_delta(instance.directorid_id, new_contribution)
+        return
+
+    old_contribution = contribution(old['tmdbscore'])
+    if old['directorid'] == instance.directorid_id:
+        apply_director_delta(instance.directorid_id, difference(new_contribution, old_contribution))
+    else:
+        apply_director_delta(old['directorid'], negate(old_contribution))
+        apply_director_delta(instance.directorid_id, new_contribution)
+
+    score_delta = difference(new_contribution, old_contribution)
+    if any(score_delta):
+        for genre_id in MovieGenre.objects.filter(movieid=instance.pk).values_list('genreid', flat=True):
+            apply_genre_delta(genre_id, score_delta)
 
 @receiver(pre_delete, sender=Movie)
-def movie_about_to_be_deleted_handler(sender, instance, **kwargs):
+def update_stats_on_movie_delete(sender, instance, **kwargs):
+    removed = negate(contribution(instance.tmdbscore))
+    apply_director_delta(instance.directorid_id, removed)
+    # The cascade deletes the movie's MovieGenre rows without signals (see below).
+    for genre_id in MovieGenre.objects.filter(movieid=instance.pk).values_list('genreid', flat=True):
+        apply_genre_delta(genre_id, removed)
+    # Its ratings, counters and board entries go with it, also without signals.
+    forget_movie(instance.pk)
+
+@receiver(pre_save, sender=MovieGenre)
+def remember_movie_genre(sender, instance, raw=False, **kwargs):
+    instance._stats_link_existed = raw or MovieGenre.objects.filter(
+        movieid=instance.movieid_id, genreid=instance.genreid_id).exists()
+
+@receiver(post_save, sender=MovieGenre)
+def update_stats_on_movie_genre_save(sender, instance, **kwargs):
+    if not getattr(instance, '_stats_link_existed', True):
+        apply_genre_delta(instance.genreid_id, contribution(instance.movieid.tmdbscore))
+        schedule_leaderboard_refresh(instance.movieid_id)
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def update_stats_on_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """movie.genres (or genre.movie_set) add(), remove() and clear().
+
+    add() bulk-creates the links without post_save. MovieGenre has no delete
+    receivers, so remove(), clear() and the cascades from Movie and Genre
+    stay one DELETE filtered on the link's columns; a receiver would make
+    Django fetch the rows and delete them one primary key at a time. Links
+    deleted through MovieGenre.objects directly are a bulk operation: run
+    rebuild_stats after them.
     """
-    This function will be called automatically right before a Movie object is deleted.
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    links = MovieGenre.objects.filter(**{'genreid' if reverse else 'movieid': instance.pk})
+    if action != 'pre_clear':
+        if not pk_set:
+            return
+        links = links.filter(**{'movieid__in' if reverse else 'genreid__in': pk_set})
+    for genre_id, movie_id, tmdbscore in links.values_list('genreid', 'movieid', 'movieid__tmdbscore'):
+        delta = contribution(tmdbscore)
+        apply_genre_delta(genre_id, delta if action == 'post_add' else negate(delta))
+        schedule_leaderboard_refresh(movie_id)
+
+@receiver(pre_save, sender=Rating)
+def remember_rating(sender, instance, raw=False, **kwargs):
+    # The table's real key is (UserID, MovieID), so look the old row up by both.
+    instance._stats_old_score = None
+    if not raw:
+        instance._stats_old_score = Rating.objects.filter(
+            userid=instance.userid_id, movieid=instance.movieid_id).values_list('score', flat=True).first()
+
+@receiver(post_save, sender=Rating)
+def update_stats_on_rating_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_score = getattr(instance, '_stats_old_score', None)
+    if old_score is None:
+        apply_rating_delta(instance.movieid_id, 1, instance.score)
+    else:
+        apply_rating_delta(instance.movieid_id, 0, instance.score - old_score)
+
+# Rating has no delete receivers, for the same reason as MovieGenre: Rating.delete() updates the counters
+# itself, a Movie's counters are deleted with it, and a User's ratings are subtracted here.
+@receiver(pre_delete, sender=User)
+def update_stats_on_user_delete(sender, instance, **kwargs):
+    for movie_id, score in Rating.objects.filter(userid=instance.pk).values_list('movieid', 'score'):
+        apply_rating_delta(movie_id, -1, -score)
+
+
+# --- Search index maintenance (SearchTerm) ---
+
+@receiver(post_save, sender=Movie)
+def reindex_saved_movie(sender, instance, raw=False, **kwargs):
+    if not raw and outbox.changed(instance, *outbox.SEARCH_FIELDS):
+        schedule_reindex([instance.pk])
+
+@receiver(post_save, sender=MovieActor)
+def reindex_movie_cast(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_reindex([instance.movieid_id])
+
+def linked_movie_ids(sender, instance, action, reverse, pk_set):
+    """The movies whose genres or cast a movie.genres / movie.actors change (or the reverse) alters.
+
+    The link tables have no delete receivers (see update_stats_on_genres_changed),
+    so removals are seen here, in pre_remove and pre_clear, and in the parent
+    models' pre_delete receivers instead.
     """
-    print(f"\n>>> SIGNAL DETECTED (pre_delete): About to delete the movie: '{instance.title}'")
\ No newline at end of file
+    if not reverse:
+        return [instance.pk]
+    if action == 'pre_clear':
+        other = 'genreid' if sender is MovieGenre else 'personid'
+        return list(sender.objects.filter(**{other: instance.pk}).values_list('movieid', flat=True))
+    return list(pk_set or ())
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+def reindex_on_cast_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'pre_remove', 'pre_clear'):
+        schedule_reindex(linked_movie_ids(sender, instance, action, reverse, pk_set))
+
+@receiver(post_save, sender=Person)
+def reindex_person_movies(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw and outbox.changed(instance, 'fullname'):
+        schedule_reindex(movies_of_person(instance.pk))
+
+@receiver(pre_delete, sender=Person)
+def reindex_deleted_person_movies(sender, instance, **kwargs):
+    # Before the cascade: afterwards nothing links the movies to the person.
+    schedule_reindex(movies_of_person(instance.pk))
+
+
+# --- Co-star graph maintenance (movies/graph.py) ---
+
+@receiver(post_save, sender=MovieActor)
+def refresh_graph_for_cast(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_graph_refresh(instance.movieid_id)
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+def refresh_graph_on_cast_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'pre_remove', 'pre_clear'):
+        for movie_id in linked_movie_ids(sender, instance, action, reverse, pk_set):
+            schedule_graph_refresh(movie_id)
+
+@receiver(pre_delete, sender=Person)
+def refresh_graph_for_deleted_person(sender, instance, **kwargs):
+    # Their credits go with the cascade and the SET_NULL of DirectorID, neither of which sends signals.
+    for movie_id in list(movies_of_person(instance.pk)):
+        schedule_graph_refresh(movie_id)
+
+@receiver(post_save, sender=Movie)
+def refresh_graph_for_director(sender, instance, created, raw=False, **kwargs):
+    old = getattr(instance, '_stats_old', None)
+    if not raw and (old is None or old['directorid'] != instance.directorid_id):
+        schedule_graph_refresh(instance.pk)
+
+@receiver(post_delete, sender=Movie)
+def refresh_graph_for_deleted_movie(sender, instance, **kwargs):
+    schedule_graph_refresh(instance.pk)
+
+
+# --- Analytics snapshot maintenance (movies/analytics.py) ---
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def refresh_snapshot_for_movie(sender, instance, signal, raw=False, **kwargs):
+    if not raw and (signal is post_delete or outbox.changed(instance)):
+        schedule_snapshot_refresh(instance.pk)
+
+@receiver(post_save, sender=MovieGenre)
+@receiver(post_save, sender=MovieActor)
+def refresh_snapshot_for_link(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_snapshot_refresh(instance.movieid_id)
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+@receiver(m2m_changed, sender=Movie.actors.through)
+def refresh_snapshot_on_links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'pre_remove', 'pre_clear'):
+        for movie_id in linked_movie_ids(sender, instance, action, reverse, pk_set):
+            schedule_snapshot_refresh(movie_id)
+
+@receiver(pre_delete, sender=Person)
+@receiver(pre_delete, sender=Genre)
+def refresh_snapshot_for_deleted_links(sender, instance, **kwargs):
+    # Their links go with the cascade, without signals.
+    movie_ids = (movies_of_person(instance.pk) if sender is Person
+                 else MovieGenre.objects.filter(genreid=instance.pk).values_list('movieid', flat=True))
+    for movie_id in list(movie_ids):
+        schedule_snapshot_refresh(movie_id)
+
+
+# --- Query cache invalidation (movies/querycache.py) ---
+
+CACHED_MODELS = (Movie, Person, Genre, User, MovieGenre, MovieActor, Rating)
+# Rows a delete takes with it without signals: the link tables have no delete receivers (see
+# update_stats_on_genres_changed), and deleting a director sets Movie.DirectorID to NULL with one UPDATE.
+CASCADED_MODELS = {
+    Movie: (MovieGenre, MovieActor, Rating),
+    Person: (Movie, MovieActor),
+    Genre: (MovieGenre,),
+    User: (Rating,),
+}
+
+def bump_version_on_change(sender, instance, signal, **kwargs):
+    if signal is post_delete or outbox.changed(instance):
+        bump_model_version(sender)
+    if signal is post_delete:
+        for model in CASCADED_MODELS[sender]:
+            bump_model_version(model)
+
+for model in CACHED_MODELS:
+    post_save.connect(bump_version_on_change, sender=model, dispatch_uid=f'querycache-save-{model.__name__}')
+for model in CASCADED_MODELS:
+    post_delete.connect(bump_version_on_change, sender=model, dispatch_uid=f'querycache-delete-{model.__name__}')
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+@receiver(m2m_changed, sender=Movie.actors.through)
+def bump_version_on_links_changed(sender, action, **kwargs):
+    # add() bulk-inserts the link rows without post_save.
+    if action.startswith('post_'):
+        bump_model_version(sender)
@@ -0,0 +1,306 @@
+"""Delta maintenance for the summary tables.
+
+Every movie contributes (1 movie, 1 scored movie if it has a TMDbScore, its
+score) to its director's row and to the row of each of its genres. Every rating
+contributes (1 rating, its score) to its movie's MovieRatingStats row. The
+signal handlers in movies/signals.py apply the difference whenever a Movie, a
+movie-genre link or a Rating changes, so reads never need to scan Movie,
+Movie_Genre or Rating.
+
+The top-rated leaderboards rank movies by a Bayesian-weighted rating,
+(ratingsum + m * C) / (ratingcount + m), where C is the mean of all ratings
+and m is LEADERBOARD_MIN_RATINGS: movies with few ratings are pulled towards
+the overall mean. C comes from running totals kept on the overall board's
+row. After a rating changes, the boards the movie is on or belongs to are
+updated in place: the movie moves to its new place among the board's entries,
+or replaces the last one if it now beats it. A board is only recomputed from
+MovieRatingStats when C has drifted by more than PRIOR_DRIFT since its last
+recompute, or when a movie drops off a full board and the next one has to be
+found.
+
+Bulk queryset operations skip signals; run `manage.py rebuild_stats` after them.
+Rating's queryset is the exception: its delete() and update() adjust the
+rating counters themselves.
+"""
+from decimal import Decimal
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, Q, Sum, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import (
+    DirectorStats, GenreStats, Leaderboard, LeaderboardEntry, Movie, MovieGenre, MovieRatingStats, Rating,
+)
+from .querycache import bump_model_version
+
+SUMMARY_FIELDS = ('moviecount', 'scoredcount', 'scoresum')
+LEADERBOARD_SIZE = 100
+LEADERBOARD_MIN_RATINGS = 25
+# A board is recomputed from MovieRatingStats once the mean rating has moved this far since it last was.
+PRIOR_DRIFT = 0.01
+
+AVERAGE_RATING = Case(
+    When(ratingcount__gt=0, then=Cast(F('ratingsum'), FloatField()) / F('ratingcount')),
+    default=None,
+    output_field=DecimalField(max_digits=4, decimal_places=2),
+)
+
+
+def contribution(tmdbscore):
+    """(moviecount, scoredcount, scoresum) that one movie with this score adds."""
+    if tmdbscore is None:
+        return (1, 0, Decimal(0))
+    return (1, 1, Decimal(str(tmdbscore)))
+
+
+def negate(delta):
+    return tuple(-value for value in delta)
+
+
+def difference(new, old):
+    return tuple(a - b for a, b in zip(new, old))
+
+
+def _apply(model, key, **deltas):
+    """Adds `deltas` to the counters of row `key`, creating it if needed; False if nothing changed."""
+    if key is None or not any(deltas.values()):
+        return False
+    pk_name = model._meta.pk.attname
+    # Queryset updates send no signals, so tell the query cache here.
+    bump_model_version(model)
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**{pk_name: key}).update(**changes):
+        return True
+    try:
+        with transaction.atomic():
+            model.objects.create(**{pk_name: key}, **deltas)
+    except IntegrityError:
+        # Someone created the row between our UPDATE and INSERT.
+        model.objects.filter(**{pk_name: key}).update(**changes)
+    return True
+
+
+def apply_director_delta(director_id, delta):
+    _apply(DirectorStats, director_id, **dict(zip(SUMMARY_FIELDS, delta)))
+
+
+def apply_genre_delta(genre_id, delta):
+    _apply(GenreStats, genre_id, **dict(zip(SUMMARY_FIELDS, delta)))
+
+
+def apply_rating_delta(movie_id, count, total):
+    """Adds `count` ratings summing to `total` to the movie's counters and the overall totals."""
+    if not _apply(MovieRatingStats, movie_id, ratingcount=count, ratingsum=total):
+        return
+    MovieRatingStats.objects.filter(movieid=movie_id).update(ratingavg=AVERAGE_RATING, updatedat=timezone.now())
+    # One hot row, but a single-row UPDATE in the rating's own transaction keeps the totals exact.
+    if not Leaderboard.objects.filter(genreid=None).update(
+            ratingcount=F('ratingcount') + count, ratingsum=F('ratingsum') + total):
+        overall_board()
+    schedule_leaderboard_refresh(movie_id)
+
+
+def schedule_leaderboard_refresh(movie_id):
+    # After commit, so the refresh sees the final state of cascaded deletes.
+    transaction.on_commit(partial(refresh_leaderboards_for, movie_id))
+
+
+def weighted_rating(ratingcount, ratingsum, prior_mean, min_ratings=LEADERBOARD_MIN_RATINGS):
+    return (ratingsum + min_ratings * prior_mean) / (ratingcount + min_ratings)
+
+
+def overall_board():
+    """The overall board, whose row also holds the rating totals.
+
+    Migration 0009 (and Project_2/schema.sql) creates it, so writers always
+    have a row to lock. It is only created here if that row was deleted.
+    """
+    board = Leaderboard.objects.filter(genreid=None).first()
+    if board is None:
+        totals = MovieRatingStats.objects.aggregate(count=Sum('ratingcount'), total=Sum('ratingsum'))
+        board = Leaderboard.objects.create(minratings=LEADERBOARD_MIN_RATINGS, ratingcount=totals['count'] or 0,
+                                           ratingsum=totals['total'] or 0)
+    return board
+
+
+def prior_mean():
+    """The mean of all ratings, from the overall board's totals."""
+    board = overall_board()
+    return board.ratingsum / board.ratingcount if board.ratingcount else 0.0
+
+
+def _locked_board(genre_id, create=True):
+    """The board of `genre_id`, locked until the transaction ends; None if it does not exist and not `create`."""
+    if create:
+        if genre_id is None:
+            overall_board()
+        else:
+            # GenreID is unique, so of two concurrent creators one gets the other's row.
+            Leaderboard.objects.get_or_create(genreid_id=genre_id, defaults={'minratings': LEADERBOARD_MIN_RATINGS})
+    return Leaderboard.objects.select_for_update().filter(genreid=genre_id).first()
+
+
+def _rank_key(weighted, ratingcount, movie_id):
+    # The board's order: weighted score, then more ratings, then the lower id.
+    return (-weighted, -ratingcount, movie_id)
+
+
+def _write_entries(board, entries):
+    board.cutoff = entries[-1].weightedscore if len(entries) == LEADERBOARD_SIZE else None
+    board.save()
+    board.entries.all().delete()
+    for rank, entry in enumerate(entries, start=1):
+        entry.pk, entry.leaderboardid, entry.rank = None, board, rank
+    LeaderboardEntry.objects.bulk_create(entries)
+    bump_model_version(Leaderboard)
+    bump_model_version(LeaderboardEntry)
+
+
+def refresh_leaderboard(genre_id=None):
+    """Recomputes the overall board (genre_id None) or one genre's board from MovieRatingStats."""
+    mean = prior_mean()
+    candidates = MovieRatingStats.objects.filter(ratingcount__gt=0)
+    if genre_id is not None:
+        candidates = candidates.filter(movieid__moviegenre__genreid=genre_id)
+    candidates = candidates.annotate(weighted=(
+        (Cast(F('ratingsum'), FloatField()) + LEADERBOARD_MIN_RATINGS * mean)
+        / (F('ratingcount') + LEADERBOARD_MIN_RATINGS)
+    )).order_by('-weighted', '-ratingcount', 'movieid')[:LEADERBOARD_SIZE]
+
+    with transaction.atomic():
+        board = _locked_board(genre_id)
+        board.priormean = mean
+        board.minratings = LEADERBOARD_MIN_RATINGS
+        _write_entries(board, [
+            LeaderboardEntry(movieid_id=row.movieid_id, weightedscore=row.weighted, ratingcount=row.ratingcount,
+                             ratingavg=row.ratingavg)
+            for row in candidates
+        ])
+    return board
+
+
+def _update_board(genre_id, movie_id, stats, mean):
+    """Moves the movie to its place on one board, given its counters (None if it no longer belongs there).
+
+    Works from the board's own entries; falls back to refresh_leaderboard()
+    when the mean has drifted or a movie that left a full board has to be
+    replaced by one that is not on it.
+    """
+    with transaction.atomic():
+        board = _locked_board(genre_id, create=stats is not None)
+        if board is None:
+            return
+        if not board.entries.exists() and stats is None:
+            return
+        if abs(board.priormean - mean) > PRIOR_DRIFT or board.minratings != LEADERBOARD_MIN_RATINGS:
+            refresh_leaderboard(genre_id)
+            return
+        before = list(board.entries.all())
+        entries = [entry for entry in before if entry.movieid_id != movie_id]
+        was_on = len(entries) < len(before)
+        if stats is not None:
+            weighted = weighted_rating(stats.ratingcount, stats.ratingsum, board.priormean, board.minratings)
+            key = _rank_key(weighted, stats.ratingcount, movie_id)
+            last = before[-1] if before else None
+            beats_last = last is None or key < _rank_key(last.weightedscore, last.ratingcount, last.movieid_id)
+            if len(before) == LEADERBOARD_SIZE and not beats_last:
+                if was_on:
+                    # It fell below the old cutoff; a movie that is not on the board may now beat it.
+                    refresh_leaderboard(genre_id)
+                return
+            entries.append(LeaderboardEntry(movieid_id=movie_id, weightedscore=weighted,
+                                            ratingcount=stats.ratingcount, ratingavg=stats.ratingavg))
+            entries.sort(key=lambda entry: _rank_key(entry.weightedscore, entry.ratingcount, entry.movieid_id))
+            entries = entries[:LEADERBOARD_SIZE]
+        elif not was_on:
+            return
+        elif len(before) == LEADERBOARD_SIZE:
+            refresh_leaderboard(genre_id)
+            return
+        _write_entries(board, entries)
+
+
+def refresh_leaderboards_for(movie_id):
+    """Updates the boards a change to this movie's ratings or genres can alter.
+
+    That is the overall board, its genres' boards and every board it is on.
+    Each costs a read of at most LEADERBOARD_SIZE entries, not a scan of
+    MovieRatingStats.
+    """
+    stats = MovieRatingStats.objects.filter(movieid=movie_id, ratingcount__gt=0).first()
+    genre_ids = set(MovieGenre.objects.filter(movieid=movie_id).values_list('genreid', flat=True))
+    on_boards = set(LeaderboardEntry.objects.filter(movieid=movie_id).values_list('leaderboardid__genreid', flat=True))
+    mean = prior_mean()
+    for genre_id in {None, *genre_ids, *on_boards}:
+        _update_board(genre_id, movie_id, stats if genre_id is None or genre_id in genre_ids else None, mean)
+
+
+def forget_movie(movie_id):
+    """Before a movie is deleted: takes its ratings out of the totals and refreshes the boards it is on after commit.
+
+    The delete cascades to its counters and board entries without signals.
+    """
+    stats = MovieRatingStats.objects.filter(movieid=movie_id).first()
+    if stats is not None and stats.ratingcount:
+        Leaderboard.objects.filter(genreid=None).update(ratingcount=F('ratingcount') - stats.ratingcount,
+                                                        ratingsum=F('ratingsum') - stats.ratingsum)
+    for genre_id in set(LeaderboardEntry.objects.filter(movieid=movie_id).values_list('leaderboardid__genreid',
+                                                                                        flat=True)):
+        transaction.on_commit(partial(refresh_leaderboard, genre_id))
+
+
+def rebuild_stats():
+    """Recomputes both summary tables from scratch; returns (genre rows, director rows)."""
+    with transaction.atomic():
+        GenreStats.objects.all().delete()
+        genre_rows = MovieGenre.objects.values('genreid').annotate(
+            moviecount=Count('movieid'),
+            scoredcount=Count('movieid__tmdbscore'),
+            scoresum=Sum('movieid__tmdbscore'),
+        )
+        GenreStats.objects.bulk_create([
+            GenreStats(genreid_id=row['genreid'], moviecount=row['moviecount'],
+                       scoredcount=row['scoredcount'], scoresum=row['scoresum'] or 0)
+            for row in genre_rows
+        ])
+
+        DirectorStats.objects.all().delete()
+        director_rows = Movie.objects.filter(directorid__isnull=False).values('directorid').annotate(
+            moviecount=Count('movieid'),
+            scoredcount=Count('tmdbscore'),
+            scoresum=Sum('tmdbscore'),
+        )
+        DirectorStats.objects.bulk_create([
+            DirectorStats(directorid_id=row['directorid'], moviecount=row['moviecount'],
+                          scoredcount=row['scoredcount'], scoresum=row['scoresum'] or 0)
+            for row in director_rows
+        ])
+    bump_model_version(GenreStats)
+    bump_model_version(DirectorStats)
+    return len(genre_rows), len(director_rows)
+
+
+def rebuild_rating_stats():
+    """Recomputes MovieRatingStats from Rating and every leaderboard; returns (movie rows, boards)."""
+    with transaction.atomic():
+        MovieRatingStats.objects.all().delete()
+        rows = Rating.objects.values('movieid').annotate(ratingcount=Count('movieid'), ratingsum=Sum('score'))
+        MovieRatingStats.objects.bulk_create([
+            MovieRatingStats(movieid_id=row['movieid'], ratingcount=row['ratingcount'], ratingsum=row['ratingsum'])
+            for row in rows
+        ])
+        MovieRatingStats.objects.update(ratingavg=AVERAGE_RATING)
+        bump_model_version(MovieRatingStats)
+        board = overall_board()
+        board.ratingcount = sum(row['ratingcount'] for row in rows)
+        board.ratingsum = sum(row['ratingsum'] for row in rows)
+        board.save()
+
+        genre_ids = set(MovieGenre.objects.filter(movieid__rating_stats__isnull=False)
+                        .values_list('genreid', flat=True))
+        Leaderboard.objects.exclude(Q(genreid__isnull=True) | Q(genreid__in=genre_ids)).delete()
+        for genre_id in [None, *genre_ids]:
+            refresh_leaderboard(genre_id)
+    return len(rows), len(genre_ids) + 1
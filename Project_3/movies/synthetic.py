@@ -0,0 +1,187 @@
+"""Synthetic catalogs for load and regression testing.
+
+generate() adds people, movies, genre and cast links, users and ratings with
+the long-tailed shapes of the real catalog. Genres, directors, actors and
+rated movies are drawn with Zipf weights, so a few are everywhere and most
+are rare. Release years lean recent, and scores and runtimes cluster the way
+TMDb's do. Everything goes through the bulk paths. Rows are generated one batch of
+`batch_size` at a time, so memory stays flat, and each batch is one
+executemany() INSERT of plain tuples in its own transaction, which skips the
+cost of building model instances. Ratings go through ingest.load_ratings().
+No signals fire, so the summary tables are rebuilt once at the end.
+
+Ids continue from the current maximum of each table, so generating twice
+adds to the catalog rather than colliding with it. The same `seed` gives
+the same catalog.
+"""
+import datetime
+import itertools
+import random
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .ingest import load_ratings
+from .models import Genre, Movie, MovieActor, MovieGenre, Person, User
+from .querycache import bump_model_version
+from .search import rebuild_search_index
+from .stats import rebuild_rating_stats, rebuild_stats
+
+DEFAULT_BATCH_SIZE = 5000
+# TMDb's movie genres, most common first.
+GENRE_NAMES = ('Drama', 'Comedy', 'Thriller', 'Action', 'Romance', 'Horror', 'Crime', 'Adventure',
+               'Science Fiction', 'Family', 'Fantasy', 'Mystery', 'Animation', 'History', 'Documentary',
+               'Music', 'War', 'Western', 'TV Movie')
+COUNTRIES = ('United States of America', 'United Kingdom', 'France', 'Japan', 'Germany', 'India', 'Canada',
+             'Italy', 'Spain', 'South Korea', 'Australia', 'Mexico', 'Brazil', 'Sweden', 'Iran')
+FIRST_NAMES = ('James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David', 'Sara',
+               'Ali', 'Yuki', 'Pierre', 'Ana', 'Ravi', 'Min-jun', 'Olga', 'Carlos', 'Amara', 'Lars')
+LAST_NAMES = ('Smith', 'Johnson', 'Brown', 'Garcia', 'Miller', 'Davis', 'Martin', 'Tanaka', 'Kim', 'Singh',
+              'Rossi', 'Novak', 'Ahmadi', 'Silva', 'Dubois', 'Larsen', 'Okafor', 'Ivanova', 'Lopez', 'Chen')
+WORDS = ('love', 'war', 'city', 'night', 'secret', 'family', 'journey', 'killer', 'dream', 'island', 'king',
+         'ghost', 'heist', 'summer', 'detective', 'space', 'revenge', 'school', 'river', 'storm', 'mother',
+         'empire', 'shadow', 'road', 'winter', 'hunter', 'mirror', 'garden', 'train', 'planet')
+# Users' scores lean 6-8 out of 10, as on MovieLens.
+SCORE_WEIGHTS = tuple(itertools.accumulate((1, 1, 2, 3, 5, 8, 10, 9, 5, 3)))
+# Share of people who direct; directors are drawn from the first ids.
+DIRECTOR_SHARE = 0.05
+ZIPF_EXPONENT = 1.0
+
+
+class _Skewed:
+    """Draws from `values` with Zipf weights: the i-th value is drawn in proportion to 1 / (i + 1) ** exponent."""
+
+    def __init__(self, values, rng, exponent=ZIPF_EXPONENT):
+        self.values = values
+        self.rng = rng
+        self.cum_weights = list(itertools.accumulate(1 / (i + 1) ** exponent for i in range(len(values))))
+
+    def sample(self):
+        return self.rng.choices(self.values, cum_weights=self.cum_weights)[0]
+
+    def distinct(self, k):
+        """Up to `k` distinct values."""
+        k = min(k, len(self.values))
+        chosen = set()
+        while len(chosen) < k:
+            chosen.update(self.rng.choices(self.values, cum_weights=self.cum_weights, k=k - len(chosen)))
+        return chosen
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max(model._meta.pk.attname))['last'] or 0) + 1
+
+
+def _in_batches(rows, batch_size):
+    iterator = iter(rows)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def _insert(model, fields, rows):
+    """INSERTs `rows`, tuples of the values of `fields`, in one transaction."""
+    qn = connection.ops.quote_name
+    columns = [model._meta.get_field(name).column for name in fields]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(f"INSERT INTO {qn(model._meta.db_table)} ({', '.join(map(qn, columns))}) "
+                           f"VALUES ({', '.join(['%s'] * len(columns))})", rows)
+
+
+PERSON_FIELDS = ('personid', 'fullname', 'birthdate', 'gender', 'nationality')
+MOVIE_FIELDS = ('movieid', 'title', 'releaseyear', 'summary', 'durationinminutes', 'country', 'tmdbscore',
+                'directorid')
+USER_FIELDS = ('userid', 'username', 'email', 'passwordhash', 'createdat')
+
+
+def _person(rng, person_id):
+    born = rng.random() < 0.7
+    return (person_id, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            connection.ops.adapt_datefield_value(
+                datetime.date(rng.randint(1930, 2005), rng.randint(1, 12), rng.randint(1, 28)) if born else None),
+            rng.choice(('Male', 'Female')), rng.choice(COUNTRIES))
+
+
+def _movie(rng, movie_id, directors, countries):
+    score = None if rng.random() < 0.03 else min(10.0, max(1.0, rng.gauss(6.3, 1.0)))
+    return (movie_id, ' '.join(rng.choices(WORDS, k=rng.randint(1, 4))).title(),
+            # Weighted towards recent years, like the catalog itself.
+            2025 - int(abs(rng.gauss(0, 25))) % 105,
+            ' '.join(rng.choices(WORDS, k=12)).capitalize() + '.',
+            None if rng.random() < 0.05 else int(min(240, max(60, rng.gauss(105, 20)))),
+            countries.sample(), None if score is None else Decimal(str(round(score, 1))),
+            directors.sample() if directors.values else None)
+
+
+def generate(movies=1000, people=2000, users=500, ratings=5000, genres_per_movie=3, cast_size=8,
+             batch_size=DEFAULT_BATCH_SIZE, seed=0, search_index=False):
+    """Adds a synthetic catalog; returns {model name: rows added}.
+
+    Each movie gets 1 to `genres_per_movie` genres and 1 to `cast_size`
+    actors. Each user rates about ratings / users distinct movies.
+    """
+    rng = random.Random(seed)
+    added = {}
+
+    existing_genres = dict(Genre.objects.values_list('genrename', 'genreid'))
+    missing = [name for name in GENRE_NAMES if name not in existing_genres]
+    first = _next_id(Genre)
+    _insert(Genre, ('genreid', 'genrename'), [(first + i, name) for i, name in enumerate(missing)])
+    added['Genre'] = len(missing)
+    genre_ids = dict(Genre.objects.values_list('genrename', 'genreid'))
+    genres = _Skewed([genre_ids[name] for name in GENRE_NAMES], rng)
+
+    first_person = _next_id(Person)
+    person_ids = range(first_person, first_person + people)
+    for batch in _in_batches((_person(rng, person_id) for person_id in person_ids), batch_size):
+        _insert(Person, PERSON_FIELDS, batch)
+    added['Person'] = people
+    directors = _Skewed(person_ids[:max(1, int(people * DIRECTOR_SHARE))] if people else [], rng)
+    actors = _Skewed(person_ids, rng)
+    countries = _Skewed(COUNTRIES, rng)
+
+    first_movie = _next_id(Movie)
+    movie_ids = range(first_movie, first_movie + movies)
+    links = {'MovieGenre': 0, 'MovieActor': 0}
+    for batch in _in_batches((_movie(rng, movie_id, directors, countries) for movie_id in movie_ids), batch_size):
+        _insert(Movie, MOVIE_FIELDS, batch)
+        movie_genres = [(movie[0], genre_id)
+                        for movie in batch for genre_id in genres.distinct(rng.randint(1, genres_per_movie))]
+        cast = [(movie[0], person_id)
+                for movie in batch for person_id in actors.distinct(rng.randint(1, cast_size))] if people else []
+        _insert(MovieGenre, ('movieid', 'genreid'), movie_genres)
+        _insert(MovieActor, ('movieid', 'personid'), cast)
+        links['MovieGenre'] += len(movie_genres)
+        links['MovieActor'] += len(cast)
+    added['Movie'] = movies
+    added.update(links)
+
+    first_user = _next_id(User)
+    user_ids = range(first_user, first_user + users)
+    now = timezone.now()
+    created = connection.ops.adapt_datetimefield_value(now)
+    for batch in _in_batches(((user_id, f'synthetic-{user_id}', f'synthetic-{user_id}@example.invalid', '!', created)
+                              for user_id in user_ids), batch_size):
+        _insert(User, USER_FIELDS, batch)
+    added['User'] = users
+
+    rated = _Skewed(movie_ids, rng)
+
+    def rating_rows():
+        per_user, extra = divmod(ratings, users) if users else (0, 0)
+        for i, user_id in enumerate(user_ids):
+            for movie_id in rated.distinct(per_user + (i < extra)):
+                score = rng.choices(range(1, 11), cum_weights=SCORE_WEIGHTS)[0]
+                yield user_id, movie_id, score, now - datetime.timedelta(seconds=rng.randint(0, 10 * 365 * 86400))
+
+    if ratings and movies:
+        added['Rating'] = load_ratings(rating_rows(), batch_size=batch_size).loaded
+    else:
+        rebuild_rating_stats()
+    rebuild_stats()
+    if search_index:
+        rebuild_search_index()
+    for model in (Genre, Person, Movie, MovieGenre, MovieActor, User):
+        bump_model_version(model)
+    return added
@@ -1,5 +1,37 @@
-from django.test import TestCase
-from .models import Movie, Person, Genre, MovieActor
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import NotSupportedError, connection, transaction
+from django.db.models import Avg, Count, F, Sum
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import (
+    ChangeEvent, Movie, Person, Genre, MovieActor, MovieGenre, GenreStats, DirectorStats, Leaderboard, MovieRatingStats, Rating,
+    MovieSimilarity, SearchTerm, User,
+)
+from . import backup, export, ingest, outbox, perf, querycache, routers, stats, synthetic, views
+from .analytics import CatalogSnapshot, get_snapshot, reset_snapshot
+from .graph import CoStarGraph, get_graph, reset_graph
+from .indexadvisor import analyze, candidate_columns
+from .middleware import ReplicaPinningMiddleware
+from .profiling import QueryProfiler
+from . import recommender
+from .search import rebuild_search_index
+from .stats import rebuild_rating_stats, rebuild_stats
 
 class QueryTests(TestCase):
     @classmethod
@@ -16,7 +48,7 @@ class QueryTests(TestCase):
         MovieActor.objects.create(movieid=cls.movie, personid=cls.actor1)
         MovieActor.objects.create(movieid=cls.movie, personid=cls.actor2)
         
-        Genre.objects.create(genrename="Action")
+        MovieGenre.objects.create(movieid=cls.movie, genreid=Genre.objects.create(genrename="Action"))
         
     def test_query8_movies_with_two_actors(self):
         from django.db.models import Count
@@ -38,4 +70,943 @@ class QueryTests(TestCase):
         # Just test the annotation works
         genre = queryset.first()
         self.assertIsNotNone(genre.numberofmovies)
-        self.assertIsNotNone(genre.averagescore)
\ No newline at end of file
+        self.assertIsNotNone(genre.averagescore)
+
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.director = Person.objects.create(fullname="Christopher Nolan")
+        cls.genre = Genre.objects.create(genrename="Drama")
+        cls.movies = []
+        for i in range(7):
+            movie = Movie.objects.create(
+                title=f"Movie {i}",
+                releaseyear=2000 + i,
+                tmdbscore=[8.0, 8.0, 7.5, 9.1, None, 6.2, 8.0][i],
+                directorid=cls.director,
+            )
+            actor = Person.objects.create(fullname=f"Actor {i}")
+            MovieActor.objects.create(movieid=movie, personid=actor)
+            MovieGenre.objects.create(movieid=movie, genreid=cls.genre)
+            cls.movies.append(movie)
+
+    def collect_pages(self, url, limit):
+        ids, cursor = [], None
+        while True:
+            params = {'limit': limit}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(url, params).json()
+            ids.extend(movie['id'] for movie in data['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_keyset_pages_cover_catalog_in_score_order(self):
+        ids = self.collect_pages(reverse('movies:movie-list'), limit=2)
+        expected = sorted(
+            self.movies,
+            key=lambda m: (m.tmdbscore is None, -(m.tmdbscore or 0), -m.movieid),
+        )
+        self.assertEqual(ids, [m.movieid for m in expected])
+
+    def test_page_uses_fixed_number_of_queries(self):
+        # Page + prefetched genres + prefetched actors, whatever the page size.
+        with self.assertNumQueries(3):
+            self.client.get(reverse('movies:movie-list'), {'limit': 5})
+
+    def test_filtered_listings(self):
+        by_genre = self.collect_pages(reverse('movies:movies-by-genre', args=[self.genre.genreid]), limit=3)
+        self.assertEqual(len(by_genre), 7)
+        by_director = self.collect_pages(reverse('movies:movies-by-director', args=[self.director.personid]), limit=3)
+        self.assertEqual(len(by_director), 7)
+        actor = self.movies[3].actors.get()
+        by_actor = self.collect_pages(reverse('movies:movies-by-actor', args=[actor.personid]), limit=3)
+        self.assertEqual(by_actor, [self.movies[3].movieid])
+
+    def test_detail_and_conditional_get(self):
+        url = reverse('movies:movie-detail', args=[self.movies[0].movieid])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['director']['name'], "Christopher Nolan")
+        self.assertEqual(response.json()['duration'], "N/A")
+        self.assertTrue(response.has_header('ETag'))
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get(reverse('movies:movie-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+class SummaryStatsTests(TestCase):
+    def snapshot(self):
+        genres = {row.genreid_id: (row.moviecount, row.scoredcount, row.scoresum)
+                  for row in GenreStats.objects.filter(moviecount__gt=0)}
+        directors = {row.directorid_id: (row.moviecount, row.scoredcount, row.scoresum)
+                     for row in DirectorStats.objects.filter(moviecount__gt=0)}
+        return genres, directors
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rebuild_stats()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_signals_keep_stats_in_step_with_a_rebuild(self):
+        nolan = Person.objects.create(fullname="Christopher Nolan")
+        villeneuve = Person.objects.create(fullname="Denis Villeneuve")
+        drama = Genre.objects.create(genrename="Drama")
+        scifi = Genre.objects.create(genrename="Sci-Fi")
+
+        inception = Movie.objects.create(title="Inception", tmdbscore=8.8, directorid=nolan)
+        dune = Movie.objects.create(title="Dune", tmdbscore=None, directorid=villeneuve)
+        MovieGenre.objects.create(movieid=inception, genreid=scifi)
+        dune.genres.add(drama)
+        self.assertEqual(GenreStats.objects.get(genreid=scifi).averagescore, Decimal('8.8'))
+        self.assertMatchesRebuild()
+
+        inception.tmdbscore = 8.4
+        inception.save()
+        dune.tmdbscore = 7.9
+        dune.directorid = nolan
+        dune.save()
+        stats = DirectorStats.objects.get(directorid=nolan)
+        self.assertEqual((stats.moviecount, stats.scoredcount), (2, 2))
+        self.assertMatchesRebuild()
+
+        dune.genres.remove(drama)
+        inception.delete()
+        self.assertMatchesRebuild()
+
+    def test_removing_one_of_several_genres(self):
+        drama = Genre.objects.create(genrename="Drama")
+        scifi = Genre.objects.create(genrename="Sci-Fi")
+        dune = Movie.objects.create(title="Dune", tmdbscore=8.0)
+        dune.genres.add(drama, scifi)
+        dune.genres.remove(drama)
+        self.assertEqual(list(dune.genres.all()), [scifi])
+        self.assertMatchesRebuild()
+
+        dune.genres.add(drama)
+        scifi.movie_set.clear()
+        self.assertEqual(list(dune.genres.all()), [drama])
+        self.assertMatchesRebuild()
+        dune.delete()
+        self.assertMatchesRebuild()
+
+@mock.patch('movies.stats.LEADERBOARD_MIN_RATINGS', 2)
+@mock.patch('movies.stats.LEADERBOARD_SIZE', 2)
+class RatingStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.drama = Genre.objects.create(genrename="Drama")
+        cls.movies = [Movie.objects.create(title=f"Movie {i}") for i in range(3)]
+        MovieGenre.objects.create(movieid=cls.movies[0], genreid=cls.drama)
+        MovieGenre.objects.create(movieid=cls.movies[2], genreid=cls.drama)
+
+    def rate(self, movie, score):
+        user = User.objects.create(username=f"user{User.objects.count()}", email=f"{User.objects.count()}@example.com")
+        with self.captureOnCommitCallbacks(execute=True):
+            return Rating.objects.create(userid=user, movieid=movie, score=score)
+
+    def board(self, genre=None):
+        return [entry.movieid_id for entry in Leaderboard.objects.get(genreid=genre).entries.all()]
+
+    def test_counters_follow_inserts_updates_and_deletes(self):
+        rating = self.rate(self.movies[0], 6)
+        self.rate(self.movies[0], 9)
+        with self.captureOnCommitCallbacks(execute=True):
+            rating.score = 8
+            rating.save()
+        stats = MovieRatingStats.objects.get(movieid=self.movies[0])
+        self.assertEqual((stats.ratingcount, stats.ratingsum, stats.ratingavg), (2, 17, Decimal('8.50')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rating.delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.ratingcount, stats.ratingsum, stats.ratingavg), (1, 9, Decimal('9.00')))
+        rebuild_rating_stats()
+        self.assertEqual(MovieRatingStats.objects.get(movieid=self.movies[0]).ratingsum, 9)
+
+    def test_deleting_a_movie_keeps_its_raters_other_ratings(self):
+        user = User.objects.create(username="critic", email="critic@example.com")
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(userid=user, movieid=self.movies[0], score=7)
+            Rating.objects.create(userid=user, movieid=self.movies[1], score=4)
+            self.movies[0].delete()
+        self.assertEqual(list(Rating.objects.values_list('userid', 'movieid', 'score')),
+                         [(user.pk, self.movies[1].pk, 4)])
+        self.assertEqual(MovieRatingStats.objects.get(movieid=self.movies[1]).ratingsum, 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        stats = MovieRatingStats.objects.get(movieid=self.movies[1])
+        self.assertEqual((stats.ratingcount, stats.ratingsum), (0, 0))
+
+    def test_queryset_updates_and_deletes_keep_counters(self):
+        def counters():
+            board = Leaderboard.objects.get(genreid=None)
+            return (sorted(MovieRatingStats.objects.values_list('movieid', 'ratingcount', 'ratingsum')),
+                    (board.ratingcount, board.ratingsum))
+
+        for movie, score in [(self.movies[0], 3), (self.movies[0], 5), (self.movies[1], 5), (self.movies[2], 8)]:
+            self.rate(movie, score)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Rating.objects.filter(score=5).update(score=F('score') + 2), 2)
+            self.assertEqual(Rating.objects.filter(score__lt=7).delete()[0], 1)
+            self.movies[2].delete()
+        expected = ([(self.movies[0].pk, 1, 7), (self.movies[1].pk, 1, 7)], (2, 14))
+        self.assertEqual(counters(), expected)
+        rebuild_rating_stats()
+        self.assertEqual(counters(), expected)
+
+    def test_leaderboards_use_weighted_score_and_refresh_incrementally(self):
+        low = [self.rate(self.movies[2], 2) for _ in range(3)]
+        # One 10 is weaker evidence than three 9s.
+        self.rate(self.movies[0], 10)
+        for _ in range(3):
+            self.rate(self.movies[1], 9)
+        self.assertEqual(self.board(), [self.movies[1].movieid, self.movies[0].movieid])
+        self.assertEqual(self.board(self.drama), [self.movies[0].movieid, self.movies[2].movieid])
+
+        # Movie 2 beats the full overall board's cutoff and pushes movie 1 off it.
+        for rating in low:
+            with self.captureOnCommitCallbacks(execute=True):
+                rating.score = 10
+                rating.save()
+        self.assertEqual(self.board(), [self.movies[2].movieid, self.movies[0].movieid])
+        self.assertEqual(self.board(self.drama), [self.movies[2].movieid, self.movies[0].movieid])
+
+        response = self.client.get(reverse('movies:top-rated'))
+        self.assertEqual([row['movie']['id'] for row in response.json()['results']], self.board())
+        # Genre, board, entries: independent of how many ratings there are.
+        with self.assertNumQueries(3):
+            self.client.get(reverse('movies:top-rated-by-genre', args=[self.drama.genreid]))
+
+        incremental = {genre: self.board(genre) for genre in (None, self.drama)}
+        rebuild_rating_stats()
+        self.assertEqual(incremental, {genre: self.board(genre) for genre in (None, self.drama)})
+
+    @mock.patch('movies.stats.PRIOR_DRIFT', 10)
+    def test_leaderboards_only_recompute_when_an_entry_falls_below_the_cutoff(self):
+        self.rate(self.movies[0], 9)
+        self.rate(self.movies[1], 5)
+        self.rate(self.movies[2], 7)
+        rebuild_rating_stats()
+        self.assertEqual(self.board(), [self.movies[0].movieid, self.movies[2].movieid])
+
+        with mock.patch('movies.stats.refresh_leaderboard', wraps=stats.refresh_leaderboard) as refresh:
+            # Movie 1 beats the last entry and takes its place.
+            ratings = [self.rate(self.movies[1], 10) for _ in range(2)]
+            self.assertEqual(self.board(), [self.movies[1].movieid, self.movies[0].movieid])
+            refresh.assert_not_called()
+
+            # It drops below the cutoff, so movie 2, which is not on the board, may now belong there.
+            with self.captureOnCommitCallbacks(execute=True):
+                ratings[0].score = 1
+                ratings[0].save()
+            self.assertEqual(self.board(), [self.movies[0].movieid, self.movies[2].movieid])
+            refresh.assert_called_once_with(None)
+
+class SearchTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nolan = Person.objects.create(fullname="Christopher Nolan")
+            self.inception = Movie.objects.create(
+                title="Inception", summary="A thief steals secrets through dream-sharing.", directorid=self.nolan)
+            self.interstellar = Movie.objects.create(
+                title="Interstellar", summary="Explorers travel through a wormhole; a dream of saving mankind.",
+                directorid=self.nolan)
+            self.heat = Movie.objects.create(title="Heat", summary="A thief and a detective.")
+            MovieActor.objects.create(movieid=self.heat, personid=Person.objects.create(fullname="Al Pacino"))
+
+    def titles(self, query, prefix=False):
+        return [movie.title for movie in Movie.objects.search(query, prefix=prefix)]
+
+    def test_ranking_and_fields(self):
+        # A title hit outweighs a summary hit.
+        self.assertEqual(self.titles("inception dream"), ["Inception", "Interstellar"])
+        self.assertEqual(self.titles("thief"), ["Heat", "Inception"])
+        self.assertEqual(self.titles("pacino"), ["Heat"])
+        self.assertEqual(self.titles("the"), [])
+        self.assertEqual(self.titles("inter", prefix=True), ["Interstellar"])
+        self.assertEqual(self.titles("inter"), [])
+
+    def test_index_follows_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nolan.fullname = "Jonathan Nolan"
+            self.nolan.save()
+            self.heat.title = "Heat Wave"
+            self.heat.save()
+        self.assertEqual(sorted(self.titles("jonathan")), ["Inception", "Interstellar"])
+        self.assertEqual(self.titles("wave"), ["Heat Wave"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.heat.actors.clear()
+        self.assertEqual(self.titles("pacino"), [])
+
+        rows = SearchTerm.objects.count()
+        rebuild_search_index()
+        self.assertEqual(SearchTerm.objects.count(), rows)
+
+    def test_deleting_an_actor_keeps_the_rest_of_the_cast(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            de_niro = Person.objects.create(fullname="Robert De Niro")
+            self.heat.actors.add(de_niro)
+            self.inception.actors.add(Person.objects.get(fullname="Al Pacino"))
+            Person.objects.get(fullname="Al Pacino").delete()
+        self.assertEqual(list(self.heat.actors.all()), [de_niro])
+        self.assertEqual(self.titles("pacino"), [])
+        self.assertEqual(self.titles("niro"), ["Heat"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            de_niro.movie_set.clear()
+        self.assertEqual(self.titles("niro"), [])
+
+    def test_api_and_admin_use_the_index(self):
+        data = self.client.get(reverse('movies:search'), {'q': 'nol', 'prefix': '1'}).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(self.client.get(reverse('movies:search')).status_code, 400)
+
+        model_admin = admin.site._registry[Movie]
+        request = RequestFactory().get('/admin/movies/movie/', {'q': 'dream'})
+        queryset, _ = model_admin.get_search_results(request, Movie.objects.all(), 'dream')
+        self.assertEqual(queryset.count(), 2)
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+
+    def add_movies(self, count):
+        for _ in range(count):
+            n = Person.objects.count()
+            director = Person.objects.create(fullname=f"Director {n}", birthdate=datetime.date(1960 + n % 30, 6, 1))
+            Movie.objects.create(title=f"Movie {n}", releaseyear=1990 + n % 30, country=f"Country {n % 3}",
+                                 durationinminutes=90 + n, directorid=director)
+
+    def queries_for(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_use_constant_queries(self):
+        movies_url = reverse('admin:movies_movie_changelist')
+        people_url = reverse('admin:movies_person_changelist')
+        self.add_movies(3)
+        self.queries_for(movies_url)  # fills the cached filter choices
+        small = [self.queries_for(movies_url), self.queries_for(movies_url, country='Country 1'),
+                 self.queries_for(people_url, o='4')]
+        self.add_movies(12)
+        large = [self.queries_for(movies_url), self.queries_for(movies_url, country='Country 1'),
+                 self.queries_for(people_url, o='4')]
+        self.assertEqual(small, large)
+
+    def test_search_lists_best_match_first(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.create(title="Heat", summary="A thief and a detective.")
+            Movie.objects.create(title="The Thief", summary="A thief.")
+            Movie.objects.create(title="Dune")
+        response = self.client.get(reverse('admin:movies_movie_changelist'), {'q': 'thief'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([movie.title for movie in response.context['cl'].result_list], ["The Thief", "Heat"])
+        # Sorting by a column header (title) overrides the ranking.
+        response = self.client.get(reverse('admin:movies_movie_changelist'), {'q': 'thief', 'o': '1'})
+        self.assertEqual([movie.title for movie in response.context['cl'].result_list], ["Heat", "The Thief"])
+
+    def test_person_age_is_annotated(self):
+        self.add_movies(1)
+        response = self.client.get(reverse('admin:movies_person_changelist'), {'o': '-4'})
+        person = response.context['cl'].result_list[0]
+        self.assertEqual(person.age_years, person.age)
+
+class QueryCacheTests(TestCase):
+    def setUp(self):
+        caches['queries'].clear()
+        querycache.reset_stats()
+        self.action = Genre.objects.create(genrename="Action")
+        self.movie = Movie.objects.create(title="Heat", releaseyear=1995, tmdbscore=8.3)
+        MovieGenre.objects.create(movieid=self.movie, genreid=self.action)
+
+    def genre_stats(self):
+        return Genre.objects.annotate(
+            numberofmovies=Count('moviegenre__movieid'), averagescore=Avg('moviegenre__movieid__tmdbscore'),
+        ).filter(numberofmovies__gt=0).cached()
+
+    def test_hits_until_a_dependency_changes(self):
+        self.genre_stats()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.genre_stats()[0].averagescore, Decimal('8.3'))
+
+        # The query joins Movie, so a movie edit invalidates it.
+        self.movie.tmdbscore = 7.0
+        self.movie.save()
+        self.assertEqual(self.genre_stats()[0].averagescore, Decimal('7.0'))
+        self.assertEqual(querycache.stats(), {'hits': 1, 'misses': 2, 'hit_rate': 1 / 3})
+
+        # Unrelated models leave it alone.
+        Person.objects.create(fullname="Michael Mann")
+        with self.assertNumQueries(0):
+            self.genre_stats()
+
+    def test_links_prefetches_and_aggregates(self):
+        query = Movie.objects.prefetch_related('genres')
+        self.assertEqual([list(m.genres.all()) for m in query.cached()], [[self.action]])
+        drama = Genre.objects.create(genrename="Drama")
+        self.movie.genres.clear()
+        self.movie.genres.add(drama)
+        self.assertEqual([list(m.genres.all()) for m in query.cached()], [[drama]])
+
+        self.assertEqual(Movie.objects.cached_aggregate(avg=Avg('tmdbscore'))['avg'], Decimal('8.3'))
+        Movie.objects.create(title="Ronin", tmdbscore=7.3)
+        self.assertEqual(Movie.objects.cached_aggregate(avg=Avg('tmdbscore'))['avg'], Decimal('7.8'))
+
+    def test_deletes_invalidate_the_rows_they_cascade_to(self):
+        # Neither query reads the table of the row that is deleted.
+        rated = Movie.objects.filter(rating__score__gte=1)
+        cast = Movie.objects.filter(movieactor__isnull=False)
+        user = User.objects.create(username="critic", email="critic@example.com")
+        Rating.objects.create(userid=user, movieid=self.movie, score=8)
+        actor = Person.objects.create(fullname="Al Pacino")
+        self.movie.actors.add(actor)
+        self.assertEqual((list(rated.cached()), list(cast.cached())), ([self.movie], [self.movie]))
+        user.delete()
+        actor.delete()
+        self.assertEqual((list(rated.cached()), list(cast.cached())), ([], []))
+
+def director_names():
+    return [movie.directorid.fullname for movie in Movie.objects.all()]
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(6):
+            director = Person.objects.create(fullname=f"Director {i}")
+            movie = Movie.objects.create(title=f"Movie {i}", directorid=director)
+            MovieActor.objects.create(movieid=movie, personid=director)
+
+    def test_flags_n_plus_one_and_not_prefetch(self):
+        with QueryProfiler() as profiler:
+            director_names()
+        suspects = profiler.report().n_plus_one()
+        self.assertEqual(len(suspects), 1)
+        self.assertEqual(len(suspects[0][2]), 6)
+        self.assertIn('tests.py', suspects[0][1])
+
+        # The pattern run_queries.py uses for Query 10.
+        with QueryProfiler(explain_slower_than_ms=0) as profiler:
+            people = Person.objects.annotate(movie_count=Count('movie')).prefetch_related('movie_set')
+            [list(person.movie_set.all()) for person in people]
+        report = profiler.report()
+        self.assertEqual(len(report.queries), 2)
+        self.assertEqual(report.n_plus_one(), [])
+        self.assertTrue(report.queries[0].explain)
+        self.assertEqual(report.to_dict()['query_count'], 2)
+
+    @override_settings(SQL_PROFILING=True, SQL_PROFILE_DIR=None)
+    def test_middleware_headers(self):
+        response = self.client.get(reverse('movies:movie-list'))
+        self.assertEqual(response['X-SQL-Query-Count'], '3')
+
+    def test_command_fails_on_n_plus_one(self):
+        with self.assertRaises(CommandError):
+            call_command('profile_sql', 'movies.tests:director_names', '--fail-on-n-plus-one', stdout=io.StringIO())
+
+class IndexAdvisorTests(TestCase):
+    def test_candidates_put_equality_then_sort_then_range(self):
+        queryset = Movie.objects.filter(country='Iran', releaseyear__gt=2010, durationinminutes__lt=110,
+                                        durationinminutes__isnull=False).order_by('-releaseyear')
+        self.assertEqual(candidate_columns(queryset), {Movie: ['country', 'releaseyear', 'durationinminutes']})
+        queryset = Movie.objects.filter(movieactor__personid__fullname__in=['A', 'B'])
+        self.assertEqual(candidate_columns(queryset), {Person: ['fullname']})
+
+    def test_workload_is_served_by_model_indexes(self):
+        analyzed, proposals = analyze()
+        self.assertEqual(proposals, [])
+        issues = dict((label, issues) for label, _, issues in analyzed)
+        self.assertFalse([i for i in issues["Q9 short recent movies from one country"] if i.kind == 'full scan'])
+
+class CoStarGraphTests(TestCase):
+    # (person, movie) credits: 1 and 2 share movies 10 and 11; 5 is two hops from 1.
+    CREDITS = [(1, 10), (2, 10), (3, 10), (1, 11), (2, 11), (3, 12), (4, 12), (4, 13), (5, 13), (6, 14)]
+
+    def test_queries(self):
+        graph = CoStarGraph(self.CREDITS)
+        self.assertEqual(graph.co_star_movies([1, 2]), [10, 11])
+        self.assertEqual(graph.co_star_movies([1, 2, 3]), [10])
+        self.assertEqual(graph.top_collaborators(1), [(2, 2), (3, 1)])
+        self.assertEqual(graph.shortest_path(1, 5), [1, 10, 3, 12, 4, 13, 5])
+        self.assertIsNone(graph.shortest_path(1, 6))
+
+    @mock.patch('movies.graph.COMPACT_THRESHOLD', 3)
+    def test_incremental_updates_match_a_rebuild(self):
+        graph = CoStarGraph(self.CREDITS)
+        graph.set_movie_people(14, {6, 1})      # 6 joins 1's circle
+        self.assertEqual(graph.shortest_path(5, 6), [5, 13, 4, 12, 3, 10, 1, 14, 6])
+        graph.set_movie_people(10, {3})         # 1 and 2 leave movie 10; compacts
+        graph.set_movie_people(15, {2, 5})
+        self.assertEqual(list(graph._movie_overrides), [15])
+        expected = CoStarGraph([(p, m) for p, m in self.CREDITS if not (m == 10 and p != 3) and m != 14]
+                               + [(6, 14), (1, 14), (2, 15), (5, 15)])
+        for person in range(1, 7):
+            self.assertEqual(graph.movies_of(person), expected.movies_of(person))
+
+    def test_signals_keep_the_shared_graph_current(self):
+        reset_graph()
+        self.addCleanup(reset_graph)
+        nolan, hardy = Person.objects.create(fullname="Christopher Nolan"), Person.objects.create(fullname="Tom Hardy")
+        with self.captureOnCommitCallbacks(execute=True):
+            inception = Movie.objects.create(title="Inception", directorid=nolan)
+        get_graph()
+        with self.captureOnCommitCallbacks(execute=True):
+            MovieActor.objects.create(movieid=inception, personid=hardy)
+        self.assertEqual(get_graph().co_star_movies([nolan.personid, hardy.personid]), [inception.movieid])
+
+        response = self.client.get(reverse('movies:connection-path', args=[hardy.personid, nolan.personid]))
+        self.assertEqual(response.json()['degrees'], 1)
+        self.assertEqual(response.json()['path'][1]['title'], "Inception")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            inception.actors.remove(hardy)
+        self.assertEqual(get_graph().co_star_movies([nolan.personid, hardy.personid]), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            hardy.movie_set.add(inception)
+            hardy_id = hardy.personid
+            hardy.delete()
+        self.assertEqual(list(get_graph().movies_of(hardy_id)), [])
+        self.assertEqual(list(get_graph().movies_of(nolan.personid)), [inception.movieid])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            inception.delete()
+        self.assertEqual(get_graph().co_star_movies([nolan.personid, hardy_id]), [])
+
+
+class RecommenderTests(TestCase):
+    def test_rating_neighbours(self):
+        # Users 1-2 like movies 0 and 1 and dislike 2; users 3-4 the opposite; only user 1 rated 3.
+        ratings = [(1, 0, 9), (1, 1, 9), (1, 2, 2), (1, 3, 5), (2, 0, 8), (2, 1, 8), (2, 2, 3),
+                   (3, 0, 3), (3, 1, 2), (3, 2, 9), (4, 0, 2), (4, 1, 3), (4, 2, 8)]
+        users, columns, scores = (recommender.np.array(column) for column in zip(*ratings))
+        matrices = recommender.rating_matrices(users, columns, scores, 4)
+        neighbours = recommender.rating_neighbours(matrices, [0, 2, 3], top_k=5, min_support=2)
+        self.assertEqual([column for column, _ in neighbours[0]], [1])
+        self.assertEqual(neighbours[3], [])
+        self.assertLess(neighbours[0][0][1], 1.0)   # shrunk: only four co-raters
+        self.assertEqual(recommender.rating_neighbours(matrices, [0], min_support=5), {0: []})
+        # Scored a row at a time, the neighbours are the same.
+        with mock.patch.object(recommender, 'MAX_BLOCK_CELLS', 1):
+            self.assertEqual(recommender.rating_neighbours(matrices, [0, 2, 3], top_k=5, min_support=2), neighbours)
+
+    def test_content_fallback_and_incremental_training(self):
+        drama, comedy = Genre.objects.create(genrename="Drama"), Genre.objects.create(genrename="Comedy")
+        nolan = Person.objects.create(fullname="Christopher Nolan")
+        movies = [Movie.objects.create(title=f"Movie {i}", directorid=nolan if i in (0, 2) else None)
+                  for i in range(4)]
+        for movie, genre in zip(movies, [drama, drama, comedy, comedy]):
+            MovieGenre.objects.create(movieid=movie, genreid=genre)
+
+        run = recommender.train()
+        self.assertEqual((run.mode, run.movies), ('full', 4))
+        self.assertEqual(set(MovieSimilarity.objects.values_list('source', flat=True)), {'content'})
+        response = self.client.get(reverse('movies:similar-movies', args=[movies[0].movieid]))
+        self.assertEqual([movie['id'] for movie in response.json()['similar']], [movies[1].movieid, movies[2].movieid])
+
+        # Not trained yet: answered live from the catalog.
+        fresh = Movie.objects.create(title="Fresh")
+        MovieGenre.objects.create(movieid=fresh, genreid=drama)
+        self.assertEqual([movie.movieid for movie, _ in recommender.similar_movies(fresh.movieid)],
+                         [movies[0].movieid, movies[1].movieid])
+
+        # A new rating of movie 3 retrains it and movie 2, which lists it.
+        user = User.objects.create(username="rater", email="rater@example.com")
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(userid=user, movieid=movies[3], score=7)
+        run = recommender.train(incremental=True)
+        self.assertEqual((run.mode, run.movies), ('incremental', 2))
+
+
+class AnalyticsSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.drama, cls.comedy = Genre.objects.create(genrename="Drama"), Genre.objects.create(genrename="Comedy")
+        cls.director = Person.objects.create(fullname="Christopher Nolan")
+        rows = [(2008, 152, '9.0', 'United States of America'), (2014, 169, '8.6', 'United Kingdom'),
+                (2019, 132, '8.5', 'South Korea'), (2012, 95, '4.1', 'United States of America'),
+                (2016, None, None, None)]
+        cls.movies = [
+            Movie.objects.create(title=f"Movie {i}", releaseyear=year, durationinminutes=duration,
+                                 tmdbscore=score and Decimal(score), country=country,
+                                 directorid=cls.director if i < 2 else None)
+            for i, (year, duration, score, country) in enumerate(rows)
+        ]
+        for movie, genre in zip(cls.movies, [cls.drama, cls.drama, cls.comedy, cls.comedy, cls.drama]):
+            MovieGenre.objects.create(movieid=movie, genreid=genre)
+
+    def test_aggregations_match_the_orm(self):
+        query = CatalogSnapshot.from_database().query()
+        orm = Genre.objects.annotate(numberofmovies=Count('moviegenre__movieid'),
+                                     averagescore=Avg('moviegenre__movieid__tmdbscore')).order_by('genreid')
+        self.assertEqual([(genre, count, round(mean, 2)) for genre, count, mean in query.group_by('genre', 'tmdbscore')],
+                         [(g.genreid, g.numberofmovies, round(float(g.averagescore), 2)) for g in orm])
+
+        expected = Movie.objects.filter(releaseyear__gt=2010).order_by('-tmdbscore').values_list('movieid', flat=True)
+        self.assertEqual([movie for movie, _ in query.filter(releaseyear__gt=2010).top_k('tmdbscore', 2)],
+                         list(expected[:2]))
+        # Query 6: runtime above 20x the score.
+        self.assertEqual(query.where(lambda c: c('durationinminutes') > c('tmdbscore') * 20).movie_ids(),
+                         [self.movies[3].movieid])
+        self.assertEqual(query.filter(country='United States of America', genre=self.comedy.genreid).movie_ids(),
+                         [self.movies[3].movieid])
+        self.assertEqual(query.filter(country='Atlantis').count(), 0)
+        self.assertEqual(query.group_by('directorid'), [(self.director.personid, 2, None)])
+        self.assertAlmostEqual(query.mean('tmdbscore'), 7.55)
+
+    def test_memory_mapped_copy_and_incremental_refresh(self):
+        with tempfile.TemporaryDirectory() as directory:
+            CatalogSnapshot.from_database().save(directory)
+            loaded = CatalogSnapshot.load(directory)
+            self.assertEqual(loaded.query().filter(tmdbscore__gte=8.5).count(), 3)
+
+            reset_snapshot()
+            self.addCleanup(reset_snapshot)
+            with override_settings(ANALYTICS_SNAPSHOT_DIR=directory):
+                self.assertEqual(len(get_snapshot()), 5)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.movies[3].tmdbscore = Decimal('9.5')
+                    self.movies[3].save()
+                    self.movies[0].delete()
+                    extra = Movie.objects.create(title="New", releaseyear=2020, tmdbscore=Decimal('7.0'))
+                    MovieGenre.objects.create(movieid=extra, genreid=self.comedy)
+                query = get_snapshot().query()
+        self.assertEqual(query.top_k('tmdbscore', 1), [(self.movies[3].movieid, 9.5)])
+        self.assertEqual(len(get_snapshot()), 5)
+        self.assertEqual(dict((g, n) for g, n, _ in query.group_by('genre')),
+                         {self.drama.genreid: 2, self.comedy.genreid: 3})
+
+    def test_reverse_clear_and_genre_delete_refresh_the_snapshot(self):
+        reset_snapshot()
+        self.addCleanup(reset_snapshot)
+        get_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.comedy.movie_set.clear()
+            self.movies[0].genres.add(self.comedy)
+            self.drama.delete()
+        self.assertEqual(get_snapshot().query().group_by('genre'), [(self.comedy.genreid, 1, None)])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        director = Person.objects.create(fullname="Denis Villeneuve")
+        drama = Genre.objects.create(genrename="Drama")
+        for i in range(5):
+            movie = Movie.objects.create(title=f"Movie {i}", releaseyear=2010 + i, tmdbscore=Decimal('7.5'),
+                                         directorid=director if i < 3 else None)
+            MovieGenre.objects.create(movieid=movie, genreid=drama)
+            MovieActor.objects.create(movieid=movie, personid=Person.objects.create(fullname=f"Actor {i}"))
+
+    def test_rows_are_read_in_key_chunks_with_relations_prefetched(self):
+        with self.assertNumQueries(9):   # 3 chunks of movies (2, 2, 1), each with its genres and cast
+            rows = [json.loads(line) for line in b''.join(export.stream('jsonl', chunk_size=2)).splitlines()]
+        self.assertEqual([row['title'] for row in rows], [f"Movie {i}" for i in range(5)])
+        self.assertEqual(rows[0]['director'], "Denis Villeneuve")
+        self.assertEqual((rows[0]['genres'], rows[0]['cast'], rows[0]['tmdbscore']), (["Drama"], ["Actor 0"], 7.5))
+        self.assertIsNone(rows[4]['director'])
+
+    def test_csv_download_streams(self):
+        response = self.client.get(reverse('movies:export-movies'), {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(','), list(export.COLUMNS))
+        self.assertEqual(len(lines), 6)
+        self.assertIn("Drama,Actor 1", lines[2])
+        self.assertEqual(self.client.get(reverse('movies:export-movies'), {'format': 'xml'}).status_code, 400)
+        if export.pa is None:
+            self.assertEqual(self.client.get(reverse('movies:export-movies'), {'format': 'parquet'}).status_code, 501)
+
+    def test_command_writes_the_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'movies.jsonl')
+        call_command('export_catalog', path, '--chunk-size', '3', stdout=io.StringIO())
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = Movie.objects.create(title="Heat", releaseyear=1995, tmdbscore=Decimal('7.9'))
+
+    def setUp(self):
+        outbox.flush()
+        ChangeEvent.objects.all().delete()
+
+    def events(self):
+        return list(ChangeEvent.objects.order_by('eventid').values_list('tablename', 'rowid', 'action', 'changes'))
+
+    def test_only_real_changes_are_recorded(self):
+        movie = Movie.objects.get(pk=self.movie.pk)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            movie.save()
+        self.assertEqual(self.events(), [])
+        # Nothing downstream (stats, search, caches, snapshot) is scheduled for a no-op save.
+        self.assertEqual(callbacks, [])
+
+        movie.tmdbscore = Decimal('8.2')
+        with self.captureOnCommitCallbacks(execute=True):
+            movie.save()
+        self.assertEqual(self.events(), [('movie', movie.pk, 'update', {'tmdbscore': ['7.9', '8.2']})])
+
+    def test_events_are_written_in_the_transaction_they_record(self):
+        with transaction.atomic():
+            Genre.objects.create(genrename="Crime")
+            # Before commit, in whatever atomic block the change was made.
+            self.assertEqual(ChangeEvent.objects.count(), 1)
+            try:
+                with transaction.atomic():
+                    Genre.objects.create(genrename="Western")
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual([changes['genrename'][1] for _, _, _, changes in self.events()], ["Crime"])
+
+    def test_events_are_bulk_written_and_rolled_back_savepoints_drop_theirs(self):
+        with CaptureQueriesContext(connection) as queries:
+            with outbox.atomic():
+                Genre.objects.create(genrename="Crime")
+                try:
+                    with transaction.atomic():
+                        Genre.objects.create(genrename="Western")
+                        raise ValueError
+                except ValueError:
+                    pass
+                Genre.objects.create(genrename="Noir")
+                self.assertEqual(ChangeEvent.objects.count(), 0)
+            try:
+                with outbox.atomic():
+                    Genre.objects.create(genrename="Giallo")
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual([changes['genrename'][1] for _, _, _, changes in self.events()], ["Crime", "Noir"])
+        # Western's, rolled back with its savepoint, and one for the rest of the block.
+        self.assertEqual(sum('INSERT INTO "change_event"' in query['sql'] for query in queries), 2)
+
+    def test_relay_delivers_each_event_once(self):
+        delivered = []
+        outbox.consumer('movie')(delivered.extend)
+        self.addCleanup(outbox._consumers.pop)
+        outbox.record('movie', self.movie.pk, 'update', {'title': ["Heat", "Heat (1995)"]})
+        outbox.record('genre', 1, 'insert', {})
+        outbox.flush()
+
+        with self.assertLogs('movies.audit') as logs, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(outbox.relay(), 2)
+        self.assertEqual([event.tablename for event in delivered], ['movie'])
+        self.assertEqual(len(logs.output), 2)
+        self.assertFalse(ChangeEvent.objects.filter(deliveredat__isnull=True).exists())
+        self.assertEqual(outbox.relay(), 0)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        routers.pool.reset()
+        self.addCleanup(routers.pool.reset)
+        self.router = routers.ReplicaRouter()
+
+    def reads(self, count):
+        return [self.router.db_for_read(Movie) for _ in range(count)]
+
+    def test_reads_rotate_over_healthy_replicas(self):
+        with mock.patch('movies.routers.ping', return_value=True):
+            self.assertEqual(sorted(self.reads(4)), ['replica1', 'replica1', 'replica2', 'replica2'])
+        routers.pool.reset()
+        with mock.patch('movies.routers.ping', side_effect=lambda alias: alias == 'replica2') as ping:
+            self.assertEqual(self.reads(3), ['replica2'] * 3)
+            self.assertEqual(ping.call_count, 2)   # one check per replica, then cached
+        routers.pool.reset()
+        with mock.patch('movies.routers.ping', return_value=False):
+            self.assertEqual(self.reads(1), ['default'])
+        self.assertIsNone(self.router.db_for_read(get_user_model()))
+        self.assertIs(self.router.allow_migrate('replica1', 'movies'), False)
+
+    def test_writes_pin_reads_to_default(self):
+        def view(request):
+            self.assertEqual(self.router.db_for_write(Rating), 'default')
+            self.assertEqual(self.reads(1), ['default'])
+            return HttpResponse()
+
+        with mock.patch('movies.routers.ping', return_value=True):
+            response = ReplicaPinningMiddleware(view)(RequestFactory().post('/'))
+            self.assertIn(routers.PIN_COOKIE, response.cookies)
+            self.assertIn(self.reads(1)[0], ('replica1', 'replica2'))
+
+            request = RequestFactory().get('/')
+            request.COOKIES[routers.PIN_COOKIE] = '1'
+            response = ReplicaPinningMiddleware(lambda request: HttpResponse(self.reads(1)[0]))(request)
+            self.assertEqual(response.content, b'default')
+            self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+
+@override_settings(ASYNC_QUERY_FANOUT=False)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.drama = Genre.objects.create(genrename="Drama")
+        cls.nolan, cls.hardy = Person.objects.create(fullname="Christopher Nolan"), Person.objects.create(fullname="Tom Hardy")
+        cls.movies = [Movie.objects.create(title=f"Movie {i}", directorid=cls.nolan, tmdbscore=Decimal('8.0'))
+                      for i in range(3)]
+        MovieGenre.objects.create(movieid=cls.movies[0], genreid=cls.drama)
+        MovieGenre.objects.create(movieid=cls.movies[1], genreid=cls.drama)
+        MovieActor.objects.create(movieid=cls.movies[0], personid=cls.hardy)
+
+    async def test_movie_page(self):
+        response = await self.async_client.get(reverse('movies:movie-page', args=[self.movies[0].movieid]))
+        data = response.json()
+        self.assertEqual((data['title'], data['director']['name'], data['genres']),
+                         ("Movie 0", "Christopher Nolan", ["Drama"]))
+        self.assertEqual([actor['name'] for actor in data['actors']], ["Tom Hardy"])
+        self.assertEqual(data['user_rating'], {'count': 0, 'average': None})
+        self.assertEqual(data['similar'][0]['id'], self.movies[1].movieid)
+        response = await self.async_client.get(reverse('movies:movie-page', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_streamed_listing(self):
+        response = await self.async_client.get(reverse('movies:movie-stream'), {'genre': self.drama.genreid})
+        self.assertEqual(response['X-Total-Count'], '2')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertEqual([movie['id'] for movie in json.loads(body)], [m.movieid for m in self.movies[:2]])
+
+    @mock.patch('movies.views.STREAM_CHUNK_SIZE', 2)
+    def test_streamed_listing_reads_key_chunks(self):
+        async def read():
+            response = await self.async_client.get(reverse('movies:movie-stream'))
+            return ''.join([chunk.decode() async for chunk in response.streaming_content])
+
+        with CaptureQueriesContext(connection) as queries:
+            body = async_to_sync(read)()
+        self.assertEqual([movie['id'] for movie in json.loads(body)], [m.movieid for m in self.movies])
+        # The count, then two chunks (2 movies, then 1), each a movie query plus its genres and cast.
+        self.assertEqual(len(queries), 7)
+
+
+class AsyncFanOutTests(TransactionTestCase):
+    def test_reads_overlap(self):
+        Movie.objects.create(title="Inception")
+        # Only passes once all three reads are running at the same time; run one after another, they time out.
+        all_running = threading.Barrier(3, timeout=5)
+
+        def count():
+            all_running.wait()
+            return Movie.objects.count()
+
+        results = async_to_sync(views.fan_out)(count, count, count)
+        self.assertEqual(results, [1, 1, 1])
+
+
+class BackupTests(TransactionTestCase):
+    def setUp(self):
+        director = Person.objects.create(fullname="Michael Mann", birthdate=datetime.date(1943, 2, 5))
+        for i in range(7):
+            Movie.objects.create(title=f"Movie {i}", releaseyear=1990 + i, tmdbscore=Decimal('7.5'),
+                                 directorid=director if i % 2 else None)
+
+    def rows(self):
+        return (list(Person.objects.order_by('pk').values_list()),
+                list(Movie.objects.order_by('pk').values_list()))
+
+    def test_backup_and_restore_round_trip(self):
+        before = self.rows()
+        directory = tempfile.mkdtemp()
+        manifest = backup.backup(directory, tables=['person', 'movie', 'movie_log'], chunk_rows=3, workers=3)
+        self.assertEqual([chunk['rows'] for chunk in manifest['tables']['movie']['chunks']], [3, 3, 1])
+        self.assertNotIn('movie_log', manifest['tables'])
+
+        with self.assertRaisesMessage(ValueError, "not empty"):
+            backup.restore(directory)
+        self.assertEqual(backup.restore(directory, replace=True), {'person': 1, 'movie': 7})
+        self.assertEqual(self.rows(), before)
+
+    def test_corrupt_chunk_is_refused(self):
+        directory = tempfile.mkdtemp()
+        manifest = backup.backup(directory, tables=['movie'], chunk_rows=4, workers=2)
+        chunk = manifest['tables']['movie']['chunks'][0]['file']
+        with gzip.open(os.path.join(directory, chunk), 'wb') as f:
+            f.write(b'[]\n')
+        with self.assertRaisesMessage(CommandError, "does not match the manifest"):
+            call_command('restore_db', directory, '--replace')
+        self.assertEqual(Movie.objects.count(), 7)
+
+
+class IngestTests(TransactionTestCase):
+    def test_ingest_upserts_valid_ratings_and_creates_users(self):
+        movies = [Movie.objects.create(title=f"Movie {i}") for i in range(2)]
+        User.objects.create(userid=1, username="alice", email="alice@example.com", passwordhash="x")
+        Rating.objects.create(userid_id=1, movieid=movies[0], score=2)
+        path = os.path.join(tempfile.mkdtemp(), 'ratings.csv.gz')
+        with gzip.open(path, 'wt') as f:
+            f.write("userId,movieId,rating,timestamp\n"
+                    f"1,{movies[0].pk},4.5,1700000000\n"      # updates alice's rating
+                    f"2,{movies[1].pk},3.0,1700000100\n"      # new user
+                    f"3,{movies[1].pk},0.25,1700000200\n"     # below the scale
+                    f"4,999,5.0,1700000300\n"                 # unknown movie
+                    f"x,{movies[0].pk},2.0,\n")
+
+        out = io.StringIO()
+        call_command('ingest_ratings', path, '--scale', '2', '--batch-size', '2', stdout=out)
+        self.assertIn("Loaded 2 of 5 ratings", out.getvalue())
+        self.assertIn("created 1 users", out.getvalue())
+        self.assertEqual(sorted(Rating.objects.values_list('userid', 'movieid', 'score')),
+                         [(1, movies[0].pk, 9), (2, movies[1].pk, 6)])
+        self.assertEqual(Rating.objects.get(userid=2).ratedat,
+                         datetime.datetime(2023, 11, 14, 22, 15, tzinfo=datetime.timezone.utc))
+        self.assertEqual(User.objects.get(userid=2).username, "imported-2")
+        self.assertEqual(MovieRatingStats.objects.get(movieid=movies[0]).ratingsum, 9)
+
+    def test_upsert_names_a_conflict_target_only_where_the_backend_takes_one(self):
+        # MySQL: ON DUPLICATE KEY UPDATE has no target, and Django refuses unique_fields for it.
+        movie = Movie.objects.create(title="Heat")
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch('django.db.models.QuerySet.bulk_create') as bulk_create:
+            ingest._write_batch([(1, movie.pk, 5, None)], ['userid', 'movieid'], 'default')
+        self.assertNotIn('unique_fields', bulk_create.call_args.kwargs)
+
+        path = os.path.join(tempfile.mkdtemp(), 'ratings.csv')
+        with open(path, 'w') as f:
+            f.write(f"userId,movieId,rating,timestamp\n1,{movie.pk},4,\n")
+        with mock.patch('movies.ingest._write_batch', side_effect=NotSupportedError("no upsert")), \
+                self.assertRaisesMessage(CommandError, "no upsert"):
+            call_command('ingest_ratings', path, stdout=io.StringIO())
+
+
+class PerformanceTests(TransactionTestCase):
+    def setUp(self):
+        self.added = synthetic.generate(movies=40, people=60, users=30, ratings=90, genres_per_movie=3, cast_size=4,
+                                        seed=1, search_index=True)
+
+    def test_generate_is_deterministic_and_continues_ids(self):
+        self.assertEqual(Movie.objects.count(), 40)
+        self.assertEqual(Rating.objects.count(), 90)
+        self.assertEqual(MovieRatingStats.objects.aggregate(total=Sum('ratingcount'))['total'], 90)
+        self.assertEqual(GenreStats.objects.aggregate(total=Sum('moviecount'))['total'], MovieGenre.objects.count())
+        self.assertGreater(MovieGenre.objects.count(), 40)
+        first = list(Movie.objects.order_by('movieid').values_list('title', 'releaseyear', 'tmdbscore', 'directorid'))
+        synthetic.generate(movies=40, people=60, users=0, ratings=0, genres_per_movie=1, cast_size=1, seed=1)
+        self.assertEqual(Movie.objects.count(), 80)
+        # Same seed, same movies, with director ids shifted past the first 60 people.
+        second = list(Movie.objects.order_by('movieid').values_list('title', 'releaseyear', 'tmdbscore', 'directorid'))
+        self.assertEqual([row[:3] for row in second[40:]], [row[:3] for row in first])
+        self.assertEqual([row[3] - 60 for row in second[40:]], [row[3] for row in first])
+
+    def test_query_counts_match_the_baseline(self):
+        baseline = perf.load_baseline()
+        for label, function in perf.code_paths():
+            with self.subTest(label):
+                function()
+                with self.assertNumQueries(baseline[label]['queries']):
+                    function()
+
+    def test_compare_reports_extra_queries_and_slow_paths(self):
+        baseline = {'a': {'queries': 2, 'ms': 10.0}, 'b': {'queries': 1, 'ms': 10.0}}
+        results = {'a': {'queries': 3, 'ms': 10.0}, 'b': {'queries': 1, 'ms': 50.0}, 'new': {'queries': 9, 'ms': 1.0}}
+        self.assertEqual([label for label, _ in perf.compare(results, baseline, tolerance=1.5)], ['a', 'b'])
+        self.assertEqual([label for label, _ in perf.compare(results, baseline, check_time=False)], ['a'])
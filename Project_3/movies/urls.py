@@ -0,0 +1,24 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'movies'
+
+urlpatterns = [
+    path('movies/', views.movie_list, name='movie-list'),
+    path('search/', views.search, name='search'),
+    path('movies/top-rated/', views.top_rated, name='top-rated'),
+    path('movies/most-rated/', views.most_rated, name='most-rated'),
+    path('movies/<int:movie_id>/', views.movie_detail, name='movie-detail'),
+    path('movies/<int:movie_id>/similar/', views.similar_movies, name='similar-movies'),
+    path('genres/<int:genre_id>/movies/', views.movies_by_genre, name='movies-by-genre'),
+    path('genres/<int:genre_id>/top-rated/', views.top_rated_by_genre, name='top-rated-by-genre'),
+    path('directors/<int:person_id>/movies/', views.movies_by_director, name='movies-by-director'),
+    path('actors/<int:person_id>/movies/', views.movies_by_actor, name='movies-by-actor'),
+    path('async/movies/<int:movie_id>/', views.movie_page, name='movie-page'),
+    path('async/movies/', views.movie_stream, name='movie-stream'),
+    path('export/movies/', views.export_movies, name='export-movies'),
+    path('people/co-stars/', views.co_star_movies, name='co-star-movies'),
+    path('people/<int:person_id>/collaborators/', views.top_collaborators, name='top-collaborators'),
+    path('people/<int:person_id>/path/<int:other_id>/', views.connection_path, name='connection-path'),
+]
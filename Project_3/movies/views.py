@@ -1,3 +1,423 @@
-from django.shortcuts import render
+import asyncio
+import base64
+import binascii
+import json
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET
+
+from . import export, recommender
+from .graph import get_graph
+from .models import Genre, Leaderboard, Movie, MovieGenre, MovieRatingStats, Person
+from .stats import LEADERBOARD_SIZE
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Rows fetched per round trip by the streaming listing.
+STREAM_CHUNK_SIZE = 500
+# Clients may reuse a response for this long, then revalidate it with its ETag.
+API_CACHE_MAX_AGE = 60
+
+
+def catalog_queryset():
+    # One query for the page (director and rating counters joined in) plus one per prefetched relation.
+    return Movie.objects.select_related('directorid', 'rating_stats').prefetch_related('genres', 'actors')
+
+
+def serialize_person(person):
+    return {'id': person.personid, 'name': person.fullname} if person else None
+
+
+def serialize_rating_stats(stats):
+    if stats is None:
+        return {'count': 0, 'average': None}
+    return {
+        'count': stats.ratingcount,
+        'average': float(stats.ratingavg) if stats.ratingavg is not None else None,
+    }
+
+
+def serialize_user_rating(movie):
+    try:
+        return serialize_rating_stats(movie.rating_stats)
+    except MovieRatingStats.DoesNotExist:
+        return serialize_rating_stats(None)
+
+
+def serialize_movie(movie, detail=False):
+    data = {
+        'id': movie.movieid,
+        'title': movie.title,
+        'release_year': movie.releaseyear,
+        'tmdb_score': float(movie.tmdbscore) if movie.tmdbscore is not None else None,
+        'director': serialize_person(movie.directorid),
+        'genres': [genre.genrename for genre in movie.genres.all()],
+        'user_rating': serialize_user_rating(movie),
+    }
+    if detail:
+        data.update({
+            'summary': movie.summary,
+            'duration': movie.get_duration_display(),
+            'duration_in_minutes': movie.durationinminutes,
+            'country': movie.country,
+            'poster_url': movie.posterurl,
+            'actors': [serialize_person(actor) for actor in movie.actors.all()],
+        })
+    return data
+
+
+def encode_cursor(movie):
+    score = '' if movie.tmdbscore is None else str(movie.tmdbscore)
+    return base64.urlsafe_b64encode(f"{score}:{movie.movieid}".encode()).decode()
+
+
+def decode_cursor(token):
+    """Returns (tmdbscore or None, movieid) of the last movie on the previous page."""
+    try:
+        score, movie_id = base64.urlsafe_b64decode(token.encode()).decode().split(':')
+        return (Decimal(score) if score else None), int(movie_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, InvalidOperation):
+        raise ValueError("Invalid cursor")
+
+
+def page_limit(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """The `limit` parameter clamped to [1, maximum]; raises ValueError if it is not an integer."""
+    try:
+        return min(max(int(request.GET.get('limit', default)), 1), maximum)
+    except ValueError:
+        raise ValueError("'limit' must be an integer")
+
+
+def keyset_page(request, queryset):
+    """One page of `queryset` ordered by (tmdbscore DESC NULLS LAST, movieid DESC).
+
+    Instead of OFFSET, the `cursor` parameter names the last row already seen and
+    the page starts right after it, so deep pages cost the same as the first one.
+    """
+    try:
+        limit = page_limit(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    queryset = queryset.order_by(F('tmdbscore').desc(nulls_last=True), '-movieid')
+    token = request.GET.get('cursor')
+    if token:
+        try:
+            score, movie_id = decode_cursor(token)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        if score is None:
+            queryset = queryset.filter(tmdbscore__isnull=True, movieid__lt=movie_id)
+        else:
+            queryset = queryset.filter(
+                Q(tmdbscore__lt=score) | Q(tmdbscore=score, movieid__lt=movie_id) | Q(tmdbscore__isnull=True)
+            )
+
+    movies = list(queryset[:limit + 1])
+    has_more = len(movies) > limit
+    movies = movies[:limit]
+    return JsonResponse({
+        'results': [serialize_movie(movie) for movie in movies],
+        'next_cursor': encode_cursor(movies[-1]) if has_more else None,
+    })
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+def movie_list(request):
+    return keyset_page(request, catalog_queryset())
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+def movie_detail(request, movie_id):
+    movie = get_object_or_404(catalog_queryset(), movieid=movie_id)
+    return JsonResponse(serialize_movie(movie, detail=True))
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+def movies_by_genre(request, genre_id):
+    genre = get_object_or_404(Genre, genreid=genre_id)
+    return keyset_page(request, catalog_queryset().filter(moviegenre__genreid=genre))
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+def movies_by_director(request, person_id):
+    director = get_object_or_404(Person, personid=person_id)
+    return keyset_page(request, catalog_queryset().filter(directorid=director))
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+def movies_by_actor(request, person_id):
+    actor = get_object_or_404(Person, personid=person_id)
+    return keyset_page(request, catalog_queryset().filter(movieactor__personid=actor))
+
+
+def leaderboard_response(request, genre=None):
+    """The precomputed top-rated board; reading it never touches the rating table."""
+    try:
+        limit = page_limit(request, maximum=LEADERBOARD_SIZE)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    board = Leaderboard.objects.filter(genreid=genre).first()
+    entries = board.entries.select_related('movieid')[:limit] if board else []
+    return JsonResponse({
+        'genre': genre.genrename if genre else None,
+        'refreshed_at': board.refreshedat.isoformat() if board else None,
+        'prior_mean': board.priormean if board else None,
+        'min_ratings': board.minratings if board else None,
+        'results': [{
+            'rank': entry.rank,
+            'weighted_score': round(entry.weightedscore, 4),
+            'rating_count': entry.ratingcount,
+            'rating_average': float(entry.ratingavg),
+            'movie': {'id': entry.movieid.movieid, 'title': entry.movieid.title,
+                      'release_year': entry.movieid.releaseyear},
+        } for entry in entries],
+    })
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+def top_rated(request):
+    return leaderboard_response(request)
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+def top_rated_by_genre(request, genre_id):
+    return leaderboard_response(request, get_object_or_404(Genre, genreid=genre_id))
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+def most_rated(request):
+    # Walks idx_rating_stats_count instead of grouping the rating table.
+    try:
+        limit = page_limit(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    movies = catalog_queryset().filter(rating_stats__ratingcount__gt=0).order_by('-rating_stats__ratingcount', '-movieid')
+    return JsonResponse({'results': [serialize_movie(movie) for movie in movies[:limit]]})
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+def search(request):
+    """Ranked search over titles, summaries, directors and cast; `prefix=1` for search-as-you-type."""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': "'q' is required"}, status=400)
+    try:
+        limit = page_limit(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    movies = catalog_queryset().search(query, prefix=request.GET.get('prefix') == '1')[:limit]
+    return JsonResponse({
+        'query': query,
+        'results': [dict(serialize_movie(movie), rank=round(movie.rank, 4)) for movie in movies],
+    })
+
+
+def serialize_movie_ref(movie):
+    return {'id': movie.movieid, 'title': movie.title, 'release_year': movie.releaseyear}
+
+
+@require_GET
+def co_star_movies(request):
+    """Movies crediting every person in `ids` (comma-separated), from the in-memory co-star graph."""
+    try:
+        person_ids = [int(value) for value in request.GET.get('ids', '').split(',') if value]
+    except ValueError:
+        return JsonResponse({'error': "'ids' must be comma-separated integers"}, status=400)
+    if not person_ids:
+        return JsonResponse({'error': "'ids' is required"}, status=400)
+    movie_ids = get_graph().co_star_movies(person_ids)
+    movies = Movie.objects.in_bulk(movie_ids)
+    return JsonResponse({
+        'people': [serialize_person(person) for person in Person.objects.filter(personid__in=person_ids)],
+        'movies': [serialize_movie_ref(movies[movie_id]) for movie_id in movie_ids if movie_id in movies],
+    })
+
+
+@require_GET
+def top_collaborators(request, person_id):
+    person = get_object_or_404(Person, personid=person_id)
+    try:
+        limit = page_limit(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    collaborators = get_graph().top_collaborators(person.personid, limit=limit)
+    people = Person.objects.in_bulk([other for other, _ in collaborators])
+    return JsonResponse({
+        'person': serialize_person(person),
+        'collaborators': [
+            dict(serialize_person(people[other]), shared_movies=count)
+            for other, count in collaborators if other in people
+        ],
+    })
+
+
+@require_GET
+def connection_path(request, person_id, other_id):
+    """Shortest chain of shared credits between two people (their "Bacon number")."""
+    source = get_object_or_404(Person, personid=person_id)
+    target = get_object_or_404(Person, personid=other_id)
+    path = get_graph().shortest_path(source.personid, target.personid)
+    if path is None:
+        return JsonResponse({'degrees': None, 'path': []})
+    people = Person.objects.in_bulk(path[0::2])
+    movies = Movie.objects.in_bulk(path[1::2])
+    steps = []
+    for i, object_id in enumerate(path):
+        if i % 2 == 0:
+            steps.append(dict(serialize_person(people.get(object_id)) or {'id': object_id}, type='person'))
+        else:
+            steps.append(dict(serialize_movie_ref(movies[object_id]) if object_id in movies else {'id': object_id},
+                              type='movie'))
+    return JsonResponse({'degrees': len(path) // 2, 'path': steps})
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+def similar_movies(request, movie_id):
+    """"People who liked this also liked": the movie's stored neighbours (see movies/recommender.py)."""
+    movie = get_object_or_404(Movie, movieid=movie_id)
+    try:
+        limit = page_limit(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'movie': serialize_movie_ref(movie),
+        'similar': [dict(serialize_movie_ref(other), score=round(score, 4))
+                    for other, score in recommender.similar_movies(movie.movieid, limit)],
+    })
+
+
+# --- Async endpoints, served concurrently through movieproject/asgi.py ---
+
+def _own_connection(function):
+    def run():
+        # As request_started/finished do: drop connections past CONN_MAX_AGE or broken.
+        close_old_connections()
+        try:
+            return function()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def fan_out(*functions):
+    """Runs independent blocking ORM reads concurrently and returns their results in order.
+
+    The async ORM (aget, acount, ...) runs every query on one shared thread, so
+    awaiting several of them with gather() still runs them one after another.
+    Here each function gets a worker thread of its own, and with it a database
+    connection of its own (kept open per CONN_MAX_AGE). The request then takes
+    about as long as its slowest query. The event loop's default executor
+    bounds the threads, and so the connections, per process. With
+    ASYNC_QUERY_FANOUT off, the functions run one after another on the shared
+    thread; SQLite needs that, since one connection cannot see another's
+    uncommitted rows.
+    """
+    if not getattr(settings, 'ASYNC_QUERY_FANOUT', True):
+        return [await sync_to_async(function)() for function in functions]
+    return await asyncio.gather(*(sync_to_async(_own_connection(function), thread_sensitive=False)()
+                                  for function in functions))
+
+
+@require_GET
+@cache_control(public=True, max_age=API_CACHE_MAX_AGE)
+async def movie_page(request, movie_id):
+    """Everything a movie page shows, the six reads issued at once."""
+    movie, director, genres, cast, user_rating, similar = await fan_out(
+        lambda: Movie.objects.filter(movieid=movie_id).first(),
+        lambda: Person.objects.filter(directed_movies=movie_id).first(),
+        lambda: list(MovieGenre.objects.filter(movieid=movie_id).values_list('genreid__genrename', flat=True)),
+        lambda: list(Person.objects.filter(movieactor__movieid=movie_id).order_by('fullname')),
+        lambda: serialize_rating_stats(MovieRatingStats.objects.filter(movieid=movie_id).first()),
+        lambda: recommender.similar_movies(movie_id, limit=10),
+    )
+    if movie is None:
+        raise Http404("No movie matches the given query.")
+    return JsonResponse({
+        'id': movie.movieid,
+        'title': movie.title,
+        'release_year': movie.releaseyear,
+        'tmdb_score': float(movie.tmdbscore) if movie.tmdbscore is not None else None,
+        'summary': movie.summary,
+        'duration': movie.get_duration_display(),
+        'duration_in_minutes': movie.durationinminutes,
+        'country': movie.country,
+        'poster_url': movie.posterurl,
+        'director': serialize_person(director),
+        'genres': genres,
+        'actors': [serialize_person(actor) for actor in cast],
+        'user_rating': user_rating,
+        'similar': [dict(serialize_movie_ref(other), score=round(score, 4)) for other, score in similar],
+    })
+
+
+@require_GET
+async def movie_stream(request):
+    """The whole catalog (optionally one genre) as one JSON array, streamed as it is read.
+
+    Memory stays flat however large the listing: rows are read STREAM_CHUNK_SIZE
+    at a time, each chunk a query of its own that starts after the last id of
+    the one before (as export.movie_chunks does), and written out before the
+    next chunk is read. aiterator() would leave one query open instead, which
+    MySQL's client buffers in full.
+    """
+    movies = catalog_queryset().order_by('movieid')
+    if request.GET.get('genre'):
+        try:
+            genre_id = int(request.GET['genre'])
+        except ValueError:
+            return JsonResponse({'error': "'genre' must be an integer"}, status=400)
+        genre = await aget_object_or_404(Genre, genreid=genre_id)
+        movies = movies.filter(moviegenre__genreid=genre)
+    total = await movies.acount()
+
+    async def rows():
+        yield '['
+        last = None
+        while True:
+            chunk = [movie async for movie in
+                     (movies if last is None else movies.filter(movieid__gt=last))[:STREAM_CHUNK_SIZE]]
+            if chunk:
+                yield ('' if last is None else ',') + ','.join(json.dumps(serialize_movie(movie)) for movie in chunk)
+            if len(chunk) < STREAM_CHUNK_SIZE:
+                break
+            last = chunk[-1].movieid
+        yield ']'
+
+    response = StreamingHttpResponse(rows(), content_type='application/json')
+    response['X-Total-Count'] = str(total)
+    return response
+
+
+@require_GET
+def export_movies(request):
+    """The whole catalog as a download (?format=csv, jsonl or parquet), streamed as it is read."""
+    fmt = request.GET.get('format', 'csv')
+    try:
+        chunks = export.stream(fmt)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ImproperlyConfigured as e:
+        return JsonResponse({'error': str(e)}, status=501)
+    response = StreamingHttpResponse(chunks, content_type=export.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="movies.{fmt}"'
+    return response
 
-# Create your views here.